@@ -0,0 +1,188 @@
+"""Modo ao vivo do dashboard: eixos fixos das figuras e incrementos das chamadas novas
+
+No modo ao vivo os gráficos são montados densos (uma barra ou ponto para cada
+período, faixa horária e COB, mesmo zerados) sobre eixos que dependem apenas
+dos filtros. Assim a posição de cada chamada nova nos traces é conhecida sem
+consultar a figura do navegador, e a atualização é um Patch que soma apenas as
+chamadas novas às posições afetadas. Tudo o que fica no estado (dcc.Store) é
+JSON: eixos, resumo dos indicadores e atendidas por teleatendente.
+"""
+import numpy as np
+import pandas as pd
+from dash import Patch
+
+from colunas_derivadas import escolher_resolucao, inicio_do_periodo, rotulos_status
+
+def montar_eixos(dia_ini, dia_fim, cob_nomes, rotulos_faixa, pontos_maximos):
+    """Eixos das figuras ao vivo: resolução e períodos do gráfico por data, COBs e faixas"""
+    cobs = sorted(set(cob_nomes))
+    resolucao = escolher_resolucao(dia_ini, dia_fim, len(cobs), pontos_maximos)
+    dias = np.arange(np.datetime64(dia_ini, 'D'), np.datetime64(dia_fim, 'D') + 1)
+    periodos = np.unique(inicio_do_periodo(dias, resolucao))
+
+    return {
+        'inicio': str(np.datetime64(dia_ini, 'D')),
+        'fim': str(np.datetime64(dia_fim, 'D')),
+        'resolucao': resolucao,
+        'periodos': [str(periodo) for periodo in periodos],
+        'cobs': cobs,
+        'faixas': sorted(set(rotulos_faixa)),
+    }
+
+
+def linhas_zeradas(eixos):
+    """Linhas com quantidade zero que tornam densos os agrupamentos dos gráficos
+
+    Um bloco por agrupamento: (período, COB), (faixa, COB) e (COB, status).
+    As datas incluem o primeiro e o último dia do filtro, para o gráfico por
+    data escolher a mesma resolução dos eixos.
+    """
+    cobs, faixas = eixos['cobs'], eixos['faixas']
+    if not cobs:
+        return pd.DataFrame()
+
+    inicio = np.datetime64(eixos['inicio'], 'D')
+    datas = np.maximum(np.array(eixos['periodos'], dtype='datetime64[D]'), inicio)
+    datas = np.unique(np.append(datas, np.datetime64(eixos['fim'], 'D')))
+    n_datas, n_faixas, n_cobs = len(datas), len(faixas), len(cobs)
+
+    estado = np.concatenate([
+        np.ones(n_datas * n_cobs + n_faixas * n_cobs, dtype='int8'),
+        np.tile(np.array([1, 0], dtype='int8'), n_cobs),
+    ])
+    return pd.DataFrame({
+        'data': np.concatenate([
+            np.repeat(datas, n_cobs), np.full(n_faixas * n_cobs, inicio), np.full(2 * n_cobs, inicio)
+        ]).astype('datetime64[ns]'),
+        'cob_nome': np.concatenate([
+            np.tile(cobs, n_datas), np.tile(cobs, n_faixas), np.repeat(cobs, 2)
+        ]).astype(object),
+        'faixa_horaria': np.concatenate([
+            np.full(n_datas * n_cobs, faixas[0]), np.repeat(faixas, n_cobs), np.full(2 * n_cobs, faixas[0])
+        ]).astype(object),
+        'estado': estado,
+        'status': rotulos_status(estado),
+        'quantidade': 0,
+        'duracao_total': 0.0,
+    })
+
+
+def tornar_densa(dff, eixos):
+    """Janela acrescida das linhas zeradas (apenas as colunas usadas pelos gráficos densos)"""
+    zeradas = linhas_zeradas(eixos)
+    if dff.empty:
+        return zeradas
+    return pd.concat([dff[zeradas.columns], zeradas], ignore_index=True) if not zeradas.empty else dff
+
+
+def figura_em_listas(figura):
+    """Figura como dicionário com listas JSON no lugar dos arrays binários
+
+    O Patch soma em posições de listas; arrays numpy seriam enviados como
+    base64 ({'dtype', 'bdata'}) e não poderiam ser alterados no navegador.
+    """
+    if isinstance(figura, dict):
+        return figura
+
+    dados = figura.to_plotly_json()
+    for trace, original in zip(dados['data'], figura.data):
+        for atributo in ('x', 'y', 'values'):
+            if atributo in trace:
+                trace[atributo] = np.asarray(original[atributo]).tolist()
+    return dados
+
+
+def _somar(chaves, quantidade):
+    """[[trace, posição, quantidade], ...] somando as quantidades de cada posição"""
+    tabela = pd.DataFrame(chaves).assign(quantidade=quantidade)
+    somas = tabela.groupby(list(chaves))['quantidade'].sum()
+    return [[int(trace), int(posicao), int(total)] for (trace, posicao), total in somas.items() if total]
+
+
+def incrementos(delta, eixos):
+    """Posições [trace, posição, quantidade] a somar em cada gráfico denso, por tipo
+
+    Tipos: 'data' (COB x período), 'faixa' (COB x faixa), 'status' (status x COB)
+    e 'pizza' (COB das atendidas). Retorna None se alguma chamada cai fora dos
+    eixos (um COB novo): então o painel precisa ser remontado.
+    """
+    delta = delta[delta['cob_nome'].notna()]
+    if delta.empty:
+        return {'data': [], 'faixa': [], 'status': [], 'pizza': []}
+
+    cob = pd.Index(eixos['cobs']).get_indexer(delta['cob_nome'])
+    faixa = pd.Index(eixos['faixas']).get_indexer(delta['faixa_horaria'])
+    periodos = np.array(eixos['periodos'], dtype='datetime64[D]')
+    if not len(periodos):
+        return None
+    inicio_periodo = inicio_do_periodo(delta['data'].to_numpy(), eixos['resolucao'])
+    periodo = np.minimum(np.searchsorted(periodos, inicio_periodo), len(periodos) - 1)
+    if (cob < 0).any() or (faixa < 0).any() or (periodos[periodo] != inicio_periodo).any():
+        return None
+
+    quantidade = delta['quantidade'].to_numpy()
+    estado = delta['estado'].to_numpy()
+    atendida = estado == 1
+    com_status = np.isin(estado, (0, 1))
+
+    return {
+        'data': _somar({'trace': cob, 'posicao': periodo}, quantidade),
+        'faixa': _somar({'trace': cob, 'posicao': faixa}, quantidade),
+        # Atendido (estado 1) é o trace 0 e Não Atendido (estado 0) o trace 1
+        'status': _somar({'trace': 1 - estado[com_status], 'posicao': cob[com_status]}, quantidade[com_status]),
+        'pizza': _somar({'trace': np.zeros(atendida.sum(), dtype='int64'), 'posicao': cob[atendida]}, quantidade[atendida]),
+    }
+
+
+def patch_incrementos(lista, atributo):
+    """Patch que soma cada quantidade à posição do trace (atributo 'y' ou 'values')"""
+    figura = Patch()
+    for trace, posicao, quantidade in lista:
+        figura['data'][trace][atributo][posicao] += quantidade
+    return figura
+
+
+def patch_indicador(figura):
+    """Patch apenas com o valor, a referência e o título de uma figura go.Indicator"""
+    indicador = figura.data[0]
+    patch = Patch()
+    patch['data'][0]['value'] = indicador.value
+    patch['data'][0]['delta']['reference'] = indicador.delta.reference
+    patch['data'][0]['title']['text'] = indicador.title.text
+    return patch
+
+
+def contar_atendentes(dff):
+    """Atendidas por teleatendente e COB: [[teleatendente, cob_nome, quantidade], ...]"""
+    if dff.empty:
+        return []
+    atendidas = dff[dff['estado'] == 1]
+    somas = atendidas.groupby(['teleatendente', 'cob_nome'], dropna=False)['quantidade'].sum()
+    return [
+        [None if pd.isna(teleatendente) else teleatendente, None if pd.isna(cob_nome) else cob_nome, int(total)]
+        for (teleatendente, cob_nome), total in somas.items() if total
+    ]
+
+
+def somar_atendentes(atendentes, delta):
+    """Soma duas listas de contar_atendentes"""
+    somas = {}
+    for teleatendente, cob_nome, total in atendentes + delta:
+        chave = (teleatendente, cob_nome)
+        somas[chave] = somas.get(chave, 0) + total
+    return [[teleatendente, cob_nome, total] for (teleatendente, cob_nome), total in somas.items()]
+
+
+def chamadas_de_topo(atendentes, resumo):
+    """Janela mínima para os indicadores de topo, montada a partir dos totais acumulados
+
+    Atendidas por teleatendente e COB e não atendidas por COB (do resumo):
+    os agrupamentos dos indicadores dão o mesmo resultado que sobre as chamadas.
+    """
+    colunas = ['teleatendente', 'cob_nome', 'quantidade']
+    atendidas = pd.DataFrame(atendentes, columns=colunas).assign(estado=1)
+    nao_atendidas = pd.DataFrame(
+        [[None, item['cob_nome'], item['nao_atendidas']] for item in resumo['por_cob'] if item['nao_atendidas']],
+        columns=colunas
+    ).assign(estado=0)
+    return pd.concat([atendidas, nao_atendidas], ignore_index=True)
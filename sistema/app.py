@@ -1,31 +1,184 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, ctx
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
 import re
+import io
 import os
+import atexit
 import threading
+import fcntl
+from time import perf_counter
 import sqlite3
 from contextlib import contextmanager
+from functools import wraps
 from threading import Thread
+from rollups import criar_tabela_rollup, atualizar_rollups, consultar_agregado, filtro_dimensoes
+from deduplicacao import COLUNAS_CONTEUDO, SQL_TABELA_CHAMADAS, hashes_conteudo, inserir_colisoes, migrar_para_hash
+from cache_resultados import CacheResultados
+from conexoes_sqlite import PoolConexoes
+from armazem_chamadas import ArmazemChamadas, COLUNAS_ARMAZEM
+from snapshot_armazem import SnapshotArmazem
+from monitor_csv import MonitorCSV
+from ingestao_api import BufferIngestao
+from exportacao import XLSX_DISPONIVEL, ler_em_blocos, gerar_csv, gerar_xlsx
+from arquivo_parquet import ArquivoParquet, PARQUET_DISPONIVEL, combinar_agregados, consultar_recentes
+from catalogo_dimensoes import CatalogoDimensoes, periodo_chamadas
+from indicadores import resumir_chamadas, resumir_armazem, combinar_resumos
+from ao_vivo import (
+    montar_eixos, tornar_densa, figura_em_listas, incrementos, patch_incrementos, patch_indicador,
+    contar_atendentes, somar_atendentes, chamadas_de_topo
+)
+from colunas_derivadas import codigos_estado, colunas_de_tempo, rotulos_status, escolher_resolucao, inicio_do_periodo
+from metricas import Metricas, LIMITES_BYTES, LIMITES_LINHAS
+from flask import Response, g, jsonify, request
+from urllib.parse import urlencode
+from plotly.io.json import to_json_plotly
 
 
 # Configurações do banco de dados e arquivo CSV
 DB_PATH = 'data/dados_chamadas.db'
 CSV_PATH = 'data/geral_df.csv'
 
+# Parâmetros da carga em lote
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 5000))
+INGEST_CACHE_KB = int(os.environ.get('INGEST_CACHE_KB', 65536))
+CSV_CHUNK_SIZE = int(os.environ.get('CSV_CHUNK_SIZE', 200000))
+
+# Conexões do pool: cache de páginas (KB) e mapeamento em memória (MB) de cada
+# uma, e quantas ficam abertas, ociosas, entre as requisições
+SQLITE_CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB', 16384))
+SQLITE_MMAP_MB = int(os.environ.get('SQLITE_MMAP_MB', 256))
+SQLITE_CONEXOES_OCIOSAS = int(os.environ.get('SQLITE_CONEXOES_OCIOSAS', 16))
+
+# Fonte das consultas do dashboard: 'sqlite' (consulta indexada apenas da janela
+# selecionada), 'memoria' (histórico completo em cache no processo), 'snapshot'
+# (histórico em arquivos mapeados em memória, compartilhados pelos workers do gunicorn)
+# ou 'parquet' (meses arquivados em Parquet, lidos só na janela, e as chamadas
+# ainda não arquivadas do banco)
+FONTE_CONSULTA = os.environ.get('FONTE_CONSULTA', 'sqlite')
+if FONTE_CONSULTA == 'parquet' and not PARQUET_DISPONIVEL:
+    print("⚠️ pyarrow não instalado: consultas pelo banco (FONTE_CONSULTA=sqlite)")
+    FONTE_CONSULTA = 'sqlite'
+USA_ARMAZEM = FONTE_CONSULTA in ('memoria', 'snapshot')
+
+# Diretório do snapshot do modo 'snapshot' (gravado pelo processo responsável pela ingestão)
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'data/snapshot')
+
+# Índices e somas do armazém gravados no snapshot e mapeados pelos workers, que
+# só calculam os das chamadas seguintes: regravados a cada SNAPSHOT_DERIVADOS_LINHAS
+# chamadas acrescentadas (até esse tanto calculado em memória por worker)
+SNAPSHOT_DERIVADOS_LINHAS = int(os.environ.get('SNAPSHOT_DERIVADOS_LINHAS', 1_000_000))
+
+# Arquivo Parquet do modo 'parquet': diretório, intervalo (s) entre as atualizações
+# (0 apenas na carga inicial) e linhas por grupo dos arquivos mensais
+ARQUIVO_DIR = os.environ.get('ARQUIVO_DIR', 'data/arquivo')
+ARQUIVO_INTERVALO = int(os.environ.get('ARQUIVO_INTERVALO', 300))
+ARQUIVO_LINHAS_GRUPO = int(os.environ.get('ARQUIVO_LINHAS_GRUPO', 65536))
+
+# Intervalo (s) do monitor de novos CSVs em data/; 0 desativa
+MONITOR_CSV_INTERVALO = int(os.environ.get('MONITOR_CSV_INTERVALO', 30))
+
+# Tamanho (MB) dos blocos em que o monitor lê as linhas novas de cada CSV
+MONITOR_CSV_BLOCO_MB = int(os.environ.get('MONITOR_CSV_BLOCO_MB', 64))
+
+# Carga inicial (banco, CSV e cache) em segundo plano: o servidor atende logo após
+# a importação e o painel mostra o progresso; 0 faz a carga durante a importação
+CARGA_EM_SEGUNDO_PLANO = os.environ.get('CARGA_EM_SEGUNDO_PLANO', '1') == '1'
+
+# Intervalo (ms) da consulta ao progresso da carga inicial pelo navegador
+INTERVALO_PROGRESSO_MS = int(os.environ.get('INTERVALO_PROGRESSO_MS', 2000))
+
+# Ingestão pela API (POST /api/chamadas): chamadas acumuladas em memória e gravadas
+# em micro-lotes de INGEST_API_LOTE chamadas ou a cada INGEST_API_INTERVALO_MS;
+# com INGEST_API_CAPACIDADE chamadas pendentes, a API responde 429
+INGEST_API_LOTE = int(os.environ.get('INGEST_API_LOTE', 5000))
+INGEST_API_INTERVALO_MS = int(os.environ.get('INGEST_API_INTERVALO_MS', 200))
+INGEST_API_CAPACIDADE = int(os.environ.get('INGEST_API_CAPACIDADE', 100000))
+
+# Micro-lote com erro na gravação: INGEST_API_TENTATIVAS tentativas com espera
+# dobrando e, depois delas, CSV em INGEST_API_FALHAS_DIR para recarga
+INGEST_API_TENTATIVAS = int(os.environ.get('INGEST_API_TENTATIVAS', 5))
+INGEST_API_FALHAS_DIR = os.environ.get('INGEST_API_FALHAS_DIR', 'data/api_falhas')
+
+# Segundos para gravar o buffer da API ao encerrar o processo (o restante vai para
+# INGEST_API_FALHAS_DIR); o graceful_timeout do gunicorn deve cobrir esse tempo
+INGEST_API_PARADA_S = int(os.environ.get('INGEST_API_PARADA_S', 20))
+
+# Pontos (períodos x COBs) do gráfico por data: acima disso, agrupa por semana ou mês
+GRAFICO_MAX_PONTOS = int(os.environ.get('GRAFICO_MAX_PONTOS', 1500))
+
+# Limite do JSON de cada figura enviada ao navegador
+FIGURA_MAX_BYTES = int(os.environ.get('FIGURA_MAX_BYTES', 1_000_000))
+
+# Modo ao vivo: a cada AO_VIVO_INTERVALO_MS o painel soma apenas as chamadas gravadas
+# desde a última atualização, até AO_VIVO_LIMITE por vez (o restante fica para a próxima)
+AO_VIVO_INTERVALO_MS = int(os.environ.get('AO_VIVO_INTERVALO_MS', 5000))
+AO_VIVO_LIMITE = int(os.environ.get('AO_VIVO_LIMITE', 50000))
+
+# Exportação das chamadas filtradas (GET /api/chamadas/exportar): linhas lidas do
+# banco e escritas na resposta por vez
+EXPORT_BLOCO_LINHAS = int(os.environ.get('EXPORT_BLOCO_LINHAS', 10000))
+
 # Cache global para os dados
 _cache_dados = {
-    'dataframe': None,
+    'armazem': None,
+    'catalogo': None,
+    'versao_snapshot': None,
     'lock': threading.Lock()
 }
 
+# Snapshot do armazém em disco, mapeado somente leitura por todos os workers
+snapshot = SnapshotArmazem(SNAPSHOT_DIR, linhas_derivados=SNAPSHOT_DERIVADOS_LINHAS)
+
+# Cache dos resultados do dashboard por filtros normalizados (invalidado na carga)
+_cache_resultados = CacheResultados(
+    tamanho_maximo=int(os.environ.get('RESULT_CACHE_SIZE', 64)),
+    ttl=int(os.environ.get('RESULT_CACHE_TTL', 300))
+)
+
+# Janelas filtradas compartilhadas pelos callbacks dos painéis
+_cache_janelas = CacheResultados(tamanho_maximo=4, ttl=60)
+
+# Serializa as cargas feitas pelo processo (carga inicial, monitor de CSV)
+_lock_ingestao = threading.Lock()
+
+# Métricas de desempenho expostas em /metrics: METRICAS=1 ativa a coleta e
+# METRICAS_LOG=1 também imprime cada etapa medida como uma linha JSON
+metricas = Metricas(
+    ativo=os.environ.get('METRICAS') == '1',
+    log=os.environ.get('METRICAS_LOG') == '1'
+)
+metricas.descrever('etapa_segundos', 'Duração de cada etapa do processamento')
+metricas.descrever('janela_linhas', 'Linhas lidas por consulta de janela do dashboard', LIMITES_LINHAS)
+metricas.descrever('linhas_lidas_total', 'Total de linhas lidas pelas consultas do dashboard')
+metricas.descrever('resposta_bytes', 'Tamanho da resposta de cada callback do Dash', LIMITES_BYTES)
+metricas.descrever('requisicoes_total', 'Requisições de callbacks do Dash por saída')
+metricas.descrever('exportacoes_total', 'Exportações das chamadas filtradas por formato')
+
 # Flag de carga inicial
 INITIAL_LOAD_COMPLETE = False
 
+# Etapa e progresso da carga inicial, exibidos em status-api até a carga terminar
+_progresso_carga = {'etapa': 'Iniciando', 'registros': 0, 'fracao': None}
+_carga_inicial_encerrada = threading.Event()
+
+# Dicionário para mapear os valores de COB para os nomes das regiões
+cob_legend = {
+    11: '1ºCOB - Divinópolis',
+    21: '2ºCOB - Uberlândia',
+    22: '2ºCOB - Uberaba',
+    31: '3ºCOB - Juiz de Fora',
+    32: '3ºCOB - Barbacena',
+    4: '4ºCOB - Montes Claros',
+    51: '5ºCOB - Governador Valadares',
+    52: '5ºCOB - Ipatinga',
+    61: '6ºCOB - Varginha'
+}
+
 # Função para definir faixa horária
 def definir_faixa_horaria(hora):
     if 0 <= hora < 2: return '00-02h'
@@ -41,42 +194,99 @@ def definir_faixa_horaria(hora):
     elif 20 <= hora < 22: return '20-22h'
     else: return '22-24h'
 
+# Rótulo da faixa horária de cada hora do dia
+ROTULOS_FAIXA_HORARIA = [definir_faixa_horaria(hora) for hora in range(24)]
+
+# Expressão SQL que normaliza data + hora em segundos desde a época (coluna ts)
+SQL_TS_CHAMADA = "CAST(strftime('%s', {data} || ' ' || {hora}) AS INTEGER)"
+
+
+def _para_ts(datahora):
+    """Converte um datetime para o valor da coluna ts"""
+    return int(pd.Timestamp(datahora).value // 10**9)
+
+
 # Funções do banco de dados
-@contextmanager
+# Com o WAL (ativado em init_database) os leitores não esperam a ingestão e vice-versa;
+# synchronous=NORMAL é seguro no WAL e evita um fsync por transação
+_pool_conexoes = PoolConexoes(
+    timeout=30,
+    pragmas=[
+        'synchronous = NORMAL',
+        f'cache_size = -{SQLITE_CACHE_KB}',
+        f'mmap_size = {SQLITE_MMAP_MB * 2**20}',
+        'temp_store = MEMORY',
+    ],
+    maximo_ociosas=SQLITE_CONEXOES_OCIOSAS
+)
+
+
 def get_db_connection():
-    """Context manager para conexões com o banco de dados"""
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    try:
-        yield conn
-    finally:
-        conn.close()
+    """Context manager com uma conexão do pool (devolvida ao final, sem transação aberta)"""
+    return _pool_conexoes.conexao(DB_PATH)
 
 def init_database():
     """Inicializa o banco de dados com as tabelas necessárias"""
     with get_db_connection() as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS chamadas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data TEXT NOT NULL,
-                hora TEXT NOT NULL,
-                duracao REAL,
-                fila TEXT,
-                teleatendente TEXT,
-                estado INTEGER,
-                cob INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(data, hora, duracao, fila, teleatendente, estado, cob)
-            )
+        # Persistente no arquivo: basta ativar uma vez
+        conn.execute("PRAGMA journal_mode = WAL")
+        
+        # Repetições são descartadas pelo índice único do hash do conteúdo (hash_conteudo)
+        conn.execute(SQL_TABELA_CHAMADAS.format(tabela='chamadas'))
+        
+        # Migração: bancos antigos não possuem a coluna ts (data + hora em segundos)
+        colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(chamadas)")]
+        if 'ts' not in colunas:
+            print("🔧 Adicionando coluna ts à tabela chamadas...")
+            conn.execute("ALTER TABLE chamadas ADD COLUMN ts INTEGER")
+        
+        conn.execute(f'''
+            UPDATE chamadas SET ts = {SQL_TS_CHAMADA.format(data='data', hora='hora')}
+            WHERE ts IS NULL
         ''')
         
+        # Migração: bancos anteriores deduplicavam com UNIQUE nas sete colunas do conteúdo
+        if 'hash_conteudo' not in colunas:
+            migrar_para_hash(conn)
+        
         conn.execute('''
             CREATE INDEX IF NOT EXISTS idx_data ON chamadas(data)
         ''')
         
         conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_cob ON chamadas(cob)
+            CREATE INDEX IF NOT EXISTS idx_ts ON chamadas(ts)
+        ''')
+        
+        # O índice composto (cob, ts) também atende consultas só por cob
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_cob_ts ON chamadas(cob, ts)
         ''')
         
+        conn.execute('''
+            DROP INDEX IF EXISTS idx_cob
+        ''')
+        
+        # Agregados por hora usados pelo dashboard
+        criar_tabela_rollup(conn)
+        
+        # Total de chamadas e última gravação, mantidos pela ingestão (status-api sem varrer a tabela)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS status_chamadas (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total INTEGER NOT NULL,
+                ultima_atualizacao TIMESTAMP
+            )
+        ''')
+        if conn.execute("SELECT 1 FROM status_chamadas").fetchone() is None:
+            # Migração: bancos anteriores são contados uma única vez
+            conn.execute('''
+                INSERT INTO status_chamadas (id, total, ultima_atualizacao)
+                SELECT 1, COUNT(*), MAX(created_at) FROM chamadas
+            ''')
+        
+        # Posição já lida de cada CSV monitorado
+        MonitorCSV.criar_tabela(conn)
+        
         conn.execute('''
             CREATE TABLE IF NOT EXISTS sync_log (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -93,80 +303,230 @@ def init_database():
         print("✅ Banco de dados inicializado")
 
 
-def salvar_dados_banco(df, origem="csv"):
-    """Salva dados no banco, evitando duplicatas"""
+def invalidar_caches():
+    """Descarta resultados e janelas do dashboard calculados com dados antigos"""
+    _cache_resultados.invalidar()
+    _cache_janelas.invalidar()
+
+
+def registrar_sync(sync_type, url, records_added, status, details=None):
+    """Registra uma execução de carga na tabela sync_log"""
+    try:
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO sync_log (sync_type, url, records_added, status, details)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (sync_type, url, records_added, status, details))
+            conn.commit()
+    except Exception as e:
+        print(f"❌ Erro ao registrar carga no sync_log: {e}")
+
+
+@contextmanager
+def _conexao_ingestao():
+    """Conexão do pool com o cache ampliado para cargas em lote (restaurado ao devolvê-la)"""
+    with get_db_connection() as conn:
+        conn.execute(f"PRAGMA cache_size = -{INGEST_CACHE_KB}")
+        try:
+            yield conn
+        finally:
+            conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+
+
+def _registros_para_insercao(df):
+    """Converte o DataFrame em tuplas tipadas (COLUNAS_CHAMADAS e o hash do conteúdo), coluna a coluna"""
+    total = len(df)
+
+    def coluna(nome, padrao):
+        if nome in df.columns:
+            return df[nome].fillna(padrao)
+        return pd.Series([padrao] * total, index=df.index)
+
+    data = df['data']
+    if pd.api.types.is_datetime64_any_dtype(data):
+        data = data.dt.strftime('%Y-%m-%d')
+
+    colunas = (
+        data.astype(str).tolist(),
+        df['hora'].astype(str).tolist(),
+        pd.to_numeric(coluna('duracao', 0), errors='coerce').fillna(0).astype(float).tolist(),
+        coluna('fila', '').astype(str).tolist(),
+        coluna('teleatendente', '').astype(str).tolist(),
+        pd.to_numeric(coluna('estado', 0), errors='coerce').fillna(0).astype('int64').tolist(),
+        pd.to_numeric(coluna('cob', 0), errors='coerce').fillna(0).astype('int64').tolist(),
+    )
+    return list(zip(*colunas, hashes_conteudo(colunas).tolist()))
+
+
+COLUNAS_CHAMADAS = COLUNAS_CONTEUDO
+
+SQL_INSERIR_CHAMADA = f'''
+    INSERT OR IGNORE INTO chamadas 
+    (data, hora, duracao, fila, teleatendente, estado, cob, hash_conteudo, ts)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, {SQL_TS_CHAMADA.format(data='?1', hora='?2')})
+'''
+
+SQL_ATUALIZAR_STATUS = '''
+    UPDATE status_chamadas SET total = total + ?, ultima_atualizacao = CURRENT_TIMESTAMP WHERE id = 1
+'''
+
+
+@metricas.medido('ingestao')
+def salvar_dados_banco(df, origem="csv", tamanho_lote=None):
+    """Salva dados no banco em lotes, evitando duplicatas"""
     if df.empty:
         print("⚠️ DataFrame vazio, nada para salvar")
         return 0
     
+    tamanho_lote = tamanho_lote or INGEST_BATCH_SIZE
+    registros = _registros_para_insercao(df)
     records_added = 0
     
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    with _conexao_ingestao() as conn:
+        id_inicial = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+        conn.commit()
         
-        for _, row in df.iterrows():
+        for inicio in range(0, len(registros), tamanho_lote):
+            lote = registros[inicio:inicio + tamanho_lote]
+            # Último id lido com a escrita já travada: chamadas gravadas por outro
+            # processo antes do lote não entram de novo nos agregados deste
+            conn.execute("BEGIN IMMEDIATE")
+            alteracoes_antes = conn.total_changes
+            ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+            
             try:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO chamadas 
-                    (data, hora, duracao, fila, teleatendente, estado, cob)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    row['data'], row['hora'], row.get('duracao', 0), row.get('fila', ''),
-                    row.get('teleatendente', ''), row.get('estado', 0), row.get('cob', 0)
-                ))
-                
-                if cursor.rowcount > 0:
-                    records_added += 1
-                    
+                # Cada lote é uma transação: o bloqueio de escrita é liberado entre lotes
+                conn.executemany(SQL_INSERIR_CHAMADA, lote)
+                # Contadas antes da conferência, cuja tabela temporária também altera linhas
+                inseridos = conn.total_changes - alteracoes_antes
+                if inseridos < len(lote):
+                    # Recusadas: repetidas ou, raramente, com o hash de outra chamada
+                    inseridos += inserir_colisoes(conn, lote, SQL_INSERIR_CHAMADA)
+                if inseridos:
+                    atualizar_rollups(conn, ultimo_id)
+                    conn.execute(SQL_ATUALIZAR_STATUS, (inseridos,))
+                conn.commit()
             except Exception as e:
-                print(f"❌ Erro ao inserir registro: {e}")
-                continue
-        
-        # Log da carga
-        # cursor.execute('''
-        #     INSERT INTO sync_log (arquivo, records_total, records_added, status, details)
-        #     VALUES (?, ?, ?, ?, ?)
-        # ''', (origem, len(df), records_added, "success", f"Processados {len(df)} registros"))
+                conn.rollback()
+                print(f"⚠️ Erro no lote iniciado em {inicio}, inserindo registro a registro: {e}")
+                conn.execute("BEGIN IMMEDIATE")
+                alteracoes_antes = conn.total_changes
+                ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+                
+                executados = []
+                for registro in lote:
+                    try:
+                        conn.execute(SQL_INSERIR_CHAMADA, registro)
+                        executados.append(registro)
+                    except Exception as e:
+                        print(f"❌ Erro ao inserir registro: {e}")
+                        continue
+                inseridos = conn.total_changes - alteracoes_antes
+                if inseridos < len(executados):
+                    inseridos += inserir_colisoes(conn, executados, SQL_INSERIR_CHAMADA)
+                if inseridos:
+                    atualizar_rollups(conn, ultimo_id)
+                    conn.execute(SQL_ATUALIZAR_STATUS, (inseridos,))
+                conn.commit()
+            
+            # INSERT OR IGNORE só contabiliza as linhas efetivamente inseridas
+            records_added += inseridos
         
-        conn.commit()
+    # Resultados calculados antes da carga ficaram desatualizados
+    if records_added > 0:
+        atualizar_catalogo(id_inicial)
+        invalidar_caches()
     
     print(f"💾 Salvos {records_added} novos registros no banco (de {len(df)} processados)")
     return records_added
 
-def carregar_dados_banco():
-    """Carrega todos os dados do banco para um DataFrame"""
-    try:
-        with get_db_connection() as conn:
-            df = pd.read_sql_query('''
-                SELECT data, hora, duracao, fila, teleatendente, estado, cob
-                FROM chamadas 
-                ORDER BY data DESC, hora DESC
-            ''', conn)
+def obter_catalogo():
+    """Retorna o catálogo de dimensões em memória (montado na primeira chamada)"""
+    catalogo = _cache_dados['catalogo']
+    if catalogo is None:
+        if FONTE_CONSULTA == 'snapshot':
+            catalogo = CatalogoDimensoes.do_armazem(carregar_dados())
+        else:
+            with get_db_connection() as conn:
+                catalogo = CatalogoDimensoes.do_banco(conn)
+        _cache_dados['catalogo'] = catalogo
+    return catalogo
+
+
+def atualizar_catalogo(id_inicial):
+    """Acrescenta ao catálogo as dimensões das chamadas com id maior que id_inicial"""
+    catalogo = _cache_dados['catalogo']
+    if catalogo is None:
+        return
+    
+    with get_db_connection() as conn:
+        _cache_dados['catalogo'] = catalogo.com_chamadas_novas(conn, id_inicial)
+
+
+def preparar_chamadas_csv(df):
+    """Limpa e tipa um bloco de chamadas lido do CSV"""
+    # Remover linhas com valores nulos em colunas críticas
+    df = df.dropna(subset=['data', 'hora'])
+    
+    # Converter tipos de dados
+    df['data'] = pd.to_datetime(df['data'], errors='coerce').dt.strftime('%Y-%m-%d')
+    df = df.dropna(subset=['data'])  # Remover datas inválidas
+    
+    # Garantir que hora está no formato string
+    df['hora'] = df['hora'].astype(str)
+    
+    # Converter duracao para float
+    df['duracao'] = pd.to_numeric(df['duracao'], errors='coerce').fillna(0)
+    
+    # Converter estado e cob para inteiro
+    df['estado'] = pd.to_numeric(df['estado'], errors='coerce').fillna(0).astype(int)
+    df['cob'] = pd.to_numeric(df['cob'], errors='coerce').fillna(0).astype(int)
+    
+    # Garantir que fila e teleatendente são strings
+    df['fila'] = df['fila'].astype(str).fillna('')
+    df['teleatendente'] = df['teleatendente'].astype(str).fillna('')
+    
+    return df
+
+
+def informar_progresso(etapa=None, registros=0, fracao=None):
+    """Atualiza a etapa (mantida se omitida) e o progresso da carga inicial"""
+    _progresso_carga.update(etapa=etapa or _progresso_carga['etapa'], registros=registros, fracao=fracao)
+
+
+def carregar_csv_em_blocos(caminho, tamanho_bloco=None, tamanho_lote=None):
+    """Lê o CSV em blocos e salva cada bloco no banco, com memória limitada"""
+    tamanho_bloco = tamanho_bloco or CSV_CHUNK_SIZE
+    tamanho_arquivo = os.path.getsize(caminho) or 1
+    records_added = 0
+    processados = 0
+    
+    print(f"📖 Lendo arquivo CSV em blocos de {tamanho_bloco}: {caminho}")
+    
+    with open(caminho, 'rb') as arquivo:
+        leitor = pd.read_csv(
+            arquivo,
+            usecols=COLUNAS_CHAMADAS,
+            dtype={'hora': str, 'fila': str, 'teleatendente': str},
+            chunksize=tamanho_bloco
+        )
         
-        if not df.empty:
-            # Converter tipos de forma mais robusta
-            df['data'] = pd.to_datetime(df['data'], errors='coerce')
-            
-            # Remover linhas com data inválida
-            df = df.dropna(subset=['data'])
-            
-            df['estado'] = df['estado'].astype('Int64')
-            df['cob'] = df['cob'].astype('Int64')
-            df['duracao'] = pd.to_numeric(df['duracao'], errors='coerce').fillna(0)
+        for bloco in leitor:
+            bloco = preparar_chamadas_csv(bloco)
+            if bloco.empty:
+                continue
             
-            print(f"📊 Carregados {len(df)} registros do banco")
-        
-        return df
-        
-    except Exception as e:
-        print(f"❌ Erro ao carregar dados do banco: {e}")
-        return pd.DataFrame()
+            records_added += salvar_dados_banco(bloco, caminho, tamanho_lote)
+            processados += len(bloco)
+            # A posição do leitor no arquivo aproxima a fração já carregada
+            informar_progresso(registros=processados, fracao=min(arquivo.tell() / tamanho_arquivo, 1.0))
+            print(f"📝 {processados} registros válidos processados")
+    
+    return records_added
 
 
 def carregar_csv_para_banco():
     """Carrega o CSV completo e salva no banco (executa apenas uma vez)"""
-    global INITIAL_LOAD_COMPLETE, _cache_dados
-    
     print("🔄 Iniciando carga do CSV para o banco...")
     
     try:
@@ -176,151 +536,734 @@ def carregar_csv_para_banco():
         
         # Verificar se já existe dados no banco
         with get_db_connection() as conn:
-            cursor = conn.execute("SELECT COUNT(*) FROM chamadas")
+            cursor = conn.execute("SELECT total FROM status_chamadas")
             count = cursor.fetchone()[0]
             
             if count > 0:
                 print(f"✅ Banco já possui {count} registros, pulando carga do CSV")
-                INITIAL_LOAD_COMPLETE = True
-                
-                # Carregar dados do banco para o cache
-                df = carregar_dados_banco()
-                if not df.empty:
-                    _cache_dados['dataframe'] = df.copy()
                 return
         
-        # Ler o CSV
-        print(f"📖 Lendo arquivo CSV: {CSV_PATH}")
-        df = pd.read_csv(CSV_PATH)
-        
-        if df.empty:
-            print("⚠️ CSV está vazio")
-            return
-        
-        # Validar colunas necessárias
-        colunas_necessarias = ['data', 'hora', 'duracao', 'fila', 'teleatendente', 'estado', 'cob']
-        colunas_faltantes = [col for col in colunas_necessarias if col not in df.columns]
+        # Validar colunas necessárias (apenas o cabeçalho)
+        colunas_csv = pd.read_csv(CSV_PATH, nrows=0).columns
+        colunas_faltantes = [col for col in COLUNAS_CHAMADAS if col not in colunas_csv]
         
         if colunas_faltantes:
             print(f"❌ Colunas faltantes no CSV: {colunas_faltantes}")
             return
         
-        # Limpar e preparar dados
-        print("🧹 Limpando e preparando dados...")
-        
-        # Remover linhas com valores nulos em colunas críticas
-        df = df.dropna(subset=['data', 'hora'])
-        
-        # Converter tipos de dados
-        df['data'] = pd.to_datetime(df['data'], errors='coerce').dt.strftime('%Y-%m-%d')
-        df = df.dropna(subset=['data'])  # Remover datas inválidas
+        # Ler e salvar o CSV em blocos
+        informar_progresso('Carregando o CSV no banco', fracao=0.0)
+        tamanho_csv = os.path.getsize(CSV_PATH)
+        with _lock_ingestao:
+            records_added = carregar_csv_em_blocos(CSV_PATH)
         
-        # Garantir que hora está no formato string
-        df['hora'] = df['hora'].astype(str)
+        # O monitor de CSV continua a partir do ponto já carregado
+        monitor_csv.salvar_posicao(CSV_PATH, tamanho_csv)
+        registrar_sync('csv', CSV_PATH, records_added, 'success', 'Carga inicial do CSV')
         
-        # Converter duracao para float
-        df['duracao'] = pd.to_numeric(df['duracao'], errors='coerce').fillna(0)
-        
-        # Converter estado e cob para inteiro
-        df['estado'] = pd.to_numeric(df['estado'], errors='coerce').fillna(0).astype(int)
-        df['cob'] = pd.to_numeric(df['cob'], errors='coerce').fillna(0).astype(int)
-        
-        # Garantir que fila e teleatendente são strings
-        df['fila'] = df['fila'].astype(str).fillna('')
-        df['teleatendente'] = df['teleatendente'].astype(str).fillna('')
-        
-        print(f"📝 Dados preparados: {len(df)} registros válidos")
+        print(f"✅ Carga do CSV concluída: {records_added} registros adicionados ao banco")
         
-        # Salvar no banco
-        records_added = salvar_dados_banco(df, CSV_PATH)
+    except Exception as e:
+        print(f"❌ Erro ao carregar CSV para o banco: {e}")
+        import traceback
+        traceback.print_exc()
+    
+
+@metricas.medido('montar_armazem')
+def carregar_armazem_banco():
+    """Carrega as chamadas do banco, em blocos, para o armazenamento colunar compacto"""
+    with get_db_connection() as conn:
+        # O armazém cobre exatamente até ultimo_id: gravações concorrentes ficam para o delta
+        ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+        blocos = pd.read_sql_query(f'''
+            SELECT {', '.join(COLUNAS_ARMAZEM)}
+            FROM chamadas
+            WHERE ts IS NOT NULL AND id <= ?
+            ORDER BY ts
+        ''', conn, params=(ultimo_id,), chunksize=CSV_CHUNK_SIZE)
+        armazem = ArmazemChamadas.de_blocos(blocos, cob_legend, ROTULOS_FAIXA_HORARIA, ultimo_id=ultimo_id)
+    
+    print(f"📊 Carregados {len(armazem)} registros do banco ({armazem.nbytes / 2**20:.1f} MB em memória)")
+    return armazem
+
+
+def maior_id_chamadas():
+    """Maior id da tabela chamadas (0 se vazia)"""
+    with get_db_connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+
+
+def publicar_armazem(armazem):
+    """Publica um novo armazém trocando a referência (leitores em curso mantêm o anterior)
+
+    No modo snapshot o armazém é gravado em disco (até armazem.ultimo_id) e
+    publicado já mapeado do arquivo, como nos demais workers.
+    """
+    if FONTE_CONSULTA == 'snapshot':
+        with snapshot.trava_escrita():
+            snapshot.escrever(armazem, armazem.ultimo_id)
+        mapear_snapshot()
+        return
+    _cache_dados['armazem'] = armazem
+
+
+def mapear_snapshot():
+    """Publica o armazém mapeado da versão atual do snapshot (None se ainda não existe)"""
+    versao = snapshot.versao()
+    armazem = snapshot.ler(cob_legend, ROTULOS_FAIXA_HORARIA)
+    if armazem is None:
+        return None
+    
+    _cache_dados['armazem'] = armazem
+    _cache_dados['catalogo'] = CatalogoDimensoes.do_armazem(armazem)
+    _cache_dados['versao_snapshot'] = versao
+    return armazem
+
+
+def sincronizar_snapshot():
+    """Remapeia o snapshot quando o processo de ingestão publica uma nova versão (um stat)"""
+    global INITIAL_LOAD_COMPLETE
+    
+    if FONTE_CONSULTA != 'snapshot' or snapshot.versao() == _cache_dados['versao_snapshot']:
+        return
+    
+    with _cache_dados['lock']:
+        if snapshot.versao() != _cache_dados['versao_snapshot'] and mapear_snapshot() is not None:
+            INITIAL_LOAD_COMPLETE = True
+            invalidar_caches()
+            print(f"🗺️ Snapshot remapeado: {len(_cache_dados['armazem'])} registros")
+
+
+def sincronizar_armazem_inicial():
+    """Deixa o armazém (e, no modo snapshot, o arquivo) em dia com o banco após a carga inicial"""
+    if FONTE_CONSULTA == 'snapshot':
+        metadados = snapshot.ler_metadados()
+        ultimo_id = maior_id_chamadas()
         
-        print(f"✅ Carga do CSV concluída: {records_added} registros adicionados ao banco")
+        # Snapshot de um banco anterior (ultimo_id maior que o do banco) ou fora de ordem de ts é descartado
+        reaproveitar = metadados is not None and metadados.get('ordenado') and metadados['ultimo_id'] <= ultimo_id
+        if reaproveitar and mapear_snapshot() is not None:
+            if metadados['ultimo_id'] < ultimo_id:
+                aplicar_delta_armazem()
+            return
         
-        INITIAL_LOAD_COMPLETE = True
+        publicar_armazem(carregar_armazem_banco())
+    elif FONTE_CONSULTA == 'memoria':
+        publicar_armazem(carregar_armazem_banco())
+
+
+def carregar_dados():
+    """Função principal para carregar dados (do cache ou do banco)"""
+    if FONTE_CONSULTA == 'snapshot':
+        # Os workers nunca leem o banco: apenas o snapshot publicado
+        sincronizar_snapshot()
+        armazem = _cache_dados['armazem']
+        return armazem if armazem is not None else ArmazemChamadas.de_blocos([], cob_legend, ROTULOS_FAIXA_HORARIA)
+    
+    # O armazém publicado é imutável: a leitura da referência dispensa o lock
+    armazem = _cache_dados['armazem']
+    if armazem is not None:
+        return armazem
+    
+    # O lock serializa apenas a primeira carga
+    with _cache_dados['lock']:
+        if _cache_dados['armazem'] is None:
+            print("📊 Carregando dados do banco...")
+            publicar_armazem(carregar_armazem_banco())
+        return _cache_dados['armazem']
+
+
+def enriquecer_chamadas(df, coluna_ts='ts'):
+    """Cria as colunas derivadas usadas pelos indicadores e gráficos a partir do ts
+
+    Mesmo cálculo vetorizado usado pelo armazém em memória (colunas_derivadas):
+    aritmética inteira sobre o ts e tabelas de rótulos, sem conversões de texto.
+    """
+    for nome, valores in colunas_de_tempo(df[coluna_ts], ROTULOS_FAIXA_HORARIA).items():
+        df[nome] = valores
+    
+    df['cob_nome'] = df['cob'].map(cob_legend)
+    df['status'] = rotulos_status(codigos_estado(df['estado']))
+    
+    return df
+
+
+def obter_intervalo_chamadas():
+    """Retorna o primeiro e o último datetime das chamadas (do catálogo em memória)"""
+    catalogo = obter_catalogo()
+    return catalogo.inicio, catalogo.fim
+
+
+def sql_chamadas_janela(colunas, datahora_ini, datahora_fim, cobs=None, dimensoes=()):
+    """SELECT das colunas para as chamadas da janela, dos COBs, filas e teleatendentes selecionados: (sql, params)"""
+    sql = f'''
+        SELECT {', '.join(colunas)}
+        FROM chamadas
+        WHERE ts BETWEEN ? AND ?
+    '''
+    params = [_para_ts(datahora_ini), _para_ts(datahora_fim)]
+    
+    # Com a lista de COBs o SQLite percorre o índice (cob, ts) uma faixa por COB
+    if cobs:
+        sql += f" AND cob IN ({', '.join('?' * len(cobs))})"
+        params += [int(cob) for cob in cobs]
+    
+    sql_dimensoes, params_dimensoes = filtro_dimensoes(dimensoes)
+    return sql + sql_dimensoes, params + params_dimensoes
+
+
+@metricas.medido('sql_agregado')
+def consultar_chamadas_agregadas(datahora_ini, datahora_fim, cobs=None, dimensoes=()):
+    """Consulta a janela agregada por hora (agregados + bordas parciais das chamadas brutas)"""
+    try:
+        with get_db_connection() as conn:
+            df = consultar_agregado(conn, _para_ts(datahora_ini), _para_ts(datahora_fim), cobs, dimensoes)
+    except Exception as e:
+        print(f"❌ Erro ao consultar agregados no banco: {e}")
+        return pd.DataFrame()
+    
+    return enriquecer_chamadas(df, coluna_ts='hora_ts')
+
+
+@metricas.medido('parquet_agregado')
+def consultar_arquivo(datahora_ini, datahora_fim, cobs=None, dimensoes=()):
+    """Janela agregada por hora do arquivo Parquet e, do banco, das chamadas ainda não arquivadas: (marca, DataFrame)
+
+    A marca é o maior id do banco incluído, como em janela_ao_vivo.
+    """
+    ts_ini, ts_fim = _para_ts(datahora_ini), _para_ts(datahora_fim)
+    try:
+        ultimo_id, arquivadas = arquivo_parquet.agregar(ts_ini, ts_fim, cobs, dimensoes)
+        with get_db_connection() as conn:
+            marca = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+            recentes = consultar_recentes(conn, ultimo_id, marca, ts_ini, ts_fim, cobs, dimensoes)
+    except Exception as e:
+        print(f"❌ Erro ao consultar o arquivo Parquet: {e}")
+        return 0, pd.DataFrame()
+    
+    return marca, enriquecer_chamadas(combinar_agregados([arquivadas, recentes]), coluna_ts='hora_ts')
+
+
+def filtrar_chamadas(datahora_ini, datahora_fim, cobs=None, dimensoes=()):
+    """Retorna as chamadas da janela e dos COBs selecionados, conforme FONTE_CONSULTA
+
+    Cada linha traz 'quantidade' e 'duracao_total': nos modos sqlite e parquet
+    as linhas são agregados por hora; no modo memória, chamadas individuais
+    (quantidade 1). dimensoes são os filtros de fila e teleatendente (ver
+    normalizar_filtros).
+    """
+    if FONTE_CONSULTA == 'parquet':
+        return consultar_arquivo(datahora_ini, datahora_fim, cobs, dimensoes)[1]
+    
+    if not USA_ARMAZEM:
+        return consultar_chamadas_agregadas(datahora_ini, datahora_fim, cobs, dimensoes)
+    
+    return selecionar_do_armazem(carregar_dados(), datahora_ini, datahora_fim, cobs, dimensoes)
+
+
+def selecionar_do_armazem(armazem, datahora_ini, datahora_fim, cobs=None, dimensoes=()):
+    """Chamadas da janela e dos COBs selecionados de um armazém (quantidade 1 por linha)"""
+    if len(armazem) == 0:
+        return pd.DataFrame()
+    
+    # Apenas as chamadas da janela são decodificadas, já com as colunas derivadas;
+    # filas e teleatendentes são filtrados pelos índices bitmap do armazém
+    with metricas.etapa('selecionar'):
+        posicoes = armazem.selecionar(_para_ts(datahora_ini), _para_ts(datahora_fim), cobs, dimensoes)
+    with metricas.etapa('decodificar'):
+        dff = armazem.para_dataframe(posicoes)
+    
+    return dff.assign(quantidade=1, duracao_total=dff['duracao'])
+
+
+def janela_ao_vivo(datahora_ini, datahora_fim, cobs=None, dimensoes=()):
+    """Chamadas da janela e o maior id do banco que elas já incluem: (marca, DataFrame)"""
+    if USA_ARMAZEM:
+        armazem = carregar_dados()
+        return armazem.ultimo_id or 0, selecionar_do_armazem(armazem, datahora_ini, datahora_fim, cobs, dimensoes)
+    
+    if FONTE_CONSULTA == 'parquet':
+        return consultar_arquivo(datahora_ini, datahora_fim, cobs, dimensoes)
+    
+    # Marca e agregados lidos na mesma transação: nenhuma gravação fica entre os dois
+    with get_db_connection() as conn:
+        conn.execute("BEGIN")
+        marca = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+        df = consultar_agregado(conn, _para_ts(datahora_ini), _para_ts(datahora_fim), cobs, dimensoes)
+        conn.rollback()
+    
+    return marca, enriquecer_chamadas(df, coluna_ts='hora_ts')
+
+
+def ler_chamadas_novas(marca, datahora_ini, datahora_fim, cobs=None, dimensoes=()):
+    """Chamadas gravadas depois da marca (id > marca), da janela e dos COBs: (nova marca, DataFrame)
+
+    A leitura percorre apenas a faixa de ids nova da chave primária; a janela,
+    os COBs, as filas e os teleatendentes são filtrados depois, sobre as poucas
+    linhas lidas.
+    """
+    with get_db_connection() as conn:
+        df = pd.read_sql_query('''
+            SELECT id, duracao, fila, teleatendente, estado, cob, ts
+            FROM chamadas
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', conn, params=(marca, AO_VIVO_LIMITE))
+    
+    if df.empty:
+        return marca, df
+    
+    nova_marca = int(df['id'].iloc[-1])
+    na_janela = df['ts'].between(_para_ts(datahora_ini), _para_ts(datahora_fim))
+    if cobs:
+        na_janela &= df['cob'].isin(cobs)
+    for coluna, valores in dimensoes:
+        na_janela &= df[coluna].isin(valores)
+    df = df[na_janela].copy()
+    df['duracao'] = pd.to_numeric(df['duracao'], errors='coerce').fillna(0)
+    if USA_ARMAZEM:
+        # Mesma precisão do armazém (float32): os totais batem com o painel remontado
+        df['duracao'] = df['duracao'].astype('float32').astype('float64')
+    
+    df = enriquecer_chamadas(df)
+    return nova_marca, df.assign(quantidade=1, duracao_total=df['duracao'])
+
+
+def ler_delta_banco(ultimo_id):
+    """Chamadas com id maior que ultimo_id e o maior id entre elas: (DataFrame, novo ultimo_id)"""
+    with get_db_connection() as conn:
+        # O limite superior é lido antes: chamadas gravadas depois ficam para o próximo delta
+        novo_ultimo_id = conn.execute("SELECT COALESCE(MAX(id), ?) FROM chamadas", (ultimo_id,)).fetchone()[0]
+        delta = pd.read_sql_query(f'''
+            SELECT {', '.join(COLUNAS_ARMAZEM)}
+            FROM chamadas
+            WHERE id > ? AND id <= ? AND ts IS NOT NULL
+            ORDER BY ts
+        ''', conn, params=(ultimo_id, novo_ultimo_id))
+    return delta, novo_ultimo_id
+
+
+def aplicar_delta_armazem():
+    """Acrescenta ao armazém em memória apenas as chamadas gravadas depois dele (id > ultimo_id)"""
+    armazem = _cache_dados['armazem']
+    if armazem is None:
+        return
+    
+    if FONTE_CONSULTA == 'snapshot':
+        # Qualquer worker pode gravar (API de ingestão): sob a trava, o delta parte do
+        # último id já gravado no snapshot, e não do armazém mapeado por este processo
+        with snapshot.trava_escrita():
+            metadados = snapshot.ler_metadados()
+            if metadados is None:
+                return
+            delta, novo_ultimo_id = ler_delta_banco(metadados['ultimo_id'])
+            # Apenas o delta é gravado ao final dos arquivos; os workers remapeiam ao ver a nova versão
+            snapshot.acrescentar(delta, novo_ultimo_id, cob_legend, ROTULOS_FAIXA_HORARIA)
+        mapear_snapshot()
+    else:
+        delta, novo_ultimo_id = ler_delta_banco(armazem.ultimo_id)
+        publicar_armazem(armazem.anexar(delta, novo_ultimo_id))
+    # Requisições atendidas entre a carga e a publicação usaram o armazém anterior
+    invalidar_caches()
+    print(f"🧩 {len(delta)} registros acrescentados ao cache em memória")
+
+
+def ingerir_novas_chamadas(df, origem):
+    """Salva chamadas novas no banco e aplica somente o delta ao cache em memória"""
+    with _lock_ingestao:
+        records_added = salvar_dados_banco(df, origem)
         
-        # Atualizar cache
-        _cache_dados['dataframe'] = df.copy()
+        if records_added > 0 and USA_ARMAZEM:
+            aplicar_delta_armazem()
+    
+    return records_added
+
+
+def processar_csv_monitorado(df, caminho):
+    """Processa as linhas novas de um CSV do diretório monitorado"""
+    colunas_faltantes = [col for col in COLUNAS_CHAMADAS if col not in df.columns]
+    if colunas_faltantes:
+        registrar_sync('arquivo', caminho, 0, 'error', f"Colunas faltantes: {colunas_faltantes}")
+        raise ValueError(f"Colunas faltantes no CSV: {colunas_faltantes}")
+    
+    df = preparar_chamadas_csv(df[COLUNAS_CHAMADAS])
+    
+    try:
+        records_added = ingerir_novas_chamadas(df, caminho)
+    except Exception as e:
+        registrar_sync('arquivo', caminho, 0, 'error', str(e))
+        raise
+    
+    registrar_sync('arquivo', caminho, records_added, 'success', f"Processadas {len(df)} linhas novas")
+    print(f"📥 {caminho}: {records_added} novos registros (de {len(df)} linhas novas)")
+    return records_added
+
+
+# Monitor de CSVs novos ou com linhas acrescentadas no diretório de dados
+monitor_csv = MonitorCSV(
+    os.path.dirname(CSV_PATH) or '.',
+    get_db_connection,
+    processar_csv_monitorado,
+    intervalo=MONITOR_CSV_INTERVALO,
+    bytes_por_bloco=MONITOR_CSV_BLOCO_MB * 2**20
+)
+
+# Arquivo frio em Parquet do modo 'parquet', atualizado pelo processo de ingestão
+arquivo_parquet = ArquivoParquet(
+    ARQUIVO_DIR,
+    get_db_connection,
+    intervalo=ARQUIVO_INTERVALO,
+    linhas_por_grupo=ARQUIVO_LINHAS_GRUPO
+)
+
+def processar_lote_api(df, origem):
+    """Grava um micro-lote de chamadas recebidas pela API (banco e delta do cache)"""
+    try:
+        records_added = ingerir_novas_chamadas(df, origem)
+    except Exception as e:
+        registrar_sync('api', origem, 0, 'error', str(e))
+        raise
+    
+    registrar_sync('api', origem, records_added, 'success', f"Micro-lote de {len(df)} chamadas")
+    return records_added
+
+
+# Buffer das chamadas recebidas pela API, gravado em micro-lotes por uma thread de fundo
+buffer_ingestao = BufferIngestao(
+    processar_lote_api,
+    '/api/chamadas',
+    tamanho_lote=INGEST_API_LOTE,
+    intervalo_ms=INGEST_API_INTERVALO_MS,
+    capacidade=INGEST_API_CAPACIDADE,
+    tentativas=INGEST_API_TENTATIVAS,
+    diretorio_falhas=INGEST_API_FALHAS_DIR
+)
+buffer_ingestao.iniciar()
+# As chamadas do buffer já foram confirmadas (202): gravá-las antes de sair
+atexit.register(buffer_ingestao.parar, timeout=INGEST_API_PARADA_S)
+
+def adquirir_lideranca_ingestao():
+    """Elege o único processo que prepara o banco, carrega o CSV e monitora os CSVs
+
+    Vale para todas as fontes (com vários workers do gunicorn): o primeiro a obter
+    a trava do arquivo assume, e também grava o snapshot e o arquivo Parquet. A
+    trava é liberada pelo sistema quando o processo termina, e o worker que o
+    gunicorn inicia no lugar a assume. O eleito mantém a trava de carga até o fim
+    da carga inicial (ver aguardar_lider).
+    """
+    diretorio = os.path.dirname(DB_PATH)
+    os.makedirs(diretorio, exist_ok=True)
+    
+    # A trava de carga vem antes da eleição: quem a obtém e perde a eleição sabe
+    # que o líder já terminou a carga inicial
+    carga = open(os.path.join(diretorio, 'carga.lock'), 'w')
+    try:
+        fcntl.flock(carga, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        carga.close()
+        return False
+    
+    trava = open(os.path.join(diretorio, 'ingestao.lock'), 'w')
+    try:
+        fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        trava.close()
+        carga.close()
+        return False
+    
+    # Mantidas abertas: a de ingestão enquanto o processo viver, a de carga até o fim da carga inicial
+    _cache_dados['trava_ingestao'] = trava
+    _cache_dados['trava_carga'] = carga
+    return True
+
+
+def liberar_trava_carga():
+    """Sinaliza aos demais workers que a carga inicial do líder terminou"""
+    carga = _cache_dados.pop('trava_carga', None)
+    if carga is not None:
+        carga.close()
+
+
+def aguardar_lider():
+    """Bloqueia até o líder terminar a carga inicial (liberar a trava de carga)"""
+    with open(os.path.join(os.path.dirname(DB_PATH), 'carga.lock'), 'w') as carga:
+        fcntl.flock(carga, fcntl.LOCK_SH)
+
+
+def inicializar_dados():
+    """Carga inicial: banco, CSV e cache em memória (no processo responsável pela ingestão)
+
+    Com CARGA_EM_SEGUNDO_PLANO roda em uma thread iniciada na importação: até
+    terminar, os callbacks respondem com os dados já disponíveis e status-api
+    mostra a etapa em curso. Nos demais workers do modo snapshot, a carga termina
+    quando o snapshot publicado é mapeado (sincronizar_snapshot); nos das outras
+    fontes, quando o líder libera a trava de carga.
+    """
+    global INITIAL_LOAD_COMPLETE
+    
+    inicio = perf_counter()
+    try:
+        with metricas.etapa('carga_inicial'):
+            if LIDER_INGESTAO:
+                informar_progresso('Preparando o banco de dados')
+                init_database()
+                
+                informar_progresso('Verificando o CSV inicial')
+                carregar_csv_para_banco()
+                
+                if USA_ARMAZEM:
+                    informar_progresso('Montando o cache em memória')
+                    sincronizar_armazem_inicial()
+                
+                # Até o fim da gravação, as chamadas não arquivadas vêm do banco
+                if FONTE_CONSULTA == 'parquet':
+                    informar_progresso('Gravando o arquivo Parquet')
+                    arquivo_parquet.atualizar()
+                    if ARQUIVO_INTERVALO > 0:
+                        arquivo_parquet.iniciar()
+                
+                # Iniciar o monitoramento de novos CSVs
+                if MONITOR_CSV_INTERVALO > 0:
+                    monitor_csv.iniciar()
+                
+                INITIAL_LOAD_COMPLETE = True
+            elif FONTE_CONSULTA == 'snapshot':
+                informar_progresso('Aguardando o snapshot do worker de ingestão')
+                carregar_dados()
+            else:
+                # Banco, CSV, monitor e arquivo ficam com o líder: aqui só se consulta
+                informar_progresso('Aguardando a carga inicial do worker de ingestão')
+                aguardar_lider()
+                
+                if USA_ARMAZEM:
+                    informar_progresso('Montando o cache em memória')
+                    sincronizar_armazem_inicial()
+                
+                INITIAL_LOAD_COMPLETE = True
         
+        # Resultados calculados durante a carga usaram dados parciais
+        invalidar_caches()
+        if INITIAL_LOAD_COMPLETE:
+            print(f"✅ Carga inicial concluída em {perf_counter() - inicio:.1f}s")
     except Exception as e:
-        print(f"❌ Erro ao carregar CSV para o banco: {e}")
+        informar_progresso(f'Falha na carga inicial: {e}')
+        print(f"❌ Erro na carga inicial: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        # Mesmo após uma falha: os demais workers não ficam esperando
+        liberar_trava_carga()
+        _carga_inicial_encerrada.set()
+
+
+def aguardar_carga_inicial(timeout=None):
+    """Bloqueia até a carga inicial terminar (scripts e benchmark); False se expirar o timeout"""
+    return _carga_inicial_encerrada.wait(timeout)
+
+
+def obter_periodo_inicial():
+    """Período dos filtros de data para o layout, sem esperar a carga: MIN/MAX pelo índice de ts"""
+    try:
+        with get_db_connection() as conn:
+            ts_min, ts_max = periodo_chamadas(conn)
+    except sqlite3.Error:
+        # Banco ainda não criado pela carga inicial
+        ts_min = ts_max = None
+    
+    if ts_min is None:
+        # Valores padrão caso não haja dados
+        print("⚠️ Usando datas padrão (hoje)")
+        return date.today(), date.today()
     
+    inicio = pd.to_datetime(ts_min, unit='s').date()
+    fim = pd.to_datetime(ts_max, unit='s').date()
+    print(f"📅 Período dos dados: {inicio} até {fim}")
+    return inicio, fim
+
+
+print("🚀 Inicializando aplicação...")
+LIDER_INGESTAO = adquirir_lideranca_ingestao()
+
+if not LIDER_INGESTAO:
+    print(f"🗺️ Ingestão a cargo de outro worker; consultas pela fonte '{FONTE_CONSULTA}'")
+
+if CARGA_EM_SEGUNDO_PLANO:
+    Thread(target=inicializar_dados, name='carga-inicial', daemon=True).start()
+else:
+    inicializar_dados()
+
+# Período disponível para os filtros de data (atualizado pelo callback ao fim da carga)
+min_date, max_date = obter_periodo_inicial()
+
+# App Dash
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# Aplicação WSGI para o gunicorn (gunicorn -c gunicorn.conf.py app:server)
+server = app.server
+
+app.title = 'Painel de Monitoramento de Ligações - CBMMG'
+
+
+def coletar_metricas_cache():
+    """Acertos, falhas e ocupação dos caches, lidos no momento da exportação"""
+    valores = []
+    for nome_cache, cache in (('resultados', _cache_resultados), ('janelas', _cache_janelas)):
+        for nome, valor in cache.estatisticas().items():
+            valores.append((f'cache_{nome}', {'cache': nome_cache}, valor))
+    armazem = _cache_dados['armazem']
+    if armazem is not None:
+        valores.append(('armazem_registros', {}, len(armazem)))
+        valores.append(('armazem_bytes', {}, armazem.nbytes))
+    return valores
+
+
+metricas.registrar_coletor(coletar_metricas_cache)
+
+
+def coletar_metricas_ingestao_api():
+    """Ocupação do buffer da API de ingestão e contadores de chamadas"""
+    return [(f'ingestao_api_{nome}', {}, valor) for nome, valor in buffer_ingestao.estatisticas().items()]
+
+
+metricas.registrar_coletor(coletar_metricas_ingestao_api)
+
+
+def coletar_metricas_conexoes():
+    """Conexões SQLite abertas, reaproveitadas e ociosas no pool"""
+    return [(f'sqlite_conexoes_{nome}', {}, valor) for nome, valor in _pool_conexoes.estatisticas().items()]
+
 
-def carregar_dados():
-    """Função principal para carregar dados (do cache ou do banco)"""
-    global _cache_dados
+metricas.registrar_coletor(coletar_metricas_conexoes)
+
+
+@app.server.route('/metrics')
+def exportar_metricas():
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+
+def ler_chamadas_requisicao():
+    """Lê o corpo da requisição como JSON lines (uma chamada por linha) ou CSV com cabeçalho"""
+    tipos_texto = {'hora': str, 'fila': str, 'teleatendente': str}
+    corpo = io.BytesIO(request.get_data())
     
-    with _cache_dados['lock']:
-        # Se já temos dados em cache, usar
-        if _cache_dados['dataframe'] is not None:
-            print("✅ Usando dados em cache")
-            return _cache_dados['dataframe'].copy()
-        
-        # Carregar do banco
-        print("📊 Carregando dados do banco...")
-        df = carregar_dados_banco()
-        
-        if not df.empty:
-            _cache_dados['dataframe'] = df.copy()
-            return df
-        
-        return pd.DataFrame()
+    if request.mimetype in ('text/csv', 'application/csv'):
+        return pd.read_csv(corpo, dtype=tipos_texto)
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json'):
+        return pd.read_json(corpo, lines=True, dtype={**tipos_texto, 'data': str}, convert_dates=False)
+    return None
 
-# Inicialização do banco de dados
-print("🚀 Inicializando aplicação...")
-init_database()
 
-# Carregar CSV para o banco (sincronamente) na inicialização para garantir que
-# as datas mínimas/máximas e opções dos filtros sejam definidas corretamente.
-carregar_csv_para_banco()
+@app.server.route('/api/chamadas', methods=['POST'])
+def receber_chamadas():
+    """Recebe um lote de chamadas e o enfileira para gravação (202); 429 com o buffer cheio"""
+    # Nos workers do modo snapshot, a carga termina quando o snapshot é publicado
+    sincronizar_snapshot()
+
+    # A carga inicial só roda com o banco vazio: chamadas gravadas antes dela a impediriam
+    if not INITIAL_LOAD_COMPLETE:
+        resposta = jsonify({'erro': 'Carga inicial em andamento'})
+        return resposta, 503, {'Retry-After': '5'}
+    
+    try:
+        df = ler_chamadas_requisicao()
+    except ValueError as e:
+        return jsonify({'erro': f'Conteúdo inválido: {e}'}), 400
+    if df is None:
+        return jsonify({'erro': 'Use Content-Type text/csv ou application/x-ndjson'}), 415
+    
+    colunas_faltantes = [col for col in COLUNAS_CHAMADAS if col not in df.columns]
+    if colunas_faltantes:
+        return jsonify({'erro': f'Colunas faltantes: {colunas_faltantes}'}), 400
+    
+    df = preparar_chamadas_csv(df[COLUNAS_CHAMADAS])
+    if len(df) > buffer_ingestao.capacidade:
+        return jsonify({'erro': f'Lote acima de {buffer_ingestao.capacidade} chamadas'}), 413
+    
+    if not buffer_ingestao.adicionar(df):
+        # Segundos para gravar um micro-lote: o cliente deve reenviar o mesmo lote depois
+        espera = max(1, round(INGEST_API_INTERVALO_MS / 1000))
+        return jsonify({'erro': 'Buffer de ingestão cheio'}), 429, {'Retry-After': str(espera)}
+    
+    return jsonify({'recebidas': len(df), 'pendentes': buffer_ingestao.estatisticas()['pendentes']}), 202
+
 
-# Carregar dados iniciais
-df = carregar_dados()
+# Colunas do arquivo exportado: as da carga por CSV e o nome do COB
+COLUNAS_EXPORTACAO = COLUNAS_CHAMADAS + ['cob_nome']
 
-# Dicionário para mapear os valores de COB para os nomes das regiões
-cob_legend = {
-    11: '1ºCOB - Divinópolis',
-    21: '2ºCOB - Uberlândia',
-    22: '2ºCOB - Uberaba',
-    31: '3ºCOB - Juiz de Fora',
-    32: '3ºCOB - Barbacena',
-    4: '4ºCOB - Montes Claros',
-    51: '5ºCOB - Governador Valadares',
-    52: '5ºCOB - Ipatinga',
-    61: '6ºCOB - Varginha'
+FORMATOS_EXPORTACAO = {
+    'csv': ('text/csv', gerar_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', gerar_xlsx),
 }
 
-# Converter coluna 'data' para datetime se não estiver vazia
-if not df.empty and 'data' in df.columns:
-    df['data'] = pd.to_datetime(df['data'])
-    # Criar coluna datetime combinando data e hora
-    df['datetime'] = pd.to_datetime(df['data'].dt.strftime('%Y-%m-%d') + ' ' + df['hora'].astype(str))
-    # Mapear COB para nomes
-    df['cob_nome'] = df['cob'].map(cob_legend)
+
+def linhas_exportacao(datahora_ini, datahora_fim, cobs, dimensoes=()):
+    """Blocos de linhas das chamadas filtradas, lidos do banco com um cursor"""
+    sql, params = sql_chamadas_janela(COLUNAS_CHAMADAS, datahora_ini, datahora_fim, cobs, dimensoes)
+    # Com COBs, a ordem (cob, ts) segue o índice idx_cob_ts e dispensa ordenar o resultado
+    sql += " ORDER BY cob, ts" if cobs else " ORDER BY ts"
+    
+    for linhas in ler_em_blocos(get_db_connection, sql, params, EXPORT_BLOCO_LINHAS):
+        yield [linha + (cob_legend.get(linha[-1]),) for linha in linhas]
+
+
+@app.server.route('/api/chamadas/exportar')
+def exportar_chamadas():
+    """Chamadas brutas dos filtros do dashboard em CSV ou XLSX, enviadas em partes
+
+    Os parâmetros são os dos filtros (date_ini, hh_ini, mm_ini, date_fim, hh_fim,
+    mm_fim e cob, fila e teleatendente, repetidos para cada valor) e formato. As linhas são lidas do banco
+    e escritas na resposta em blocos de EXPORT_BLOCO_LINHAS: nem o banco nem o
+    arquivo ficam inteiros em memória, e os demais callbacks seguem atendidos.
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'erro': f'Formato deve ser um de {list(FORMATOS_EXPORTACAO)}'}), 400
+    if formato == 'xlsx' and not XLSX_DISPONIVEL:
+        return jsonify({'erro': 'Exportação em XLSX requer o pacote openpyxl'}), 501
     
-    # Criar coluna de faixa horária
-    df['hora_int'] = pd.to_datetime(df['hora'], format='%H:%M:%S').dt.hour
-    df['faixa_horaria'] = df['hora_int'].apply(definir_faixa_horaria)
+    argumentos = request.args
+    datahora_ini, datahora_fim, cobs, dimensoes = normalizar_filtros(
+        argumentos.get('date_ini'), argumentos.get('hh_ini'), argumentos.get('mm_ini'),
+        argumentos.get('date_fim'), argumentos.get('hh_fim'), argumentos.get('mm_fim'),
+        [cob for cob in argumentos.getlist('cob') if cob.isdigit()],
+        argumentos.getlist('fila'), argumentos.getlist('teleatendente')
+    )
     
-    # Mapear estado para status legível
-    df['status'] = df['estado'].map({0: 'Não Atendido', 1: 'Atendido'})
+    mimetype, gerar = FORMATOS_EXPORTACAO[formato]
+    nome = f"chamadas_{datahora_ini:%Y%m%d-%H%M}_{datahora_fim:%Y%m%d-%H%M}.{formato}"
+    metricas.incrementar('exportacoes_total', formato=formato)
+    print(f"📤 Exportando chamadas de {datahora_ini} a {datahora_fim} (COBs: {list(cobs) or 'todos'}) em {formato}")
     
-    min_date = df['data'].min().date()
-    max_date = df['data'].max().date()
-    print(f"📅 Período dos dados: {min_date} até {max_date}")
-    print(f"📊 Dados processados: {len(df)} registros com COB mapeados")
-else:
-    # Valores padrão caso não haja dados
-    from datetime import date
-    min_date = date.today()
-    max_date = date.today()
-    print("⚠️ Usando datas padrão (hoje)")
+    return Response(
+        gerar(linhas_exportacao(datahora_ini, datahora_fim, cobs, dimensoes), COLUNAS_EXPORTACAO),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{nome}"'}
+    )
 
-# App Dash
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
-app.title = 'Painel de Monitoramento de Ligações - CBMMG'
+@app.server.route('/api/chamadas/status')
+def status_ingestao_api():
+    """Estatísticas do buffer deste processo (cada worker do gunicorn tem o seu)"""
+    return jsonify({'processo': os.getpid(), **buffer_ingestao.estatisticas()})
+
+
+if metricas.ativo:
+    # Tempo e tamanho da resposta de cada callback, identificado pela saída
+    @app.server.before_request
+    def iniciar_medicao_requisicao():
+        g.inicio_requisicao = perf_counter()
+    
+    @app.server.after_request
+    def registrar_medicao_requisicao(response):
+        if request.path.endswith('/_dash-update-component'):
+            saida = (request.get_json(silent=True) or {}).get('output', 'desconhecida')
+            segundos = perf_counter() - g.inicio_requisicao
+            tamanho = response.calculate_content_length() or 0
+            metricas.incrementar('requisicoes_total', saida=saida)
+            metricas.observar('etapa_segundos', segundos, etapa='callback', saida=saida)
+            metricas.observar('resposta_bytes', tamanho, saida=saida)
+            metricas.registrar_log('callback', saida=saida, segundos=round(segundos, 6), bytes=tamanho)
+        return response
 
 # Logotipo
 logo = html.Img(src='/assets/bombeiro.png', height='60px', style={'marginRight': '16px'})
@@ -403,6 +1346,27 @@ filtros2 = dbc.Row([
             style={'width': '100%', 'marginTop': 24}
         )
     ], xs=12, md=4, className='my-2'),
+    # Filas e teleatendentes: nenhum selecionado significa todos
+    dbc.Col([
+        dcc.Dropdown(
+            id='fila-dropdown',
+            options=[],  # Será populado dinamicamente
+            value=[],
+            multi=True,
+            placeholder='Filtrar por Fila',
+            style={'width': '100%', 'marginTop': 24}
+        )
+    ], xs=12, md=2, className='my-2'),
+    dbc.Col([
+        dcc.Dropdown(
+            id='teleatendente-dropdown',
+            options=[],  # Será populado dinamicamente
+            value=[],
+            multi=True,
+            placeholder='Filtrar por Atendente',
+            style={'width': '100%', 'marginTop': 24}
+        )
+    ], xs=12, md=2, className='my-2'),
 ], className='mb-4')
 
 # Indicadores principais com status da API
@@ -421,7 +1385,9 @@ indicadores = dbc.Row([
     ])]), xs=12, md=3, className='my-2'),
     dbc.Col(dbc.Card([dbc.CardBody([
         html.H6('Status dos Dados', className='card-title'),
-        html.Div(id='status-api', className='card-text')
+        html.Div(id='status-api', className='card-text'),
+        # Consulta o progresso da carga inicial; desativado quando ela termina
+        dcc.Interval(id='intervalo-carga', interval=INTERVALO_PROGRESSO_MS, disabled=INITIAL_LOAD_COMPLETE)
     ])]), xs=12, md=3, className='my-2'),
 ], className='mb-3')
 
@@ -451,6 +1417,24 @@ indicadores_por_cob = html.Div([
 graficos = dbc.Row([
     dbc.Col([
         dbc.Row([
+            dbc.Col([
+                # Chamadas brutas dos filtros atuais (links atualizados por atualizar_links_exportacao)
+                dbc.Button('Exportar CSV', id='exportar-csv', color='light', size='sm',
+                           external_link=True, className='me-2'),
+                dbc.Button('Exportar Excel', id='exportar-xlsx', color='light', size='sm',
+                           external_link=True, disabled=not XLSX_DISPONIVEL),
+            ], width='auto', className='d-flex align-items-center mb-2 me-3'),
+            dbc.Col([
+                dbc.Label("Ao Vivo:", style={'color': '#fff', 'marginRight': '10px'}),
+                dbc.Switch(
+                    id="toggle-ao-vivo",
+                    value=False,
+                    style={'transform': 'scale(1.2)'}
+                ),
+                # Com o modo ao vivo ligado, soma as chamadas novas ao painel a cada intervalo
+                dcc.Interval(id='intervalo-ao-vivo', interval=AO_VIVO_INTERVALO_MS, disabled=True),
+                dcc.Store(id='estado-ao-vivo')
+            ], width='auto', className='d-flex align-items-center mb-2'),
             dbc.Col([
                 dbc.Label("Mostrar Legenda:", style={'color': '#fff', 'marginRight': '10px'}),
                 dbc.Switch(
@@ -507,24 +1491,31 @@ app.layout = dbc.Container([
 ], fluid=True, id='main-container')
 
 # Função para obter status dos dados
+@metricas.medido('status')
 def obter_status_dados():
     """Retorna o status atual dos dados do banco"""
     global INITIAL_LOAD_COMPLETE
     
     if not INITIAL_LOAD_COMPLETE:
+        progresso = dict(_progresso_carga)
+        detalhes = [progresso['etapa']]
+        if progresso['fracao'] is not None:
+            detalhes.append(f"{progresso['fracao']:.0%}")
+        if progresso['registros']:
+            detalhes.append(f"{progresso['registros']:,} registros")
+        
         return html.Span([
             html.I(className="fas fa-clock", style={'color': '#ffc107', 'marginRight': '5px'}),
-            "Carregando dados..."
+            "Carregando dados...",
+            html.Br(),
+            html.Small(' · '.join(detalhes), style={'color': 'gray'})
         ], style={'fontSize': '14px'})
     
     try:
+        # Contadores mantidos pela ingestão: uma linha, em vez de varrer a tabela chamadas
         with get_db_connection() as conn:
-            cursor = conn.execute("SELECT COUNT(*) FROM chamadas")
-            total_registros = cursor.fetchone()[0]
-            
-            # Obter data da última atualização do banco
-            cursor = conn.execute("SELECT MAX(created_at) FROM chamadas")
-            ultima_atualizacao = cursor.fetchone()[0]
+            cursor = conn.execute("SELECT total, ultima_atualizacao FROM status_chamadas")
+            total_registros, ultima_atualizacao = cursor.fetchone()
         
         return html.Span([
             html.I(className="fas fa-database", style={'color': '#28a745', 'marginRight': '5px'}),
@@ -551,73 +1542,12 @@ def segundos_legiveis(segundos):
     m = minutos % 60
     return f"{horas}h {m}min {s}s" if s else (f"{horas}h {m}min" if m else f"{horas}h")
 
-# Callback principal
-@app.callback(
-    [
-        Output('total-ligacoes', 'children'),
-        Output('total-atendidas', 'children'),
-        Output('total-nao-atendidas', 'children'),
-        Output('status-api', 'children'),
-        Output('taxa-atendimento', 'children'),
-        Output('duracao-media', 'children'),
-        Output('total-tempo-falado', 'children'),
-        Output('indicadores-cob-container', 'children'),
-        Output('grafico-chamadas-data-cob', 'figure'),
-        Output('grafico-atendidas-nao-atendidas', 'figure'),
-        Output('grafico-faixa-horaria', 'figure'),
-        Output('grafico-linha-faixa-horaria', 'figure'),
-        Output('grafico-pizza-atendidas', 'figure'),
-        Output('grafico-top-atendente', 'figure'),
-        Output('grafico-top-cob-atendidas', 'figure'),
-        Output('grafico-top-cob-nao-atendidas', 'figure'),
-    ],
-    [
-        Input('date-inicio', 'date'),
-        Input('hh-inicio', 'value'),
-        Input('mm-inicio', 'value'),
-        Input('date-fim', 'date'),
-        Input('hh-fim', 'value'),
-        Input('mm-fim', 'value'),
-        Input('cob-dropdown', 'value'),
-        Input('toggle-legenda', 'value'),
-    ]
-)
-def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, destinos, mostrar_legenda):
-    # Carregar dados do cache/banco
-    df_atual = carregar_dados()
-    
-    # Obter status dos dados
-    status_texto = obter_status_dados()
-    
-    if df_atual is None or df_atual.empty:
-        print("Dados não encontrados ou vazios")
-        return [
-            0, 0, 0, status_texto, "0%", "0s", "0s", [], 
-            {}, {}, {}, {}, {}, {}, {}, {}
-        ]
-    
-    # Processar dados se não estiver vazio
-    if not df_atual.empty and 'data' in df_atual.columns:
-        # Converter coluna 'data' para datetime (apenas se não já processado)
-        if df_atual['data'].dtype == 'object':
-            df_atual['data'] = pd.to_datetime(df_atual['data'])
-        
-        # Criar colunas derivadas apenas se não existirem
-        if 'datetime' not in df_atual.columns:
-            df_atual['datetime'] = pd.to_datetime(df_atual['data'].dt.strftime('%Y-%m-%d') + ' ' + df_atual['hora'].astype(str))
-        
-        if 'cob_nome' not in df_atual.columns:
-            df_atual['cob_nome'] = df_atual['cob'].map(cob_legend)
-        
-        if 'hora_int' not in df_atual.columns:
-            df_atual['hora_int'] = pd.to_datetime(df_atual['hora'], format='%H:%M:%S').dt.hour
-        
-        if 'faixa_horaria' not in df_atual.columns:
-            df_atual['faixa_horaria'] = df_atual['hora_int'].apply(definir_faixa_horaria)
-        
-        if 'status' not in df_atual.columns:
-            df_atual['status'] = df_atual['estado'].map({0: 'Não Atendido', 1: 'Atendido'})
-    
+def normalizar_filtros(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, destinos, filas=None, teleatendentes=None):
+    """Valida hora/minuto e resolve o período, os COBs e as demais dimensões selecionados nos filtros
+
+    Retorna (datahora_ini, datahora_fim, cobs, dimensoes); dimensoes são os pares
+    (coluna, valores) das filas e teleatendentes selecionados, vazia sem filtro.
+    """
     # Validação dos campos de hora/minuto
     try:
         hh_ini = int(hh_ini)
@@ -651,169 +1581,172 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     try:
         datahora_ini = datetime.strptime(f"{date_ini} {hora_ini}", "%Y-%m-%d %H:%M")
     except:
-        datahora_ini = df_atual['datetime'].min() if not df_atual.empty else datetime.now()
+        datahora_ini = None
     try:
         datahora_fim = datetime.strptime(f"{date_fim} {hora_fim}", "%Y-%m-%d %H:%M")
     except:
-        datahora_fim = df_atual['datetime'].max() if not df_atual.empty else datetime.now()
+        datahora_fim = None
+    
+    if datahora_ini is None or datahora_fim is None:
+        inicio_dados, fim_dados = obter_intervalo_chamadas()
+        datahora_ini = datahora_ini or inicio_dados or datetime.now()
+        datahora_fim = datahora_fim or fim_dados or datetime.now()
+    
+    # COBs em ordem fixa; vazio significa todos
+    cobs = tuple(sorted(int(cob) for cob in destinos)) if destinos else ()
+    
+    # Filas e teleatendentes: nenhum selecionado significa todos (inclusive os sem valor)
+    dimensoes = tuple(
+        (coluna, tuple(sorted({str(valor) for valor in valores if valor})))
+        for coluna, valores in (('fila', filas), ('teleatendente', teleatendentes))
+        if valores and any(valores)
+    )
+    
+    return datahora_ini, datahora_fim, cobs, dimensoes
 
-    # Filtrar dados
-    if not df_atual.empty:
-        if 'datetime' not in df_atual.columns:
-            print("❌ Coluna 'datetime' não encontrada no DataFrame")
-            dff = pd.DataFrame()
-        else:
-            if not pd.api.types.is_datetime64_any_dtype(df_atual['datetime']):
-                df_atual['datetime'] = pd.to_datetime(df_atual['datetime'], errors='coerce')
-                df_atual = df_atual.dropna(subset=['datetime'])
-            
-            if not df_atual.empty:
-                dff = df_atual[(df_atual['datetime'] >= datahora_ini) & (df_atual['datetime'] <= datahora_fim)]
-                
-                if destinos:
-                    dff = dff[dff['cob'].isin(destinos)]
-            else:
-                dff = pd.DataFrame()
-    else:
-        dff = pd.DataFrame()
 
-    # Calcular indicadores
-    if not dff.empty:
-        # Indicadores principais
-        total_ligacoes = len(dff)
-        total_atendidas = len(dff[dff['estado'] == 1])
-        total_nao_atendidas = len(dff[dff['estado'] == 0])
-        
-        # Indicadores avançados
-        taxa_atendimento = (total_atendidas / total_ligacoes * 100) if total_ligacoes > 0 else 0
-        
-        # Duração média apenas para ligações atendidas
-        ligacoes_atendidas = dff[dff['estado'] == 1]
-        duracao_media = ligacoes_atendidas['duracao'].mean() if not ligacoes_atendidas.empty else 0
-        
-        # Total de tempo falado (soma de todas as durações de ligações atendidas)
-        total_tempo_falado = ligacoes_atendidas['duracao'].sum() if not ligacoes_atendidas.empty else 0
-        
-        # Formatação dos valores
-        total_ligacoes_str = f"{total_ligacoes:,}"
-        total_atendidas_str = f"{total_atendidas:,}"
-        total_nao_atendidas_str = f"{total_nao_atendidas:,}"
-        taxa_atendimento_str = f"{taxa_atendimento:.1f}%"
-        duracao_media_str = segundos_legiveis(duracao_media)
-        total_tempo_falado_str = segundos_legiveis(total_tempo_falado)
-        
-        # Calcular indicadores por COB
-        indicadores_cob_cards = []
-        cobs_no_periodo = dff['cob_nome'].unique()
-        
-        for cob in sorted(cobs_no_periodo):
-            dados_cob = dff[dff['cob_nome'] == cob]
+# Função para gráfico vazio
+def grafico_vazio(titulo, mensagem='Sem dados para exibir'):
+    return {
+        'data': [],
+        'layout': {
+            'xaxis': {'visible': False},
+            'yaxis': {'visible': False},
+            'annotations': [{
+                'text': mensagem,
+                'xref': 'paper', 'yref': 'paper',
+                'x': 0.5, 'y': 0.5,
+                'showarrow': False,
+                'font': {'size': 18, 'color': '#a84105'}
+            }],
+            'plot_bgcolor': '#fff',
+            'paper_bgcolor': '#fff',
+            'title': {'text': titulo, 'font': {'color': '#162447'}},
+            'font': {'color': '#162447'}
+        }
+    }
+
+
+def calcular_indicadores(resumo):
+    """Indicadores gerais do período (totais, taxa de atendimento e durações)"""
+    geral = resumo['geral']
+    
+    # Formatação dos valores
+    total_ligacoes_str = f"{geral['total']:,}"
+    total_atendidas_str = f"{geral['atendidas']:,}"
+    total_nao_atendidas_str = f"{geral['nao_atendidas']:,}"
+    taxa_atendimento_str = f"{geral['taxa_atendimento']:.1f}%"
+    duracao_media_str = segundos_legiveis(geral['duracao_media'])
+    total_tempo_falado_str = segundos_legiveis(geral['tempo_falado'])
+    
+    return (
+        total_ligacoes_str, total_atendidas_str, total_nao_atendidas_str,
+        taxa_atendimento_str, duracao_media_str, total_tempo_falado_str
+    )
+
+
+def calcular_indicadores_cob(resumo):
+    """Cards de indicadores por COB"""
+    if resumo['geral']['total'] == 0:
+        return html.Div("Nenhum dado disponível", 
+                        style={'textAlign': 'center', 'color': '#fff', 'padding': '20px'})
+    
+    # Indicadores por COB, já em ordem de nome
+    indicadores_cob_cards = []
+    
+    for indicadores_cob in resumo['por_cob']:
+        if indicadores_cob['total']:
+            cob = indicadores_cob['cob_nome']
+            total_cob = indicadores_cob['total']
+            atendidas_cob = indicadores_cob['atendidas']
+            nao_atendidas_cob = indicadores_cob['nao_atendidas']
+            taxa_cob = indicadores_cob['taxa_atendimento']
+            total_tempo_cob = indicadores_cob['tempo_falado']
+            duracao_cob = indicadores_cob['duracao_media']
             
-            if not dados_cob.empty:
-                # Calcular métricas para este COB
-                total_cob = len(dados_cob)
-                atendidas_cob = len(dados_cob[dados_cob['estado'] == 1])
-                nao_atendidas_cob = len(dados_cob[dados_cob['estado'] == 0])
-                taxa_cob = (atendidas_cob / total_cob * 100) if total_cob > 0 else 0
-                
-                # Duração média para ligações atendidas
-                atendidas_dados = dados_cob[dados_cob['estado'] == 1]
-                duracao_cob = atendidas_dados['duracao'].mean() if not atendidas_dados.empty else 0
-                
-                # Total de tempo falado
-                total_tempo_cob = atendidas_dados['duracao'].sum() if not atendidas_dados.empty else 0
-                
-                # Card para este COB
-                card_cob = dbc.Col([
-                    dbc.Card([
-                        dbc.CardHeader(html.H5(cob, className='mb-0', style={'color': '#162447'})),
-                        dbc.CardBody([
-                            dbc.Row([
-                                dbc.Col([
-                                    html.Small('Total', className='text-muted'),
-                                    html.H6(f"{total_cob}", style={'color': '#162447'})
-                                ], xs=4),
-                                dbc.Col([
-                                    html.Small('Atendidas', className='text-muted'),
-                                    html.H6(f"{atendidas_cob}", style={'color': '#00CC96'})
-                                ], xs=4),
-                                dbc.Col([
-                                    html.Small('Não Atend.', className='text-muted'),
-                                    html.H6(f"{nao_atendidas_cob}", style={'color': '#FF6B6B'})
-                                ], xs=4),
-                            ]),
-                            html.Hr(style={'margin': '10px 0'}),
-                            dbc.Row([
-                                dbc.Col([
-                                    html.Small('Taxa Atend.', className='text-muted'),
-                                    html.H6(f"{taxa_cob:.1f}%", style={'color': '#a84105'})
-                                ], xs=4),
-                                dbc.Col([
-                                    html.Small('Dur. Média', className='text-muted'),
-                                    html.H6(segundos_legiveis(duracao_cob), style={'color': '#636EFA'})
-                                ], xs=4),
-                                dbc.Col([
-                                    html.Small('Tempo Total', className='text-muted'),
-                                    html.H6(segundos_legiveis(total_tempo_cob), style={'color': '#AB63FA'})
-                                ], xs=4),
-                            ])
+            # Card para este COB
+            card_cob = dbc.Col([
+                dbc.Card([
+                    dbc.CardHeader(html.H5(cob, className='mb-0', style={'color': '#162447'})),
+                    dbc.CardBody([
+                        dbc.Row([
+                            dbc.Col([
+                                html.Small('Total', className='text-muted'),
+                                html.H6(f"{total_cob}", style={'color': '#162447'})
+                            ], xs=4),
+                            dbc.Col([
+                                html.Small('Atendidas', className='text-muted'),
+                                html.H6(f"{atendidas_cob}", style={'color': '#00CC96'})
+                            ], xs=4),
+                            dbc.Col([
+                                html.Small('Não Atend.', className='text-muted'),
+                                html.H6(f"{nao_atendidas_cob}", style={'color': '#FF6B6B'})
+                            ], xs=4),
+                        ]),
+                        html.Hr(style={'margin': '10px 0'}),
+                        dbc.Row([
+                            dbc.Col([
+                                html.Small('Taxa Atend.', className='text-muted'),
+                                html.H6(f"{taxa_cob:.1f}%", style={'color': '#a84105'})
+                            ], xs=4),
+                            dbc.Col([
+                                html.Small('Dur. Média', className='text-muted'),
+                                html.H6(segundos_legiveis(duracao_cob), style={'color': '#636EFA'})
+                            ], xs=4),
+                            dbc.Col([
+                                html.Small('Tempo Total', className='text-muted'),
+                                html.H6(segundos_legiveis(total_tempo_cob), style={'color': '#AB63FA'})
+                            ], xs=4),
                         ])
-                    ], style={'height': '100%'})
-                ], xs=12, md=6, lg=4, className='mb-3')
-                
-                indicadores_cob_cards.append(card_cob)
-        
-        # Criar layout dos cards por COB
-        if indicadores_cob_cards:
-            indicadores_cob_layout = dbc.Row(indicadores_cob_cards)
-        else:
-            indicadores_cob_layout = html.Div("Nenhum dado disponível para o período selecionado", 
-                                            style={'textAlign': 'center', 'color': '#fff', 'padding': '20px'})
+                    ])
+                ], style={'height': '100%'})
+            ], xs=12, md=6, lg=4, className='mb-3')
+            
+            indicadores_cob_cards.append(card_cob)
+    
+    # Criar layout dos cards por COB
+    if indicadores_cob_cards:
+        indicadores_cob_layout = dbc.Row(indicadores_cob_cards)
     else:
-        # Valores padrão quando não há dados
-        total_ligacoes_str = "0"
-        total_atendidas_str = "0"
-        total_nao_atendidas_str = "0"
-        taxa_atendimento_str = "0.0%"
-        duracao_media_str = "0s"
-        total_tempo_falado_str = "0s"
-        indicadores_cob_layout = html.Div("Nenhum dado disponível", 
+        indicadores_cob_layout = html.Div("Nenhum dado disponível para o período selecionado", 
                                         style={'textAlign': 'center', 'color': '#fff', 'padding': '20px'})
+    
+    return indicadores_cob_layout
 
-    # Função para gráfico vazio
-    def grafico_vazio(titulo):
-        return {
-            'data': [],
-            'layout': {
-                'xaxis': {'visible': False},
-                'yaxis': {'visible': False},
-                'annotations': [{
-                    'text': 'Sem dados para exibir',
-                    'xref': 'paper', 'yref': 'paper',
-                    'x': 0.5, 'y': 0.5,
-                    'showarrow': False,
-                    'font': {'size': 18, 'color': '#a84105'}
-                }],
-                'plot_bgcolor': '#fff',
-                'paper_bgcolor': '#fff',
-                'title': {'text': titulo, 'font': {'color': '#162447'}},
-                'font': {'color': '#162447'}
-            }
-        }
 
-    # Gráfico de chamadas por data/hora e COB
+# Título e formato da data no eixo de cada resolução do gráfico por data
+RESOLUCOES_GRAFICO_DATA = {
+    'dia': ('por dia', '%d/%m/%Y'),
+    'semana': ('por semana', 'Semana de %d/%m/%Y'),
+    'mes': ('por mês', '%m/%Y'),
+}
+
+
+def grafico_chamadas_data_cob(dff, mostrar_legenda):
+    """Gráfico de chamadas por data e COB, agrupadas por dia, semana ou mês conforme o período"""
     if not dff.empty:
-        # Agrupar por data e COB para contar chamadas (apenas por dia, não por hora)
-        chamadas_data_cob = dff.groupby([dff['data'].dt.date, 'cob_nome']).size().reset_index(name='quantidade_chamadas')
+        # Resolução mais fina que mantém o número de barras dentro de GRAFICO_MAX_PONTOS
+        datas = dff['data'].to_numpy()
+        resolucao = escolher_resolucao(datas.min(), datas.max(), dff['cob_nome'].nunique(), GRAFICO_MAX_PONTOS)
+        rotulo, formato_data = RESOLUCOES_GRAFICO_DATA[resolucao]
+        
+        # Agrupar por período e COB para contar chamadas
+        periodo = inicio_do_periodo(datas, resolucao)
+        chamadas_data_cob = dff.groupby([periodo, 'cob_nome'])['quantidade'].sum().reset_index(name='quantidade_chamadas')
         chamadas_data_cob.rename(columns={chamadas_data_cob.columns[0]: 'data'}, inplace=True)
         
+        # Datas em milissegundos (float64) e contagens inteiras: seguem como arrays
+        # binários no JSON da figura, e não como uma lista de textos por ponto
+        chamadas_data_cob['data'] = chamadas_data_cob['data'].to_numpy().astype('datetime64[ms]').astype('int64').astype('float64')
+        chamadas_data_cob['quantidade_chamadas'] = chamadas_data_cob['quantidade_chamadas'].to_numpy(dtype='int64')
+        
         if not chamadas_data_cob.empty:
             fig_chamadas = px.bar(
                 chamadas_data_cob, 
                 x='data', 
                 y='quantidade_chamadas',
                 color='cob_nome',
-                title='Quantidade de Chamadas por Data e COB',
+                title=f'Quantidade de Chamadas por Data e COB ({rotulo})',
                 template='plotly',
                 barmode='stack'
             )
@@ -823,6 +1756,8 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
                 marker_line_color='rgba(255,255,255,0.5)'
             )
             
+            fig_chamadas.update_xaxes(type='date', hoverformat=formato_data)
+            
             fig_chamadas.update_layout(
                 xaxis_title='Data',
                 yaxis_title='Quantidade de Chamadas',
@@ -840,9 +1775,13 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_chamadas = grafico_vazio('Quantidade de Chamadas por Data e COB')
 
-    # Gráfico de atendidas/não atendidas por COB
+    return fig_chamadas
+
+
+def grafico_atendidas_nao_atendidas(dff, mostrar_legenda):
+    """Gráfico de atendidas e não atendidas por COB"""
     if not dff.empty:
-        atendidas_nao_atendidas = dff.groupby(['cob_nome', 'status']).size().reset_index(name='quantidade')
+        atendidas_nao_atendidas = dff.groupby(['cob_nome', 'status'])['quantidade'].sum().reset_index(name='quantidade')
         
         if not atendidas_nao_atendidas.empty:
             fig_atendidas = px.bar(
@@ -870,9 +1809,13 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_atendidas = grafico_vazio('Atendidas e Não Atendidas por Região (COB)')
 
-    # Gráfico de chamadas por faixa horária
+    return fig_atendidas
+
+
+def grafico_faixa_horaria(dff, mostrar_legenda):
+    """Gráfico de barras por faixa horária e COB"""
     if not dff.empty:
-        chamadas_por_faixa_horaria = dff.groupby(['faixa_horaria', 'cob_nome']).size().reset_index(name='quantidade')
+        chamadas_por_faixa_horaria = dff.groupby(['faixa_horaria', 'cob_nome'])['quantidade'].sum().reset_index(name='quantidade')
         
         if not chamadas_por_faixa_horaria.empty:
             fig_faixa = px.bar(
@@ -900,9 +1843,13 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_faixa = grafico_vazio('Quantidade de Chamadas por Faixa Horária e Região (COB)')
 
-    # Gráfico de linha - chamadas por faixa horária
+    return fig_faixa
+
+
+def grafico_linha_faixa_horaria(dff, mostrar_legenda):
+    """Gráfico de linha por faixa horária e COB"""
     if not dff.empty:
-        chamadas_por_faixa_cob = dff.groupby(['faixa_horaria', 'cob_nome']).size().reset_index(name='quantidade')
+        chamadas_por_faixa_cob = dff.groupby(['faixa_horaria', 'cob_nome'])['quantidade'].sum().reset_index(name='quantidade')
         
         if not chamadas_por_faixa_cob.empty:
             fig_linha_faixa = px.line(
@@ -931,12 +1878,16 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_linha_faixa = grafico_vazio('Quantidade de Chamadas por Faixa Horária e Região (COB) - Linha')
 
-    # Gráfico pizza - distribuição de chamadas atendidas por COB
+    return fig_linha_faixa
+
+
+def grafico_pizza_atendidas(dff, mostrar_legenda):
+    """Gráfico pizza das atendidas por COB"""
     if not dff.empty:
         chamadas_atendidas = dff[dff['estado'] == 1]
         
         if not chamadas_atendidas.empty:
-            distribuicao_atendidas = chamadas_atendidas.groupby('cob_nome').size().reset_index(name='quantidade')
+            distribuicao_atendidas = chamadas_atendidas.groupby('cob_nome')['quantidade'].sum().reset_index(name='quantidade')
             
             fig_pizza = go.Figure(data=[go.Pie(
                 labels=distribuicao_atendidas['cob_nome'],
@@ -961,18 +1912,25 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_pizza = grafico_vazio('Distribuição de Chamadas Atendidas por Região (COB)')
 
-    # Gráfico indicador - top atendente
+    return fig_pizza
+
+
+def grafico_top_atendente(dff, mostrar_legenda):
+    """Indicador do top atendente"""
     if not dff.empty:
         chamadas_atendidas = dff[dff['estado'] == 1]
         
         if not chamadas_atendidas.empty:
-            atendimentos_por_atendente = chamadas_atendidas.groupby('teleatendente').size().reset_index(name='atendimentos')
+            atendimentos_por_atendente = chamadas_atendidas.groupby('teleatendente')['quantidade'].sum().reset_index(name='atendimentos')
             
             if not atendimentos_por_atendente.empty:
                 top_atendente = atendimentos_por_atendente.loc[atendimentos_por_atendente['atendimentos'].idxmax()]
                 media_atendimentos = atendimentos_por_atendente['atendimentos'].mean()
                 
-                cob_top_atendente = chamadas_atendidas[chamadas_atendidas['teleatendente'] == top_atendente['teleatendente']]['cob_nome'].iloc[0]
+                # COB onde o top atendente mais atendeu
+                atendidas_top = chamadas_atendidas[chamadas_atendidas['teleatendente'] == top_atendente['teleatendente']]
+                atendidas_top_por_cob = atendidas_top.groupby('cob_nome')['quantidade'].sum()
+                cob_top_atendente = atendidas_top_por_cob.idxmax() if not atendidas_top_por_cob.empty else ''
                 
                 fig_indicador = go.Figure(go.Indicator(
                     mode = "number+delta",
@@ -995,12 +1953,16 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_indicador = grafico_vazio('Top Atendente')
 
-    # Gráfico 7 - Top COB por número de ligações atendidas
+    return fig_indicador
+
+
+def grafico_top_cob_atendidas(dff, mostrar_legenda):
+    """Indicador do COB com mais ligações atendidas"""
     if not dff.empty:
         chamadas_atendidas = dff[dff['estado'] == 1]
         
         if not chamadas_atendidas.empty:
-            atendidas_por_cob = chamadas_atendidas.groupby('cob_nome').size().reset_index(name='Quantidade')
+            atendidas_por_cob = chamadas_atendidas.groupby('cob_nome')['quantidade'].sum().reset_index(name='Quantidade')
             atendidas_por_cob.sort_values(by='Quantidade', ascending=False, inplace=True)
             
             if not atendidas_por_cob.empty:
@@ -1032,12 +1994,16 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_top_cob_atendidas = grafico_vazio('Top COB - Atendidas')
 
-    # Gráfico 8 - Top COB por número de ligações não atendidas
+    return fig_top_cob_atendidas
+
+
+def grafico_top_cob_nao_atendidas(dff, mostrar_legenda):
+    """Indicador do COB com mais ligações não atendidas"""
     if not dff.empty:
         chamadas_nao_atendidas = dff[dff['estado'] == 0]
         
         if not chamadas_nao_atendidas.empty:
-            nao_atendidas_por_cob = chamadas_nao_atendidas.groupby('cob_nome').size().reset_index(name='Quantidade')
+            nao_atendidas_por_cob = chamadas_nao_atendidas.groupby('cob_nome')['quantidade'].sum().reset_index(name='Quantidade')
             nao_atendidas_por_cob.sort_values(by='Quantidade', ascending=False, inplace=True)
             
             if not nao_atendidas_por_cob.empty:
@@ -1069,29 +2035,400 @@ def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, dest
     else:
         fig_top_cob_nao_atendidas = grafico_vazio('Top COB - Não Atendidas')
 
+    return fig_top_cob_nao_atendidas
+
+
+
+
+def limitar_figura(montar):
+    """Envolve a função que monta uma figura com o limite FIGURA_MAX_BYTES do JSON enviado ao navegador
+
+    Acima do limite, a figura é trocada por um gráfico vazio com o mesmo título.
+    O tamanho é medido uma vez, no cálculo; o resultado fica no cache de painéis.
+    """
+    @wraps(montar)
+    def montar_limitada(dff, *extras):
+        figura = montar(dff, *extras)
+        tamanho = len(to_json_plotly(figura))
+        if tamanho <= FIGURA_MAX_BYTES:
+            return figura
+        
+        titulo = figura.layout.title.text if isinstance(figura, go.Figure) else figura['layout']['title']['text']
+        print(f"⚠️ {titulo}: figura com {tamanho / 2**20:.1f} MB acima do limite, substituída")
+        return grafico_vazio(titulo, 'Dados demais para exibir: reduza o período ou os filtros')
+    
+    return montar_limitada
+
+
+# Gráficos do dashboard: id do componente -> função que monta a figura
+GRAFICOS = {
+    'grafico-chamadas-data-cob': grafico_chamadas_data_cob,
+    'grafico-atendidas-nao-atendidas': grafico_atendidas_nao_atendidas,
+    'grafico-faixa-horaria': grafico_faixa_horaria,
+    'grafico-linha-faixa-horaria': grafico_linha_faixa_horaria,
+    'grafico-pizza-atendidas': grafico_pizza_atendidas,
+    'grafico-top-atendente': grafico_top_atendente,
+    'grafico-top-cob-atendidas': grafico_top_cob_atendidas,
+    'grafico-top-cob-nao-atendidas': grafico_top_cob_nao_atendidas,
+}
+GRAFICOS = {id_grafico: limitar_figura(montar) for id_grafico, montar in GRAFICOS.items()}
+
+# Gráficos cuja legenda é controlada pelo toggle-legenda
+GRAFICOS_COM_LEGENDA = [
+    'grafico-chamadas-data-cob',
+    'grafico-atendidas-nao-atendidas',
+    'grafico-faixa-horaria',
+    'grafico-linha-faixa-horaria',
+    'grafico-pizza-atendidas',
+]
+
+# Entradas de filtro comuns a todos os painéis
+FILTROS = [
+    Input('date-inicio', 'date'),
+    Input('hh-inicio', 'value'),
+    Input('mm-inicio', 'value'),
+    Input('date-fim', 'date'),
+    Input('hh-fim', 'value'),
+    Input('mm-fim', 'value'),
+    Input('cob-dropdown', 'value'),
+    Input('fila-dropdown', 'value'),
+    Input('teleatendente-dropdown', 'value'),
+]
+
+
+def obter_janela(datahora_ini, datahora_fim, cobs, dimensoes=()):
+    """Chamadas filtradas da janela, consultadas uma vez e compartilhadas entre os painéis"""
+    chave = (datahora_ini.isoformat(), datahora_fim.isoformat(), cobs, dimensoes)
+    
+    def calcular():
+        dff = filtrar_chamadas(datahora_ini, datahora_fim, cobs, dimensoes)
+        metricas.incrementar('linhas_lidas_total', len(dff), fonte=FONTE_CONSULTA)
+        metricas.observar('janela_linhas', len(dff), fonte=FONTE_CONSULTA)
+        return dff
+    
+    return _cache_janelas.obter_ou_calcular(chave, calcular)
+
+
+def calcular_painel(nome, filtros, calcular, *extras):
+    """Calcula um painel a partir da janela compartilhada, com memoização por filtros normalizados"""
+    # Nos workers do modo snapshot, uma versão nova descarta os resultados em cache
+    sincronizar_snapshot()
+    
+    datahora_ini, datahora_fim, cobs, dimensoes = normalizar_filtros(*filtros)
+    chave = (nome, datahora_ini.isoformat(), datahora_fim.isoformat(), cobs, dimensoes) + extras
+    
+    def calcular_com_janela():
+        dff = obter_janela(datahora_ini, datahora_fim, cobs, dimensoes)
+        with metricas.etapa('painel', painel=nome):
+            return calcular(dff, *extras)
+    
+    return _cache_resultados.obter_ou_calcular(chave, calcular_com_janela)
+
+
+def calcular_resumo(filtros):
+    """Indicadores gerais e por COB dos filtros, com a mesma memoização de calcular_painel
+
+    Nos modos com armazém vêm das somas acumuladas por minuto, sem decodificar
+    a janela; no modo sqlite ou com filtro de fila ou teleatendente (as somas
+    são só por COB), da janela filtrada compartilhada com os gráficos.
+    """
+    if not USA_ARMAZEM:
+        return calcular_painel('resumo', filtros, resumir_chamadas)
+    
+    sincronizar_snapshot()
+    datahora_ini, datahora_fim, cobs, dimensoes = normalizar_filtros(*filtros)
+    if dimensoes:
+        return calcular_painel('resumo', filtros, resumir_chamadas)
+    chave = ('resumo', datahora_ini.isoformat(), datahora_fim.isoformat(), cobs, dimensoes)
+    
+    def calcular_com_acumulados():
+        armazem = carregar_dados()
+        with metricas.etapa('painel', painel='resumo'):
+            return resumir_armazem(armazem, _para_ts(datahora_ini), _para_ts(datahora_fim), cobs)
+    
+    return _cache_resultados.obter_ou_calcular(chave, calcular_com_acumulados)
+
+
+# Callback dos indicadores principais (primeira linha do dashboard)
+@app.callback(
+    [
+        Output('total-ligacoes', 'children'),
+        Output('total-atendidas', 'children'),
+        Output('total-nao-atendidas', 'children'),
+        Output('status-api', 'children'),
+        Output('taxa-atendimento', 'children'),
+        Output('duracao-media', 'children'),
+        Output('total-tempo-falado', 'children'),
+    ],
+    FILTROS + [State('toggle-ao-vivo', 'value')]
+)
+def atualizar_indicadores(*entradas):
+    *filtros, ao_vivo = entradas
+    
+    # Obter status dos dados
+    status_texto = obter_status_dados()
+    
+    # No modo ao vivo os indicadores são do callback atualizar_ao_vivo
+    if ao_vivo:
+        return (dash.no_update,) * 3 + (status_texto,) + (dash.no_update,) * 3
+    
+    resultado = calcular_indicadores(calcular_resumo(filtros))
+    return resultado[:3] + (status_texto,) + resultado[3:]
+
+
+# Callback dos indicadores por COB
+@app.callback(Output('indicadores-cob-container', 'children'), FILTROS + [State('toggle-ao-vivo', 'value')])
+def atualizar_indicadores_cob(*entradas):
+    *filtros, ao_vivo = entradas
+    if ao_vivo:
+        return dash.no_update
+    return calcular_indicadores_cob(calcular_resumo(filtros))
+
+
+# Links de exportação com os filtros atuais (a normalização fica com o servidor)
+@app.callback([Output('exportar-csv', 'href'), Output('exportar-xlsx', 'href')], FILTROS)
+def atualizar_links_exportacao(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, destinos, filas, teleatendentes):
+    parametros = {
+        'date_ini': date_ini, 'hh_ini': hh_ini, 'mm_ini': mm_ini,
+        'date_fim': date_fim, 'hh_fim': hh_fim, 'mm_fim': mm_fim,
+    }
+    consulta = urlencode(
+        [(nome, valor) for nome, valor in parametros.items() if valor is not None]
+        + [('cob', cob) for cob in destinos or []]
+        + [('fila', fila) for fila in filas or []]
+        + [('teleatendente', teleatendente) for teleatendente in teleatendentes or []]
+    )
     return (
-        total_ligacoes_str, total_atendidas_str, total_nao_atendidas_str,
-        status_texto,
-        taxa_atendimento_str, duracao_media_str, total_tempo_falado_str,
-        indicadores_cob_layout,
-        fig_chamadas, fig_atendidas, fig_faixa, fig_linha_faixa, 
-        fig_pizza, fig_indicador, fig_top_cob_atendidas, fig_top_cob_nao_atendidas
+        f'/api/chamadas/exportar?formato=csv&{consulta}',
+        f'/api/chamadas/exportar?formato=xlsx&{consulta}',
+    )
+
+
+def registrar_callback_grafico(id_grafico, montar):
+    """Registra o callback de um gráfico; a legenda entra como State e não dispara recálculo"""
+    @app.callback(
+        Output(id_grafico, 'figure'),
+        FILTROS + [State('toggle-legenda', 'value'), State('toggle-ao-vivo', 'value')]
+    )
+    def atualizar_grafico(*entradas):
+        *filtros, mostrar_legenda, ao_vivo = entradas
+        if ao_vivo:
+            return dash.no_update
+        return calcular_painel(id_grafico, filtros, montar, bool(mostrar_legenda))
+    
+    return atualizar_grafico
+
+
+for id_grafico, montar in GRAFICOS.items():
+    registrar_callback_grafico(id_grafico, montar)
+
+
+# Mostrar/ocultar legenda apenas no navegador, sem recalcular no servidor
+app.clientside_callback(
+    """
+    function(mostrarLegenda, ...figuras) {
+        return figuras.map(function(figura) {
+            if (!figura || !figura.layout) {
+                return window.dash_clientside.no_update;
+            }
+            var layout = Object.assign({}, figura.layout, {showlegend: mostrarLegenda});
+            return Object.assign({}, figura, {layout: layout});
+        });
+    }
+    """,
+    [Output(id_grafico, 'figure', allow_duplicate=True) for id_grafico in GRAFICOS_COM_LEGENDA],
+    Input('toggle-legenda', 'value'),
+    [State(id_grafico, 'figure') for id_grafico in GRAFICOS_COM_LEGENDA],
+    prevent_initial_call=True
+)
+
+
+def atualizar_dashboard(date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, destinos, filas, teleatendentes,
+                        mostrar_legenda):
+    """Calcula todas as saídas do dashboard de uma vez, na ordem dos painéis na tela
+
+    Não é um callback: a página usa os callbacks de cada painel, chamados aqui
+    na mesma sequência. Usada apenas pelo benchmark, para medir o dashboard inteiro.
+    """
+    filtros = (date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, destinos, filas, teleatendentes)
+    
+    indicadores_gerais = atualizar_indicadores(*filtros, False)
+    indicadores_cob = atualizar_indicadores_cob(*filtros, False)
+    figuras = tuple(
+        calcular_painel(id_grafico, filtros, montar, bool(mostrar_legenda))
+        for id_grafico, montar in GRAFICOS.items()
+    )
+    
+    return indicadores_gerais + (indicadores_cob,) + figuras
+
+
+# Modo ao vivo: indicadores de topo recalculados dos totais acumulados; os demais
+# gráficos recebem Patch com a soma das chamadas novas (tipo de incremento e atributo)
+GRAFICOS_TOPO = ['grafico-top-atendente', 'grafico-top-cob-atendidas', 'grafico-top-cob-nao-atendidas']
+INCREMENTOS_GRAFICOS = {
+    'grafico-chamadas-data-cob': ('data', 'y'),
+    'grafico-atendidas-nao-atendidas': ('status', 'y'),
+    'grafico-faixa-horaria': ('faixa', 'y'),
+    'grafico-linha-faixa-horaria': ('faixa', 'y'),
+    'grafico-pizza-atendidas': ('pizza', 'values'),
+}
+
+
+def chave_ao_vivo(datahora_ini, datahora_fim, cobs, dimensoes):
+    """Filtros normalizados como guardados no estado do modo ao vivo (listas, como volta do JSON)"""
+    return [
+        datahora_ini.isoformat(), datahora_fim.isoformat(), list(cobs),
+        [[coluna, list(valores)] for coluna, valores in dimensoes],
+    ]
+
+
+def montar_ao_vivo(datahora_ini, datahora_fim, cobs, dimensoes, mostrar_legenda):
+    """Monta o painel inteiro do modo ao vivo e o estado usado nas atualizações seguintes"""
+    marca, dff = janela_ao_vivo(datahora_ini, datahora_fim, cobs, dimensoes)
+    
+    # Eixos definidos pelos filtros (e não pelos dados): a posição de cada chamada nova é conhecida
+    nomes_cob = [cob_legend[cob] for cob in (cobs or obter_catalogo().cobs) if cob in cob_legend]
+    eixos = montar_eixos(datahora_ini.date(), datahora_fim.date(), nomes_cob, ROTULOS_FAIXA_HORARIA, GRAFICO_MAX_PONTOS)
+    densa = tornar_densa(dff, eixos)
+    resumo = resumir_chamadas(dff)
+    
+    figuras = {}
+    for id_grafico, montar in GRAFICOS.items():
+        if id_grafico in GRAFICOS_TOPO:
+            figuras[id_grafico] = montar(dff, bool(mostrar_legenda))
+        else:
+            figuras[id_grafico] = figura_em_listas(montar(densa, bool(mostrar_legenda)))
+    
+    estado = {
+        'chave': chave_ao_vivo(datahora_ini, datahora_fim, cobs, dimensoes),
+        'marca': marca,
+        'eixos': eixos,
+        'resumo': resumo,
+        'atendentes': contar_atendentes(dff),
+        # Gráficos substituídos por grafico_vazio (sem traces) não recebem Patch
+        'incrementais': [id_grafico for id_grafico in INCREMENTOS_GRAFICOS if figuras[id_grafico]['data']],
+        'indicadores': [id_grafico for id_grafico in GRAFICOS_TOPO if isinstance(figuras[id_grafico], go.Figure)],
+    }
+    print(f"📡 Modo ao vivo: painel montado até o id {marca} ({len(dff)} linhas)")
+    return (
+        list(calcular_indicadores(resumo)) + [calcular_indicadores_cob(resumo)]
+        + list(figuras.values()) + [estado, False]
+    )
+
+
+def avancar_ao_vivo(estado, datahora_ini, datahora_fim, cobs, dimensoes, mostrar_legenda):
+    """Atualiza o painel ao vivo apenas com as chamadas gravadas depois da marca do estado"""
+    marca, delta = ler_chamadas_novas(estado['marca'], datahora_ini, datahora_fim, cobs, dimensoes)
+    sem_alteracao = [dash.no_update] * (7 + len(GRAFICOS))
+    if marca == estado['marca']:
+        return sem_alteracao + [dash.no_update, dash.no_update]
+    
+    estado = dict(estado, marca=marca)
+    if delta.empty:
+        return sem_alteracao + [estado, dash.no_update]
+    
+    posicoes = incrementos(delta, estado['eixos'])
+    if posicoes is None:
+        # Chamada de um COB fora dos eixos: remonta o painel a partir da janela
+        return montar_ao_vivo(datahora_ini, datahora_fim, cobs, dimensoes, mostrar_legenda)
+    
+    estado['resumo'] = combinar_resumos(estado['resumo'], resumir_chamadas(delta))
+    estado['atendentes'] = somar_atendentes(estado['atendentes'], contar_atendentes(delta))
+    topo = chamadas_de_topo(estado['atendentes'], estado['resumo'])
+    
+    figuras = []
+    for id_grafico, montar in GRAFICOS.items():
+        if id_grafico in GRAFICOS_TOPO:
+            figura = montar(topo, bool(mostrar_legenda))
+            if id_grafico in estado['indicadores'] and isinstance(figura, go.Figure):
+                figura = patch_indicador(figura)
+            elif isinstance(figura, go.Figure):
+                estado['indicadores'] = estado['indicadores'] + [id_grafico]
+            figuras.append(figura)
+        elif id_grafico in estado['incrementais'] and posicoes[INCREMENTOS_GRAFICOS[id_grafico][0]]:
+            tipo, atributo = INCREMENTOS_GRAFICOS[id_grafico]
+            figuras.append(patch_incrementos(posicoes[tipo], atributo))
+        else:
+            figuras.append(dash.no_update)
+    
+    return (
+        list(calcular_indicadores(estado['resumo'])) + [calcular_indicadores_cob(estado['resumo'])]
+        + figuras + [estado, dash.no_update]
     )
 
 
-# Callback para popular o dropdown de COB dinamicamente
+# Callback do modo ao vivo: ao ligar o modo ou mudar os filtros monta o painel
+# inteiro; a cada intervalo soma apenas as chamadas novas (custo proporcional a elas)
+@app.callback(
+    [Output(id_indicador, 'children', allow_duplicate=True) for id_indicador in (
+        'total-ligacoes', 'total-atendidas', 'total-nao-atendidas',
+        'taxa-atendimento', 'duracao-media', 'total-tempo-falado', 'indicadores-cob-container'
+    )]
+    + [Output(id_grafico, 'figure', allow_duplicate=True) for id_grafico in GRAFICOS]
+    + [Output('estado-ao-vivo', 'data'), Output('intervalo-ao-vivo', 'disabled')],
+    [Input('toggle-ao-vivo', 'value'), Input('intervalo-ao-vivo', 'n_intervals')] + FILTROS,
+    [State('estado-ao-vivo', 'data'), State('toggle-legenda', 'value')],
+    prevent_initial_call=True
+)
+def atualizar_ao_vivo(ao_vivo, _, *entradas):
+    *filtros, estado, mostrar_legenda = entradas
+    if not ao_vivo:
+        return [dash.no_update] * (7 + len(GRAFICOS)) + [None, True]
+    
+    sincronizar_snapshot()
+    datahora_ini, datahora_fim, cobs, dimensoes = normalizar_filtros(*filtros)
+    chave = chave_ao_vivo(datahora_ini, datahora_fim, cobs, dimensoes)
+    
+    if ctx.triggered_id != 'intervalo-ao-vivo' or not estado or estado['chave'] != chave:
+        return montar_ao_vivo(datahora_ini, datahora_fim, cobs, dimensoes, mostrar_legenda)
+    return avancar_ao_vivo(estado, datahora_ini, datahora_fim, cobs, dimensoes, mostrar_legenda)
+
+
+# Callback para popular o dropdown de COB e o período das datas a cada carga da página
+# (o layout é montado na importação, antes de a carga inicial terminar). Enquanto a
+# carga não termina, o intervalo-carga o dispara apenas para atualizar o progresso;
+# ao final, os filtros preenchidos disparam o recálculo de todos os painéis.
 @app.callback(
     [Output('cob-dropdown', 'options'),
-     Output('cob-dropdown', 'value')],
-    [Input('cob-dropdown', 'id')]  # Trigger na inicialização
+     Output('cob-dropdown', 'value'),
+     Output('fila-dropdown', 'options'),
+     Output('teleatendente-dropdown', 'options'),
+     Output('date-inicio', 'min_date_allowed'),
+     Output('date-inicio', 'max_date_allowed'),
+     Output('date-fim', 'min_date_allowed'),
+     Output('date-fim', 'max_date_allowed'),
+     Output('date-inicio', 'date'),
+     Output('date-fim', 'date'),
+     Output('status-api', 'children', allow_duplicate=True),
+     Output('intervalo-carga', 'disabled')],
+    [Input('cob-dropdown', 'id'),  # Trigger na inicialização
+     Input('intervalo-carga', 'n_intervals')],
+    prevent_initial_call='initial_duplicate'
 )
-def popular_dropdown_cob(_):
-    """Popula o dropdown de COB com os dados disponíveis"""
-    df_atual = carregar_dados_banco()
+def popular_dropdown_cob(_, n_intervals=None):
+    """Popula os dropdowns de COB, fila e atendente e os limites das datas a partir do catálogo em memória"""
+    # Nos workers do modo snapshot, a carga termina quando o snapshot é publicado
+    sincronizar_snapshot()
+    
+    if not INITIAL_LOAD_COMPLETE:
+        return [dash.no_update] * 10 + [obter_status_dados(), False]
+    
+    catalogo = obter_catalogo()
+    
+    # Filas e atendentes sem valor não têm opção: ficam incluídos quando nada é selecionado
+    opcoes_dimensoes = [
+        [{'label': valor, 'value': valor} for valor in valores if valor]
+        for valores in (catalogo.filas, catalogo.teleatendentes)
+    ]
+    
+    if catalogo.inicio is not None:
+        inicio, fim = catalogo.inicio.date(), catalogo.fim.date()
+    else:
+        inicio, fim = min_date, max_date
+    limites_datas = [inicio, fim, inicio, fim, inicio, fim]
     
-    if not df_atual.empty and 'cob' in df_atual.columns:
-        # Remover valores nulos e obter valores únicos
-        unique_cob_values = df_atual['cob'].dropna().sort_values().unique()
+    if catalogo.cobs:
+        unique_cob_values = catalogo.cobs
         
         # Criar opções do dropdown
         opcoes = [{'label': cob_legend.get(cob, f'COB {cob}'), 'value': cob} 
@@ -1103,10 +2440,10 @@ def popular_dropdown_cob(_):
         print(f"🎯 COBs encontrados para dropdown: {list(unique_cob_values)}")
         print(f"🎯 COBs mapeados para dropdown: {valores_selecionados}")
         
-        return opcoes, valores_selecionados
+        return [opcoes, valores_selecionados] + opcoes_dimensoes + limites_datas + [obter_status_dados(), True]
     else:
         print("⚠️ Nenhum COB encontrado para popular dropdown")
-        return [], []
+        return [[], []] + opcoes_dimensoes + limites_datas + [obter_status_dados(), True]
 
 
 if __name__ == "__main__":
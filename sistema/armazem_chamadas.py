@@ -0,0 +1,374 @@
+import numpy as np
+import pandas as pd
+
+from colunas_derivadas import codigos_estado, colunas_de_tempo, rotulos_status
+from indice_bitmap import IndiceBitmap, blocos_da_faixa, posicoes_do_bitmap
+from somas_acumuladas import MINUTO, SomasAcumuladas
+
+
+# Colunas lidas do banco para montar o armazém
+COLUNAS_ARMAZEM = ['ts', 'cob', 'estado', 'duracao', 'fila', 'teleatendente']
+
+# Colunas com índice bitmap
+COLUNAS_BITMAP = ['cob', 'fila', 'teleatendente', 'estado']
+
+
+def _codificar(valores, categorias, posicoes, dtype):
+    """Converte valores em códigos, acrescentando às categorias os valores novos"""
+    for valor in pd.unique(valores):
+        if valor not in posicoes:
+            posicoes[valor] = len(categorias)
+            categorias.append(valor)
+    return pd.Index(categorias).get_indexer(valores).astype(dtype)
+
+
+def tipo_codigo(categorias):
+    """Menor tipo inteiro que comporta os códigos das categorias"""
+    return np.min_scalar_type(max(len(categorias) - 1, 0))
+
+
+def categorias_de(valores):
+    """Monta (lista, dicionário valor -> código) a partir de uma tabela de categorias"""
+    valores = list(valores)
+    return valores, {valor: codigo for codigo, valor in enumerate(valores)}
+
+
+def ordenado(ts):
+    """Indica se os timestamps estão em ordem não decrescente"""
+    return len(ts) < 2 or bool(np.all(ts[1:] >= ts[:-1]))
+
+
+def indice_por_cob(cob, quantidade_cobs, primeira=0):
+    """Posições agrupadas por código de COB (crescentes em cada grupo) e o início de cada grupo
+
+    As posições do código c são ordem[inicio[c]:inicio[c + 1]]; cob[0] está na
+    posição primeira.
+    """
+    # Ordenação estável: dentro de cada COB as posições (e portanto os ts) continuam crescentes
+    ordem = np.argsort(cob, kind='stable')
+    ordem = ordem.astype('int32' if primeira + len(cob) < 2**31 else 'int64')
+    ordem += primeira
+    inicio = np.zeros(quantidade_cobs + 1, dtype='int64')
+    np.cumsum(np.bincount(cob, minlength=quantidade_cobs), out=inicio[1:])
+    return ordem, inicio
+
+
+def codificar_bloco(bloco, categorias):
+    """Codifica um DataFrame (COLUNAS_ARMAZEM) nas colunas do armazém
+
+    categorias mapeia 'cob', 'fila' e 'teleatendente' para (lista de valores,
+    dicionário valor -> código) e recebe os valores novos do bloco. Retorna
+    None para blocos sem chamadas válidas; cob, fila e teleatendente saem em int32.
+    """
+    bloco = bloco.dropna(subset=['ts'])
+    if bloco.empty:
+        return None
+
+    colunas = {
+        'ts': bloco['ts'].to_numpy(dtype='int64'),
+        'cob': _codificar(bloco['cob'].fillna(0).to_numpy(dtype='int64'), *categorias['cob'], 'int32'),
+        'estado': codigos_estado(bloco['estado']),
+        'duracao': pd.to_numeric(bloco['duracao'], errors='coerce').fillna(0).to_numpy(dtype='float32'),
+    }
+    for nome in ('fila', 'teleatendente'):
+        valores = bloco[nome].fillna('').astype(str).to_numpy(dtype=object)
+        colunas[nome] = _codificar(valores, *categorias[nome], 'int32')
+    return colunas
+
+
+class DerivadosMapeados:
+    """Índice por COB, somas acumuladas e índices bitmap das primeiras linhas chamadas de um armazém
+
+    Montados a partir dos arrays de ArmazemChamadas.derivados (mapeados do
+    snapshot com np.memmap), sem cópia: os processos que mapeiam o mesmo
+    snapshot compartilham essas páginas em vez de recalculá-las.
+    """
+
+    def __init__(self, arrays, linhas):
+        def com_prefixo(prefixo):
+            return {nome[len(prefixo):]: array for nome, array in arrays.items() if nome.startswith(prefixo)}
+
+        self.linhas = linhas
+        self.indices_cob = [(arrays['ordem_cob'], arrays['inicio_cob'])]
+        self.acumulados = SomasAcumuladas.de_arrays(com_prefixo('somas_'), linhas)
+        self.bitmaps = {coluna: IndiceBitmap.de_arrays(com_prefixo(f'{coluna}_'), linhas) for coluna in COLUNAS_BITMAP}
+
+
+class ArmazemChamadas:
+    """Armazenamento colunar compacto e imutável das chamadas em cache
+
+    Textos de baixa cardinalidade (fila, teleatendente) e o COB ficam como
+    códigos inteiros com suas tabelas de categorias, e data + hora um único
+    timestamp int64 (coluna ts do banco), do qual as colunas derivadas são
+    calculadas na decodificação. As chamadas ficam em ordem de ts: a janela é
+    uma faixa contígua achada por busca binária, e o índice por COB (posições
+    agrupadas por COB, em ordem) evita percorrer as demais chamadas da janela
+    quando há filtro de COB. Os arrays ficam somente leitura: um armazém
+    publicado pode ser lido por várias threads sem cópia nem bloqueio, e as
+    colunas podem estar em memória ou mapeadas de arquivo (np.memmap).
+    ultimo_id é o maior id do banco incluído (None se desconhecido).
+
+    As somas acumuladas por COB e minuto (acumulados) dão os indicadores de
+    uma janela sem decodificá-la, e os índices bitmap por valor de COB, fila,
+    teleatendente e estado (bitmaps) filtram a janela por essas colunas. base,
+    um armazém cujas chamadas são as primeiras deste, evita recalcular os dois
+    do início. mapeados (DerivadosMapeados) traz o índice por COB, as somas e
+    os índices bitmap das primeiras chamadas, gravados no snapshot e
+    compartilhados entre os processos: só as seguintes são indexadas e somadas
+    em memória. Com base, valem os mapeados dela.
+    """
+
+    def __init__(self, ts, cob, estado, duracao, fila, teleatendente,
+                 cobs, filas, teleatendentes, rotulos_cob, rotulos_faixa, ultimo_id=None, base=None, mapeados=None):
+        self.ts = ts
+        self.cob = cob
+        self.estado = estado
+        self.duracao = duracao
+        self.fila = fila
+        self.teleatendente = teleatendente
+        # Tabelas de decodificação (código -> valor)
+        self.cobs = cobs
+        self.filas = filas
+        self.teleatendentes = teleatendentes
+        self.rotulos_cob = rotulos_cob
+        self.cob_nomes = np.array([rotulos_cob.get(int(cob), np.nan) for cob in cobs], dtype=object)
+        self.rotulos_faixa = np.asarray(rotulos_faixa, dtype=object)
+        self.ultimo_id = ultimo_id
+        self.mapeados = base.mapeados if base is not None else mapeados
+
+        # Índice por COB em trechos consecutivos: o dos mapeados e o das chamadas seguintes
+        primeira = self.mapeados.linhas if self.mapeados is not None else 0
+        ordem, inicio = indice_por_cob(cob[primeira:], len(cobs), primeira)
+        self.indices_cob = (self.mapeados.indices_cob if self.mapeados is not None else []) + [(ordem, inicio)]
+
+        for coluna in (*self.colunas().values(), ordem, inicio):
+            coluna.setflags(write=False)
+
+        self.acumulados = SomasAcumuladas.do_armazem(
+            self,
+            base.acumulados if base is not None else None,
+            self.mapeados.acumulados if self.mapeados is not None else None,
+        )
+        bitmaps_base = base.bitmaps if base is not None else self.mapeados.bitmaps if self.mapeados is not None else {}
+        self.bitmaps = {
+            coluna: IndiceBitmap.de_codigos(codigos, quantidade, bitmaps_base.get(coluna))
+            for coluna, codigos, quantidade in (
+                ('cob', cob, len(cobs)),
+                ('fila', fila, len(filas)),
+                ('teleatendente', teleatendente, len(teleatendentes)),
+                # Estado -1, 0 e 1 nos códigos 0, 1 e 2
+                ('estado', estado.astype('int16') + 1, 3),
+            )
+        }
+
+    def colunas(self):
+        """Colunas armazenadas, por nome (na ordem de COLUNAS_ARMAZEM)"""
+        return {nome: getattr(self, nome) for nome in COLUNAS_ARMAZEM}
+
+    @classmethod
+    def de_blocos(cls, blocos, rotulos_cob, rotulos_faixa, base=None, ultimo_id=None):
+        """Monta o armazém a partir de DataFrames (COLUNAS_ARMAZEM), bloco a bloco
+
+        rotulos_cob mapeia o código do COB para o nome da região e rotulos_faixa
+        traz o rótulo da faixa horária de cada hora do dia (24 posições). Com
+        base, os blocos são acrescentados a uma cópia das colunas do armazém base.
+        Blocos fora de ordem de ts (chamadas atrasadas) são intercalados.
+        """
+        partes = {nome: [] for nome in COLUNAS_ARMAZEM}
+        categorias = {'cob': ([], {}), 'fila': ([], {}), 'teleatendente': ([], {})}
+
+        if base is not None:
+            for nome, coluna in base.colunas().items():
+                partes[nome].append(coluna.astype('int32') if nome in ('cob', 'fila', 'teleatendente') else coluna)
+            for nome, tabela in (('cob', base.cobs), ('fila', base.filas), ('teleatendente', base.teleatendentes)):
+                categorias[nome] = categorias_de(tabela.tolist())
+
+        for bloco in blocos:
+            colunas = codificar_bloco(bloco, categorias)
+            if colunas is None:
+                continue
+            for nome, valores in colunas.items():
+                partes[nome].append(valores)
+
+        def juntar(nome, dtype):
+            coluna = np.concatenate(partes[nome]) if partes[nome] else np.empty(0, dtype=dtype)
+            return coluna if ordem is None else coluna[ordem]
+
+        ordem = None
+        ts = juntar('ts', 'int64')
+        if not ordenado(ts):
+            # Estável e quase linear para poucos trechos já ordenados (base + delta)
+            ordem = np.argsort(ts, kind='stable')
+            ts = ts[ordem]
+
+        cobs = np.array(categorias['cob'][0], dtype='int64')
+        filas = np.array(categorias['fila'][0], dtype=object)
+        teleatendentes = np.array(categorias['teleatendente'][0], dtype=object)
+
+        return cls(
+            ts=ts,
+            cob=juntar('cob', 'int32').astype(tipo_codigo(cobs)),
+            estado=juntar('estado', 'int8'),
+            duracao=juntar('duracao', 'float32'),
+            fila=juntar('fila', 'int32').astype(tipo_codigo(filas)),
+            teleatendente=juntar('teleatendente', 'int32').astype(tipo_codigo(teleatendentes)),
+            cobs=cobs,
+            filas=filas,
+            teleatendentes=teleatendentes,
+            rotulos_cob=rotulos_cob,
+            rotulos_faixa=rotulos_faixa,
+            ultimo_id=ultimo_id,
+            # Sem intercalação, as chamadas da base continuam sendo as primeiras
+            base=base if ordem is None else None,
+        )
+
+    def anexar(self, delta, ultimo_id=None):
+        """Retorna um novo armazém com as chamadas do DataFrame delta incluídas em ordem de ts (o atual não muda)"""
+        return ArmazemChamadas.de_blocos([delta], self.rotulos_cob, self.rotulos_faixa, base=self, ultimo_id=ultimo_id)
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def nbytes(self):
+        """Memória ocupada pelas colunas (sem as tabelas de categorias)"""
+        return sum(coluna.nbytes for coluna in self.colunas().values())
+
+    def codigos_cob(self, cobs):
+        """Converte valores de COB nos códigos usados pelo armazém (ignora os ausentes)"""
+        codigos = pd.Index(self.cobs).get_indexer(np.asarray(cobs, dtype='int64'))
+        return codigos[codigos >= 0]
+
+    def codigos(self, coluna, valores):
+        """Converte valores de uma coluna indexada nos códigos do armazém (ignora os ausentes)"""
+        if coluna == 'cob':
+            return self.codigos_cob(valores)
+        if coluna == 'estado':
+            return np.intersect1d(np.asarray(valores, dtype='int64'), (-1, 0, 1)) + 1
+        tabela = self.filas if coluna == 'fila' else self.teleatendentes
+        codigos = pd.Index(tabela).get_indexer(pd.Index(list(valores), dtype=object))
+        return codigos[codigos >= 0]
+
+    def posicoes_cob(self, codigo, inicio=0, fim=None):
+        """Posições, em ordem, das chamadas do COB com o código indicado (apenas as de [inicio, fim))"""
+        partes = []
+        for ordem, inicio_grupos in self.indices_cob:
+            # COBs que surgiram depois de um trecho do índice não têm posições nele
+            if codigo + 1 >= len(inicio_grupos):
+                continue
+            posicoes = ordem[inicio_grupos[codigo]:inicio_grupos[codigo + 1]]
+            primeira = np.searchsorted(posicoes, inicio) if inicio else 0
+            partes.append(posicoes[primeira:len(posicoes) if fim is None else np.searchsorted(posicoes, fim)])
+        return partes[0] if len(partes) == 1 else np.concatenate(partes)
+
+    def derivados(self):
+        """Índice por COB, somas acumuladas e índices bitmap de todas as chamadas em arrays planos, por nome
+
+        É o que o snapshot grava para ser lido por DerivadosMapeados.
+        """
+        if len(self.indices_cob) == 1:
+            ordem, inicio = self.indices_cob[0]
+        else:
+            ordem, inicio = indice_por_cob(self.cob, len(self.cobs))
+        arrays = {'ordem_cob': ordem, 'inicio_cob': inicio}
+        arrays.update({f'somas_{nome}': array for nome, array in self.acumulados.achatar().items()})
+        for coluna in COLUNAS_BITMAP:
+            arrays.update({f'{coluna}_{nome}': array for nome, array in self.bitmaps[coluna].achatar().items()})
+        return arrays
+
+    def faixa(self, ts_ini, ts_fim):
+        """Início e fim (exclusivo) das posições com ts em [ts_ini, ts_fim], por busca binária"""
+        return int(np.searchsorted(self.ts, ts_ini, 'left')), int(np.searchsorted(self.ts, ts_fim, 'right'))
+
+    def selecionar(self, ts_ini, ts_fim, cobs=None, dimensoes=()):
+        """Posições das chamadas com ts em [ts_ini, ts_fim] e COB selecionado, em ordem
+
+        Sem filtro de COB retorna um slice da faixa contígua; com COBs, as
+        posições de cada um dentro da faixa, tiradas do índice por COB.
+        dimensoes são pares (cob, fila, teleatendente ou estado, valores aceitos):
+        com elas, a seleção é o AND, entre as colunas (e os COBs), do OR dos
+        índices bitmap dos valores de cada uma, nos blocos da faixa.
+        """
+        inicio, fim = self.faixa(ts_ini, ts_fim)
+        if dimensoes:
+            filtros = list(dimensoes) + ([('cob', cobs)] if cobs else [])
+            return self.selecionar_bitmaps(inicio, fim, filtros)
+        if not cobs:
+            return slice(inicio, fim)
+
+        partes = [self.posicoes_cob(codigo, inicio, fim) for codigo in self.codigos_cob(cobs)]
+        if len(partes) == 1:
+            return partes[0]
+        return np.sort(np.concatenate(partes)) if partes else np.empty(0, dtype='int64')
+
+    def selecionar_bitmaps(self, inicio, fim, filtros):
+        """Posições em [inicio, fim) com algum dos valores de cada filtro (coluna, valores), em ordem"""
+        bloco_ini, bloco_fim = blocos_da_faixa(inicio, fim)
+        palavras = None
+        for coluna, valores in filtros:
+            bitmap = self.bitmaps[coluna].bitmap(self.codigos(coluna, valores), bloco_ini, bloco_fim)
+            if palavras is None:
+                palavras = bitmap
+            else:
+                palavras &= bitmap
+            if not palavras.any():
+                return np.empty(0, dtype='int64')
+        return posicoes_do_bitmap(palavras, bloco_ini, inicio, fim)
+
+    def somas_janela(self, ts_ini, ts_fim, cobs=None):
+        """Total, atendidas, não atendidas e duração das atendidas com ts em [ts_ini, ts_fim], por COB
+
+        Retorna (códigos, somas), com somas de forma (4, len(códigos)). Os minutos
+        inteiros da janela vêm das somas acumuladas; os segundos das bordas que
+        não completam um minuto, das chamadas.
+        """
+        codigos = self.codigos_cob(cobs) if cobs else np.arange(len(self.cobs))
+        # Minutos inteiros: [minuto_ini, minuto_fim)
+        minuto_ini, minuto_fim = -(-ts_ini // MINUTO), (ts_fim + 1) // MINUTO
+        if minuto_ini < minuto_fim:
+            somas = self.acumulados.somar(codigos, minuto_ini, minuto_fim)
+            bordas = [(ts_ini, minuto_ini * MINUTO - 1), (minuto_fim * MINUTO, ts_fim)]
+        else:
+            somas = np.zeros((4, len(codigos)))
+            bordas = [(ts_ini, ts_fim)]
+
+        posicao_codigo = np.full(len(self.cobs), -1)
+        posicao_codigo[codigos] = np.arange(len(codigos))
+        for inicio, fim in bordas:
+            if inicio > fim:
+                continue
+            posicoes = self.selecionar(inicio, fim, cobs)
+            indice = posicao_codigo[self.cob[posicoes]]
+            estado = self.estado[posicoes]
+            atendida = estado == 1
+            somas[0] += np.bincount(indice, minlength=len(codigos))
+            somas[1] += np.bincount(indice, weights=atendida, minlength=len(codigos))
+            somas[2] += np.bincount(indice, weights=estado == 0, minlength=len(codigos))
+            somas[3] += np.bincount(indice[atendida], weights=self.duracao[posicoes][atendida], minlength=len(codigos))
+        return codigos, somas
+
+    def para_dataframe(self, posicoes=None):
+        """Decodifica as chamadas (todas, um slice ou as posições indicadas) já com as colunas derivadas
+
+        Sem posições ou com um slice, as colunas numéricas são views dos arrays do armazém.
+        """
+        def coluna(array):
+            return array if posicoes is None else array[posicoes]
+
+        tempo = colunas_de_tempo(coluna(self.ts), self.rotulos_faixa)
+        codigos_cob = coluna(self.cob)
+        estado = coluna(self.estado)
+
+        return pd.DataFrame({
+            'datetime': tempo['datetime'],
+            'data': tempo['data'],
+            'hora_int': tempo['hora_int'],
+            'duracao': coluna(self.duracao).astype('float64'),
+            'fila': self.filas[coluna(self.fila)],
+            'teleatendente': self.teleatendentes[coluna(self.teleatendente)],
+            'estado': estado,
+            'cob': self.cobs[codigos_cob],
+            'cob_nome': self.cob_nomes[codigos_cob],
+            'faixa_horaria': tempo['faixa_horaria'],
+            'status': rotulos_status(estado),
+        }, copy=False)
@@ -0,0 +1,304 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import traceback
+from contextlib import contextmanager
+
+import pandas as pd
+
+from rollups import HORA, filtro_dimensoes
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    # Sem o pyarrow o arquivo Parquet (FONTE_CONSULTA=parquet) fica indisponível
+    pa = None
+
+PARQUET_DISPONIVEL = pa is not None
+
+ARQUIVO_METADADOS = 'arquivo.json'
+ARQUIVO_TRAVA = 'escrita.lock'
+ARQUIVO_MES = 'chamadas.parquet'
+
+# Colunas gravadas: o conteúdo da chamada, o ts e o id (recorte até o último id arquivado)
+COLUNAS_ARQUIVO = ['id', 'data', 'hora', 'duracao', 'fila', 'teleatendente', 'estado', 'cob', 'ts']
+
+if PARQUET_DISPONIVEL:
+    # Tipos das colunas gravadas (nulos permitidos, como no banco)
+    ESQUEMA = pa.schema([
+        ('id', pa.int64()),
+        ('data', pa.string()),
+        ('hora', pa.string()),
+        ('duracao', pa.float64()),
+        ('fila', pa.string()),
+        ('teleatendente', pa.string()),
+        ('estado', pa.int64()),
+        ('cob', pa.int64()),
+        ('ts', pa.int64()),
+    ])
+
+# Colunas lidas para os painéis; as dos filtros (id, fila) são lidas só para filtrar
+COLUNAS_PAINEIS = ['ts', 'cob', 'teleatendente', 'estado', 'duracao']
+
+# Chaves dos agregados por hora, as mesmas de consultar_agregado
+CHAVES_AGREGADO = ['hora_ts', 'cob', 'teleatendente', 'estado']
+
+
+def limites_do_mes(mes):
+    """[ts_ini, ts_fim) do mês 'AAAA-MM'"""
+    inicio = pd.Timestamp(f'{mes}-01')
+    return int(inicio.value // 10**9), int((inicio + pd.DateOffset(months=1)).value // 10**9)
+
+
+def meses_da_faixa(meses, ts_ini, ts_fim):
+    """Meses ('AAAA-MM'), dentre os arquivados, com alguma parte de [ts_ini, ts_fim]"""
+    selecionados = []
+    for mes in meses:
+        inicio, fim = limites_do_mes(mes)
+        if inicio <= ts_fim and fim > ts_ini:
+            selecionados.append(mes)
+    return selecionados
+
+
+def agregado_vazio():
+    return pd.DataFrame(columns=CHAVES_AGREGADO + ['quantidade', 'duracao_total'])
+
+
+def combinar_agregados(partes):
+    """Soma os agregados por hora de várias origens (as mesmas chaves podem vir de mais de uma)"""
+    partes = [parte for parte in partes if len(parte)]
+    if not partes:
+        return agregado_vazio()
+    if len(partes) == 1:
+        return partes[0]
+    return pd.concat(partes, ignore_index=True).groupby(CHAVES_AGREGADO, as_index=False, sort=False).sum()
+
+
+def consultar_recentes(conn, id_ini, id_fim, ts_ini, ts_fim, cobs=None, dimensoes=()):
+    """Agrega por hora, como consultar_agregado, as chamadas da janela com id em (id_ini, id_fim]"""
+    filtro, params_filtro = filtro_dimensoes(dimensoes)
+    if cobs:
+        filtro += f" AND +cob IN ({', '.join('?' * len(cobs))})"
+        params_filtro += [int(cob) for cob in cobs]
+
+    # O + tira ts e cob dos índices: só a faixa nova de ids da chave primária é percorrida
+    return pd.read_sql_query(f'''
+        SELECT ts - ts % 3600 AS hora_ts, COALESCE(cob, 0) AS cob,
+               COALESCE(teleatendente, '') AS teleatendente, COALESCE(estado, 0) AS estado,
+               COUNT(*) AS quantidade, COALESCE(SUM(duracao), 0) AS duracao_total
+        FROM chamadas
+        WHERE id > ? AND id <= ? AND +ts BETWEEN ? AND ?{filtro}
+        GROUP BY 1, 2, 3, 4
+    ''', conn, params=[id_ini, id_fim, ts_ini, ts_fim] + params_filtro)
+
+
+def _agregar_lote(lote):
+    """Agrega um lote (COLUNAS_PAINEIS) por hora, COB, teleatendente e estado, com os nulos de consultar_agregado"""
+    ts = lote.column('ts')
+    tabela = pa.table({
+        'hora_ts': pc.multiply(pc.divide(ts, HORA), HORA),
+        'cob': pc.fill_null(lote.column('cob'), 0),
+        'teleatendente': pc.fill_null(lote.column('teleatendente'), ''),
+        'estado': pc.fill_null(lote.column('estado'), 0),
+        'duracao': pc.fill_null(lote.column('duracao'), 0.0),
+    })
+    return tabela.group_by(CHAVES_AGREGADO).aggregate([('hora_ts', 'count'), ('duracao', 'sum')]).rename_columns(
+        CHAVES_AGREGADO + ['quantidade', 'duracao_total']
+    )
+
+
+class ArquivoParquet:
+    """Arquivo frio das chamadas em Parquet: um arquivo por mês, agrupado por COB
+
+    Cada mês fica em mes=AAAA-MM/chamadas.parquet, com as chamadas em ordem de
+    (cob, ts) e grupos de linhas_por_grupo linhas: as estatísticas de mínimo e
+    máximo de cada grupo permitem descartar, sem ler, os grupos fora da janela
+    e dos COBs filtrados. O arquivo.json indica o último id do banco incluído
+    e os meses gravados. A atualização reescreve apenas os meses com chamadas
+    novas (id maior que o último arquivado), cada um trocado de forma atômica
+    (os.replace) antes do arquivo.json; como a leitura recorta as chamadas até
+    o último id que leu nele, nunca conta uma chamada duas vezes nem deixa de
+    contar: as de id maior vêm do banco (consultar_recentes).
+    """
+
+    def __init__(self, diretorio, conectar, intervalo=300, linhas_por_grupo=65536):
+        self.diretorio = diretorio
+        self.conectar = conectar
+        self.intervalo = intervalo
+        self.linhas_por_grupo = linhas_por_grupo
+        self.caminho_metadados = os.path.join(diretorio, ARQUIVO_METADADOS)
+        self._parar = threading.Event()
+        self._thread = None
+
+    def ler_metadados(self):
+        """Retorna o conteúdo do arquivo.json (None se ainda não há arquivo)"""
+        try:
+            with open(self.caminho_metadados, encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return None
+
+    def caminho_mes(self, mes):
+        return os.path.join(self.diretorio, f'mes={mes}', ARQUIVO_MES)
+
+    @contextmanager
+    def trava_escrita(self):
+        """Trava exclusiva entre processos (vários workers podem atualizar o arquivo)"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(os.path.join(self.diretorio, ARQUIVO_TRAVA), 'w') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _escrever_mes(self, conn, mes, ultimo_id):
+        """Grava as chamadas do mês até ultimo_id, em ordem de (cob, ts); retorna o número de linhas"""
+        ts_ini, ts_fim = limites_do_mes(mes)
+        cursor = conn.execute(f'''
+            SELECT {', '.join(COLUNAS_ARQUIVO)}
+            FROM chamadas
+            WHERE ts >= ? AND ts < ? AND id <= ?
+            ORDER BY cob, ts
+        ''', (ts_ini, ts_fim, ultimo_id))
+
+        caminho = self.caminho_mes(mes)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = caminho + '.tmp'
+        linhas = 0
+        with pq.ParquetWriter(temporario, ESQUEMA, compression='zstd', write_statistics=True) as escritor:
+            while True:
+                bloco = cursor.fetchmany(self.linhas_por_grupo)
+                if not bloco:
+                    break
+                # Um bloco por grupo de linhas: os grupos seguem a ordem de (cob, ts)
+                colunas = [pa.array(valores, tipo) for valores, tipo in zip(zip(*bloco), ESQUEMA.types)]
+                escritor.write_table(pa.Table.from_arrays(colunas, schema=ESQUEMA), row_group_size=self.linhas_por_grupo)
+                linhas += len(bloco)
+        os.replace(temporario, caminho)
+        return linhas
+
+    def _gravar_metadados(self, metadados):
+        temporario = self.caminho_metadados + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(metadados, arquivo)
+        os.replace(temporario, self.caminho_metadados)
+
+    def atualizar(self):
+        """Reescreve os meses com chamadas gravadas depois do último id arquivado; retorna esses meses"""
+        with self.trava_escrita(), self.conectar() as conn:
+            metadados = self.ler_metadados() or {'ultimo_id': 0, 'meses': {}}
+            ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chamadas").fetchone()[0]
+
+            # Arquivo de um banco anterior (último id maior que o do banco) é descartado
+            if ultimo_id < metadados['ultimo_id']:
+                print("⚠️ Arquivo Parquet de outro banco; regravando todos os meses")
+                self._gravar_metadados({'ultimo_id': 0, 'meses': {}})
+                for mes in metadados['meses']:
+                    shutil.rmtree(os.path.dirname(self.caminho_mes(mes)), ignore_errors=True)
+                metadados = {'ultimo_id': 0, 'meses': {}}
+
+            if ultimo_id == metadados['ultimo_id']:
+                return []
+
+            meses = sorted(mes for (mes,) in conn.execute('''
+                SELECT DISTINCT strftime('%Y-%m', ts, 'unixepoch')
+                FROM chamadas
+                WHERE id > ? AND id <= ? AND ts IS NOT NULL
+            ''', (metadados['ultimo_id'], ultimo_id)))
+            for mes in meses:
+                metadados['meses'][mes] = self._escrever_mes(conn, mes, ultimo_id)
+
+            metadados['ultimo_id'] = ultimo_id
+            self._gravar_metadados(metadados)
+        return meses
+
+    def filtro(self, ultimo_id, ts_ini, ts_fim, cobs=None, dimensoes=()):
+        """Expressão da janela, dos COBs e das dimensões (pares coluna, valores), até ultimo_id"""
+        expressao = (ds.field('ts') >= ts_ini) & (ds.field('ts') <= ts_fim) & (ds.field('id') <= ultimo_id)
+        if cobs:
+            expressao &= ds.field('cob').isin([int(cob) for cob in cobs])
+        for coluna, valores in dimensoes:
+            if coluna not in ('fila', 'teleatendente'):
+                raise ValueError(f"Coluna sem filtro no arquivo: {coluna}")
+            expressao &= ds.field(coluna).isin([str(valor) for valor in valores])
+        return expressao
+
+    def agregar(self, ts_ini, ts_fim, cobs=None, dimensoes=()):
+        """Agrega por hora as chamadas arquivadas da janela: (último id arquivado, DataFrame)
+
+        Lê apenas os meses da janela e, deles, os grupos cujas estatísticas
+        podem conter a janela e os COBs filtrados, e desses só as colunas
+        usadas. Cada lote lido é agregado por hora antes do seguinte: a memória
+        depende do número de horas e atendentes da janela, não de chamadas.
+        """
+        metadados = self.ler_metadados()
+        if metadados is None:
+            return 0, agregado_vazio()
+
+        caminhos = [self.caminho_mes(mes) for mes in meses_da_faixa(metadados['meses'], ts_ini, ts_fim)]
+        if not caminhos:
+            return metadados['ultimo_id'], agregado_vazio()
+
+        dataset = ds.dataset(caminhos, schema=ESQUEMA, format='parquet')
+        parciais = [
+            _agregar_lote(lote)
+            for lote in dataset.to_batches(
+                columns=COLUNAS_PAINEIS, filter=self.filtro(metadados['ultimo_id'], ts_ini, ts_fim, cobs, dimensoes)
+            )
+            if lote.num_rows
+        ]
+        if not parciais:
+            return metadados['ultimo_id'], agregado_vazio()
+
+        tabela = pa.concat_tables(parciais)
+        if len(parciais) > 1:
+            tabela = tabela.group_by(CHAVES_AGREGADO).aggregate(
+                [('quantidade', 'sum'), ('duracao_total', 'sum')]
+            ).rename_columns(CHAVES_AGREGADO + ['quantidade', 'duracao_total'])
+        return metadados['ultimo_id'], tabela.to_pandas()
+
+    def contar_grupos(self, ts_ini, ts_fim, cobs=None, dimensoes=()):
+        """Grupos de linhas que agregar lê (após a poda por mês e por estatísticas) e o total: (lidos, total)"""
+        metadados = self.ler_metadados()
+        if metadados is None:
+            return 0, 0
+
+        filtro = self.filtro(metadados['ultimo_id'], ts_ini, ts_fim, cobs, dimensoes)
+        meses = set(meses_da_faixa(metadados['meses'], ts_ini, ts_fim))
+        lidos, total = 0, 0
+        for mes in metadados['meses']:
+            fragmento = next(ds.dataset(self.caminho_mes(mes), schema=ESQUEMA, format='parquet').get_fragments())
+            total += fragmento.num_row_groups
+            if mes in meses:
+                lidos += len(fragmento.split_by_row_group(filtro))
+        return lidos, total
+
+    @property
+    def nbytes(self):
+        metadados = self.ler_metadados() or {'meses': {}}
+        return sum(os.path.getsize(self.caminho_mes(mes)) for mes in metadados['meses'])
+
+    def _executar_continuamente(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                meses = self.atualizar()
+                if meses:
+                    print(f"🗄️ Arquivo Parquet atualizado: {', '.join(meses)}")
+            except Exception as e:
+                print(f"❌ Erro ao atualizar o arquivo Parquet: {e}")
+                traceback.print_exc()
+
+    def iniciar(self):
+        """Atualiza o arquivo a cada intervalo em uma thread de fundo"""
+        self._thread = threading.Thread(target=self._executar_continuamente, name='arquivo-parquet', daemon=True)
+        self._thread.start()
+        print(f"🗄️ Atualizando o arquivo Parquet em {self.diretorio} a cada {self.intervalo}s")
+
+    def parar(self):
+        self._parar.set()
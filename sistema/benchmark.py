@@ -0,0 +1,749 @@
+"""Benchmark do dashboard em escala de produção
+
+Para cada tamanho de base e fonte de consulta, gera um CSV sintético (gerar_csv),
+carrega-o em um banco novo em diretório temporário e mede a carga, a montagem
+do cache e os callbacks do dashboard com filtros típicos, a frio e em cache.
+Cada caso roda em um processo separado para que o pico de memória seja só dele.
+No modo memória, confere ainda os indicadores das somas acumuladas por minuto
+com os da agregação da janela, em janelas e COBs sorteados, e a seleção pelos
+índices bitmap com a de máscaras booleanas, em filtros de fila e teleatendente
+sorteados. No modo parquet, confere a janela agregada do arquivo Parquet com a
+dos agregados do banco e mede a fração dos grupos de linhas lidos após a poda.
+
+Com --inicializacao, mede o tempo até o servidor aceitar conexões e até o fim da
+carga inicial, com a carga em segundo plano e durante a importação. Com
+--concorrencia, mede a latência de vários usuários simultâneos do dashboard
+enquanto uma thread grava chamadas novas sem parar. Com --deduplicacao, compara
+a ingestão, a reingestão e o tamanho do banco com a UNIQUE das sete colunas e
+com o hash do conteúdo, além da migração entre os dois.
+
+    python benchmark.py --tamanhos 10000 1000000 --saida resultados.json
+    python benchmark.py --tamanhos 10000000 --fontes sqlite parquet
+    python benchmark.py --inicializacao --tamanhos 1000000 --fontes sqlite
+    python benchmark.py --concorrencia 50 --duracao 30 --tamanhos 1000000 --fontes sqlite
+    python benchmark.py --deduplicacao 2000000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+TAMANHOS_PADRAO = [10_000, 1_000_000, 10_000_000, 50_000_000]
+
+INICIO = datetime(2026, 1, 1)
+
+
+def filtros_tipicos(dias):
+    """Filtros usados no dashboard: (nome, date_ini, hh_ini, mm_ini, date_fim, hh_fim, mm_fim, destinos, filas, teleatendentes)"""
+    import gerar_csv
+
+    fim = INICIO + timedelta(days=dias - 1)
+    semana = max(INICIO, fim - timedelta(days=6))
+    mes = min(fim, INICIO + timedelta(days=29))
+
+    def dia(data):
+        return data.strftime('%Y-%m-%d')
+
+    return [
+        ('periodo_completo', dia(INICIO), 0, 0, dia(fim), 23, 59, None, None, None),
+        ('ultima_semana', dia(semana), 0, 0, dia(fim), 23, 59, None, None, None),
+        ('um_dia_dois_cobs', dia(fim), 0, 0, dia(fim), 23, 59, [11, 21], None, None),
+        ('mes_um_cob_expediente', dia(INICIO), 8, 30, dia(mes), 17, 15, [4], None, None),
+        ('periodo_duas_filas', dia(INICIO), 0, 0, dia(fim), 23, 59, None, ['Resgate', 'Incêndio'], None),
+        ('semana_atendentes_fila', dia(semana), 0, 0, dia(fim), 23, 59, None, ['Emergência 193'],
+         gerar_csv.atendentes(4)[:2]),
+    ]
+
+
+def cronometrar(funcao, *args):
+    """Executa a função e retorna (resultado, segundos)"""
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def pico_memoria_mb():
+    # ru_maxrss é em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def tamanho_banco_mb(app):
+    # Com o WAL, as páginas ainda não transferidas ao banco ficam no arquivo -wal
+    return sum(
+        os.path.getsize(caminho) for caminho in (app.DB_PATH, app.DB_PATH + '-wal') if os.path.exists(caminho)
+    ) / 2**20
+
+
+def preparar_caso(tamanho, fonte, dias, cobs, semente):
+    """Gera o CSV, importa o app com um banco novo e carrega as chamadas: (app, etapas, registros_csv, registros)"""
+    import gerar_csv
+
+    os.makedirs('data', exist_ok=True)
+    caminho_csv = os.path.join('data', 'benchmark.csv')
+    por_dia = max(1, tamanho // dias)
+    faixa = (max(1, int(por_dia * 0.9)), int(por_dia * 1.1) + 1)
+
+    etapas = {}
+    registros_csv, etapas['gerar_csv'] = cronometrar(gerar_csv.escrever_csv, caminho_csv, gerar_csv.gerar_chamadas(
+        inicio=INICIO, dias=dias, quantidade_cobs=cobs,
+        chamadas_dia=faixa, chamadas_fim_semana=faixa, semente=semente
+    ))
+
+    # Banco vazio e sem data/geral_df.csv: a importação do app não carrega nada
+    os.environ['FONTE_CONSULTA'] = fonte
+    os.environ['MONITOR_CSV_INTERVALO'] = '0'
+    os.environ['ARQUIVO_INTERVALO'] = '0'
+    _, etapas['importar_app'] = cronometrar(__import__, 'app')
+    import app
+    _, etapas['carga_inicial'] = cronometrar(app.aguardar_carga_inicial)
+
+    registros, etapas['carga_csv_banco'] = cronometrar(app.carregar_csv_em_blocos, caminho_csv)
+    os.remove(caminho_csv)
+
+    if fonte == 'memoria':
+        armazem, etapas['montar_armazem'] = cronometrar(app.carregar_armazem_banco)
+        app.publicar_armazem(armazem)
+    elif fonte == 'parquet':
+        _, etapas['gravar_arquivo'] = cronometrar(app.arquivo_parquet.atualizar)
+
+    return app, etapas, registros_csv, registros
+
+
+def executar_caso(tamanho, fonte, dias, cobs, semente):
+    """Roda um caso no processo atual (já no diretório de trabalho) e retorna as medições"""
+    app, etapas, registros_csv, registros = preparar_caso(tamanho, fonte, dias, cobs, semente)
+
+    _, etapas['dropdown_cob'] = cronometrar(app.popular_dropdown_cob, None)
+
+    consultas = {}
+    for nome, *filtros in filtros_tipicos(dias):
+        app.invalidar_caches()
+        _, frio = cronometrar(app.atualizar_dashboard, *filtros, True)
+        _, em_cache = cronometrar(app.atualizar_dashboard, *filtros, True)
+        consultas[nome] = {'frio': frio, 'em_cache': em_cache}
+
+    resultado = {
+        'tamanho': tamanho,
+        'fonte': fonte,
+        'registros_csv': registros_csv,
+        'registros_banco': registros,
+        'etapas': etapas,
+        'dashboard': consultas,
+        'tamanho_banco_mb': tamanho_banco_mb(app),
+        'pico_memoria_mb': pico_memoria_mb(),
+    }
+    if fonte == 'memoria':
+        resultado['resumo'] = validar_resumo(app, dias, cobs, semente)
+        resultado['bitmaps'] = validar_bitmaps(app, dias, semente)
+    elif fonte == 'parquet':
+        resultado['tamanho_arquivo_mb'] = app.arquivo_parquet.nbytes / 2**20
+        resultado['arquivo'] = validar_arquivo(app, dias, cobs, semente)
+    return resultado
+
+
+def validar_resumo(app, dias, cobs, semente, janelas=200):
+    """Compara resumir_armazem com resumir_chamadas da janela decodificada em janelas sorteadas
+
+    As bordas caem em segundos quaisquer (metade alinhada a minutos, como nos
+    filtros) e os COBs são subconjuntos sorteados. Conta as janelas com algum
+    indicador diferente (durações com tolerância relativa de 1e-9).
+    """
+    from indicadores import resumir_armazem, resumir_chamadas
+
+    armazem = app.carregar_dados()
+    sorteio = random.Random(semente)
+    codigos = sorted(armazem.cobs.tolist())[:cobs]
+    inicio, fim = app._para_ts(INICIO), app._para_ts(INICIO + timedelta(days=dias))
+    divergencias, exemplos, tempos = 0, [], {'acumulado': [], 'janela': []}
+
+    def iguais(a, b):
+        if isinstance(a, float):
+            return abs(a - b) <= 1e-9 * max(1.0, abs(a))
+        return a == b
+
+    for _ in range(janelas):
+        ts_ini, ts_fim = sorted(sorteio.randint(inicio, fim) for _ in range(2))
+        if sorteio.random() < 0.5:
+            ts_ini, ts_fim = ts_ini - ts_ini % 60, ts_fim - ts_fim % 60
+        selecionados = sorteio.sample(codigos, sorteio.randint(0, min(3, len(codigos))))
+
+        acumulado, segundos = cronometrar(resumir_armazem, armazem, ts_ini, ts_fim, selecionados)
+        tempos['acumulado'].append(segundos)
+
+        def pela_janela():
+            dff = armazem.para_dataframe(armazem.selecionar(ts_ini, ts_fim, selecionados))
+            return resumir_chamadas(dff.assign(quantidade=1, duracao_total=dff['duracao']))
+
+        esperado, segundos = cronometrar(pela_janela)
+        tempos['janela'].append(segundos)
+
+        itens = [(esperado['geral'], acumulado['geral'])] + list(zip(esperado['por_cob'], acumulado['por_cob']))
+        if len(esperado['por_cob']) != len(acumulado['por_cob']) or not all(
+            iguais(a[chave], b[chave]) for a, b in itens for chave in a
+        ):
+            divergencias += 1
+            exemplos.append({'ts_ini': ts_ini, 'ts_fim': ts_fim, 'cobs': selecionados})
+
+    return {
+        'janelas': janelas,
+        'divergencias': divergencias,
+        'exemplos_divergencias': exemplos[:3],
+        'acumulado_ms': percentis_ms(tempos['acumulado']),
+        'janela_ms': percentis_ms(tempos['janela']),
+        'somas_acumuladas_mb': armazem.acumulados.nbytes / 2**20,
+    }
+
+
+def validar_bitmaps(app, dias, semente, janelas=200):
+    """Compara a seleção pelos índices bitmap com máscaras booleanas sobre as colunas, em filtros sorteados
+
+    Cada janela sorteia filas, teleatendentes e COBs (cada filtro presente ou
+    não) e confere as posições selecionadas; mede as duas formas de filtrar.
+    """
+    import numpy as np
+
+    armazem = app.carregar_dados()
+    sorteio = random.Random(semente)
+    filas = [fila for fila in armazem.filas.tolist() if fila]
+    teleatendentes = [nome for nome in armazem.teleatendentes.tolist() if nome]
+    cobs = armazem.cobs.tolist()
+    inicio, fim = app._para_ts(INICIO), app._para_ts(INICIO + timedelta(days=dias))
+    divergencias, exemplos, tempos = 0, [], {'bitmap': [], 'mascara': []}
+
+    for _ in range(janelas):
+        ts_ini, ts_fim = sorted(sorteio.randint(inicio, fim) for _ in range(2))
+        dimensoes = [('fila', tuple(sorteio.sample(filas, sorteio.randint(1, min(3, len(filas))))))]
+        if sorteio.random() < 0.5:
+            dimensoes.append(('teleatendente', tuple(sorteio.sample(teleatendentes, min(5, len(teleatendentes))))))
+        selecionados = sorteio.sample(cobs, sorteio.randint(0, min(2, len(cobs))))
+
+        obtido, segundos = cronometrar(armazem.selecionar, ts_ini, ts_fim, selecionados, tuple(dimensoes))
+        tempos['bitmap'].append(segundos)
+
+        def por_mascaras():
+            inicio_faixa, fim_faixa = armazem.faixa(ts_ini, ts_fim)
+            mascara = np.zeros(len(armazem), dtype=bool)
+            mascara[inicio_faixa:fim_faixa] = True
+            if selecionados:
+                mascara &= np.isin(armazem.cob, armazem.codigos_cob(selecionados))
+            for coluna, valores in dimensoes:
+                mascara &= np.isin(getattr(armazem, coluna), armazem.codigos(coluna, valores))
+            return np.flatnonzero(mascara)
+
+        esperado, segundos = cronometrar(por_mascaras)
+        tempos['mascara'].append(segundos)
+
+        if not np.array_equal(esperado, obtido):
+            divergencias += 1
+            exemplos.append({'ts_ini': ts_ini, 'ts_fim': ts_fim, 'cobs': selecionados, 'dimensoes': dimensoes})
+
+    return {
+        'janelas': janelas,
+        'divergencias': divergencias,
+        'exemplos_divergencias': exemplos[:3],
+        'bitmap_ms': percentis_ms(tempos['bitmap']),
+        'mascara_ms': percentis_ms(tempos['mascara']),
+        'indices_bitmap_mb': sum(indice.nbytes for indice in armazem.bitmaps.values()) / 2**20,
+    }
+
+
+def validar_arquivo(app, dias, cobs, semente, janelas=200):
+    """Compara a janela agregada do arquivo Parquet com a dos agregados do banco em janelas sorteadas
+
+    As janelas e os COBs são sorteados como em validar_resumo. Conta as janelas
+    com algum total por hora, COB, teleatendente e estado diferente (durações
+    com tolerância relativa de 1e-9) e os grupos de linhas lidos após a poda.
+    """
+    import numpy as np
+    from arquivo_parquet import CHAVES_AGREGADO
+    from rollups import consultar_agregado
+
+    sorteio = random.Random(semente)
+    codigos = list(app.obter_catalogo().cobs)[:cobs]
+    inicio, fim = app._para_ts(INICIO), app._para_ts(INICIO + timedelta(days=dias))
+    divergencias, grupos_lidos, grupos_total = 0, 0, 0
+    tempos = {'arquivo': [], 'banco': []}
+
+    for _ in range(janelas):
+        ts_ini, ts_fim = sorted(sorteio.randint(inicio, fim) for _ in range(2))
+        if sorteio.random() < 0.5:
+            ts_ini, ts_fim = ts_ini - ts_ini % 60, ts_fim - ts_fim % 60
+        selecionados = sorteio.sample(codigos, sorteio.randint(0, min(3, len(codigos))))
+
+        (_, arquivado), segundos = cronometrar(app.arquivo_parquet.agregar, ts_ini, ts_fim, selecionados)
+        tempos['arquivo'].append(segundos)
+        with app.get_db_connection() as conn:
+            esperado, segundos = cronometrar(consultar_agregado, conn, ts_ini, ts_fim, selecionados)
+        tempos['banco'].append(segundos)
+
+        # Os agregados do banco podem repetir a chave (horas inteiras e bordas): soma antes de comparar
+        esperado = esperado.groupby(CHAVES_AGREGADO, as_index=False).sum()
+        comparado = esperado.merge(arquivado, on=CHAVES_AGREGADO, how='outer', suffixes=('', '_arquivo')).fillna(0)
+        if not ((comparado['quantidade'] == comparado['quantidade_arquivo']).all() and np.allclose(
+            comparado['duracao_total'], comparado['duracao_total_arquivo'], rtol=1e-9, atol=0
+        )):
+            divergencias += 1
+
+        lidos, total = app.arquivo_parquet.contar_grupos(ts_ini, ts_fim, selecionados)
+        grupos_lidos += lidos
+        grupos_total += total
+
+    return {
+        'janelas': janelas,
+        'divergencias': divergencias,
+        'grupos_lidos': grupos_lidos / max(1, grupos_total),
+        'arquivo_ms': percentis_ms(tempos['arquivo']),
+        'banco_ms': percentis_ms(tempos['banco']),
+    }
+
+
+def percentis_ms(valores):
+    if not valores:
+        return {}
+    valores = sorted(valores)
+    return {
+        nome: round(valores[min(len(valores) - 1, int(len(valores) * fracao))] * 1000, 1)
+        for nome, fracao in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))
+    }
+
+
+def executar_concorrencia(tamanho, fonte, dias, cobs, semente, usuarios, segundos):
+    """Usuários simultâneos atualizando o dashboard enquanto uma thread grava chamadas novas
+
+    Cada usuário escolhe um dos filtros típicos e recalcula o painel inteiro
+    (indicadores com o status dos dados, cards e gráficos), em sequência. A
+    ingestão grava micro-lotes de dias posteriores ao período carregado, como a
+    API, e cada lote invalida os resultados em cache, como em produção.
+    """
+    import gerar_csv
+
+    app, etapas, _, registros = preparar_caso(tamanho, fonte, dias, cobs, semente)
+    por_dia = max(1, tamanho // dias)
+    novas = gerar_csv.gerar_chamadas(
+        inicio=INICIO + timedelta(days=dias), dias=3650, quantidade_cobs=cobs,
+        chamadas_dia=(por_dia, por_dia + 1), chamadas_fim_semana=(por_dia, por_dia + 1), semente=semente + 1
+    )
+    filtros = [filtro for _, *filtro in filtros_tipicos(dias)]
+    parar = threading.Event()
+    latencias, erros, ingestao = [], [], {'lotes': 0, 'chamadas': 0, 'segundos': []}
+
+    def usuario(indice):
+        sorteio = random.Random(semente + indice)
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            try:
+                app.atualizar_dashboard(*sorteio.choice(filtros), True)
+            except Exception as e:
+                erros.append(repr(e))
+                continue
+            latencias.append(time.perf_counter() - inicio)
+
+    def ingerir():
+        for bloco in novas:
+            for inicio_lote in range(0, len(bloco), 1000):
+                if parar.is_set():
+                    return
+                lote = app.preparar_chamadas_csv(bloco.iloc[inicio_lote:inicio_lote + 1000].copy())
+                inicio = time.perf_counter()
+                ingestao['chamadas'] += app.ingerir_novas_chamadas(lote, 'benchmark')
+                ingestao['segundos'].append(time.perf_counter() - inicio)
+                ingestao['lotes'] += 1
+
+    threads = [threading.Thread(target=ingerir)] + [threading.Thread(target=usuario, args=(i,)) for i in range(usuarios)]
+    for thread in threads:
+        thread.start()
+    time.sleep(segundos)
+    parar.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'tamanho': tamanho,
+        'fonte': fonte,
+        'registros_banco': registros,
+        'usuarios': usuarios,
+        'segundos': segundos,
+        'etapas': etapas,
+        'consultas': len(latencias),
+        'consultas_por_segundo': len(latencias) / segundos,
+        'latencia_ms': percentis_ms(latencias),
+        'erros': len(erros),
+        'exemplos_erros': sorted(set(erros))[:3],
+        'chamadas_ingeridas': ingestao['chamadas'],
+        'ingestao_por_segundo': ingestao['chamadas'] / segundos,
+        'latencia_lote_ms': percentis_ms(ingestao['segundos']),
+        'pico_memoria_mb': pico_memoria_mb(),
+    }
+
+
+def medir_enriquecimento(linhas, semente=42):
+    """Compara o cálculo das colunas derivadas anterior (texto e apply por linha) com o vetorizado"""
+    import numpy as np
+    import pandas as pd
+    from colunas_derivadas import colunas_de_tempo, rotulos_status, codigos_estado
+
+    rng = np.random.default_rng(semente)
+    inicio = int(pd.Timestamp(INICIO).value // 10**9)
+    ts = np.sort(rng.integers(inicio, inicio + 365 * 86400, linhas))
+    estado = rng.integers(0, 2, linhas)
+    rotulos_faixa = [f'{h // 2 * 2:02d}-{h // 2 * 2 + 2:02d}h' for h in range(24)]
+    datahora = pd.to_datetime(ts, unit='s')
+    df = pd.DataFrame({
+        'data': datahora.normalize(),
+        'hora': datahora.strftime('%H:%M:%S'),
+        'estado': estado,
+    })
+
+    def anterior():
+        # Caminho substituído: data formatada, concatenada à hora e reconvertida
+        datetime_ = pd.to_datetime(df['data'].dt.strftime('%Y-%m-%d') + ' ' + df['hora'].astype(str))
+        hora_int = pd.to_datetime(df['hora'], format='%H:%M:%S').dt.hour
+        faixa = hora_int.apply(rotulos_faixa.__getitem__)
+        status = df['estado'].map({0: 'Não Atendido', 1: 'Atendido'})
+        return datetime_, faixa, status
+
+    def vetorizado():
+        colunas = colunas_de_tempo(ts, rotulos_faixa)
+        return colunas, rotulos_status(codigos_estado(estado))
+
+    (datetime_, faixa, _), segundos_anterior = cronometrar(anterior)
+    (colunas, _), segundos_vetorizado = cronometrar(vetorizado)
+    assert (datetime_.to_numpy() == colunas['datetime']).all()
+    assert (faixa.to_numpy() == colunas['faixa_horaria']).all()
+
+    return {
+        'linhas': linhas,
+        'anterior': segundos_anterior,
+        'vetorizado': segundos_vetorizado,
+        'aceleracao': segundos_anterior / segundos_vetorizado,
+    }
+
+
+def medir_deduplicacao(linhas, semente=42, tamanho_lote=5000):
+    """Compara a deduplicação pela UNIQUE das sete colunas com a pelo hash do conteúdo
+
+    Mede, em bancos novos, a ingestão em lotes de tamanho_lote, a reingestão
+    das mesmas chamadas (todas recusadas como repetidas) e o tamanho do arquivo
+    e, por fim, a migração do banco do esquema anterior para o do hash.
+    """
+    import sqlite3
+    import numpy as np
+    import pandas as pd
+    from deduplicacao import COLUNAS_CONTEUDO, SQL_TABELA_CHAMADAS, hashes_conteudo, migrar_para_hash
+
+    rng = np.random.default_rng(semente)
+    inicio = int(pd.Timestamp(INICIO).value // 10**9)
+    datahora = pd.to_datetime(np.sort(rng.integers(inicio, inicio + 365 * 86400, linhas)), unit='s')
+    filas = np.array(['Emergência 193', 'Resgate', 'Incêndio', 'Salvamento', 'Informações', 'Trote'], dtype=object)
+    teleatendentes = np.array([f'Teleatendente {i:03d}' for i in range(200)], dtype=object)
+    colunas = [
+        datahora.strftime('%Y-%m-%d').tolist(),
+        datahora.strftime('%H:%M:%S').tolist(),
+        np.round(rng.exponential(120, linhas), 3).tolist(),
+        filas[rng.integers(0, len(filas), linhas)].tolist(),
+        teleatendentes[rng.integers(0, len(teleatendentes), linhas)].tolist(),
+        rng.integers(0, 2, linhas).tolist(),
+        rng.choice([11, 21, 22, 31, 32, 4, 51, 52, 61], linhas).tolist(),
+    ]
+    lotes = [[coluna[i:i + tamanho_lote] for coluna in colunas] for i in range(0, linhas, tamanho_lote)]
+
+    # Lote misto: chamadas já gravadas com chamadas novas de teleatendentes com nomes
+    # mais longos (o hash de uma chamada não pode depender dos demais textos do lote)
+    repetidas = rng.choice(linhas, min(linhas, tamanho_lote), replace=False)
+    novas = rng.choice(linhas, len(repetidas) // 2, replace=False)
+    lote_misto = [[coluna[i] for i in repetidas] + [coluna[i] for i in novas] for coluna in colunas]
+    lote_misto[4][len(repetidas):] = [
+        f'{nome} de nome bem mais comprido que os demais' for nome in lote_misto[4][len(repetidas):]
+    ]
+
+    # Esquema anterior: sem hash_conteudo, com a UNIQUE das sete colunas de conteúdo
+    sql_anterior = SQL_TABELA_CHAMADAS.format(tabela='chamadas').replace(
+        'hash_conteudo INTEGER NOT NULL UNIQUE', f"UNIQUE({', '.join(COLUNAS_CONTEUDO)})"
+    )
+    esquemas = {
+        'anterior': (sql_anterior, COLUNAS_CONTEUDO, lambda lote: list(zip(*lote))),
+        'hash': (SQL_TABELA_CHAMADAS.format(tabela='chamadas'), COLUNAS_CONTEUDO + ['hash_conteudo'],
+                 lambda lote: list(zip(*lote, hashes_conteudo(lote).tolist()))),
+    }
+
+    diretorio = tempfile.mkdtemp(prefix='benchmark_deduplicacao_')
+    resultado = {'linhas': linhas}
+    try:
+        for nome, (sql_tabela, colunas_insercao, registros) in esquemas.items():
+            caminho = os.path.join(diretorio, f'{nome}.db')
+            conn = sqlite3.connect(caminho)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Cache da ingestão do app (INGEST_CACHE_KB padrão)
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute(sql_tabela)
+            sql_inserir = (
+                f"INSERT OR IGNORE INTO chamadas ({', '.join(colunas_insercao)}) "
+                f"VALUES ({', '.join('?' * len(colunas_insercao))})"
+            )
+
+            def ingerir():
+                for lote in lotes:
+                    conn.executemany(sql_inserir, registros(lote))
+                    conn.commit()
+
+            _, segundos_ingestao = cronometrar(ingerir)
+            alteracoes_antes = conn.total_changes
+            _, segundos_reingestao = cronometrar(ingerir)
+            assert conn.total_changes == alteracoes_antes
+
+            conn.executemany(sql_inserir, registros(lote_misto))
+            conn.commit()
+            regravadas = conn.total_changes - alteracoes_antes - len(novas)
+            assert regravadas == 0, f"{regravadas} chamadas repetidas gravadas de novo no lote misto ({nome})"
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.close()
+
+            resultado[nome] = {
+                'ingestao_linhas_s': linhas / segundos_ingestao,
+                'reingestao_linhas_s': linhas / segundos_reingestao,
+                'tamanho_mb': os.path.getsize(caminho) / 1024 / 1024,
+            }
+
+        conn = sqlite3.connect(os.path.join(diretorio, 'anterior.db'))
+        _, resultado['migracao'] = cronometrar(migrar_para_hash, conn)
+        conn.close()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+    return resultado
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def medir_inicializacao(tamanho, fonte, em_segundo_plano, args):
+    """Sobe o app com o CSV inicial em data/geral_df.csv e mede o tempo até aceitar conexões e até o fim da carga
+
+    O tempo até escutar é contado do início do processo até a primeira resposta
+    HTTP 200 da página; o da carga, até o app imprimir a conclusão da carga inicial.
+    """
+    import gerar_csv
+
+    diretorio = tempfile.mkdtemp(prefix='benchmark_dash_')
+    processo = None
+    try:
+        os.makedirs(os.path.join(diretorio, 'data'))
+        por_dia = max(1, tamanho // args.dias)
+        gerar_csv.escrever_csv(os.path.join(diretorio, 'data', 'geral_df.csv'), gerar_csv.gerar_chamadas(
+            inicio=INICIO, dias=args.dias, quantidade_cobs=args.cobs,
+            chamadas_dia=(por_dia, por_dia + 1), chamadas_fim_semana=(por_dia, por_dia + 1), semente=args.semente
+        ))
+
+        porta = porta_livre()
+        ambiente = dict(
+            os.environ, PORT=str(porta), FONTE_CONSULTA=fonte, MONITOR_CSV_INTERVALO='0',
+            CARGA_EM_SEGUNDO_PLANO='1' if em_segundo_plano else '0', PYTHONUNBUFFERED='1'
+        )
+        inicio = time.perf_counter()
+        processo = subprocess.Popen(
+            [sys.executable, os.path.join(DIRETORIO, 'app.py')], cwd=diretorio, env=ambiente,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+
+        carga = {}
+        carga_concluida = threading.Event()
+
+        def acompanhar_saida():
+            for linha in processo.stdout:
+                if 'Carga inicial concluída' in linha and not carga:
+                    carga['segundos'] = round(time.perf_counter() - inicio, 2)
+                    carga_concluida.set()
+            carga_concluida.set()
+
+        threading.Thread(target=acompanhar_saida, daemon=True).start()
+
+        escutar = None
+        while escutar is None and processo.poll() is None:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{porta}/', timeout=5) as resposta:
+                    if resposta.status == 200:
+                        escutar = round(time.perf_counter() - inicio, 2)
+            except OSError:
+                time.sleep(0.05)
+
+        carga_concluida.wait()
+        return {
+            'tamanho': tamanho,
+            'fonte': fonte,
+            'carga_em_segundo_plano': em_segundo_plano,
+            'escutar': escutar,
+            'carga_inicial': carga.get('segundos'),
+        }
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def rodar_em_subprocesso(tamanho, fonte, args):
+    """Executa um caso em um processo novo, em um diretório temporário descartável"""
+    diretorio = tempfile.mkdtemp(prefix='benchmark_dash_')
+    try:
+        comando = [
+            sys.executable, os.path.abspath(__file__), '--caso', str(tamanho), fonte,
+            '--dias', str(args.dias), '--cobs', str(args.cobs), '--semente', str(args.semente)
+        ]
+        if args.concorrencia:
+            comando += ['--concorrencia', str(args.concorrencia), '--duracao', str(args.duracao)]
+        ambiente = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [DIRETORIO, os.environ.get('PYTHONPATH')])))
+        processo = subprocess.run(comando, cwd=diretorio, env=ambiente, capture_output=True, text=True)
+        if processo.returncode != 0:
+            print(processo.stdout[-2000:], processo.stderr[-4000:], sep='\n')
+            return {'tamanho': tamanho, 'fonte': fonte, 'erro': processo.stderr.strip().splitlines()[-1:]}
+        # A última linha da saída traz o resultado em JSON
+        return json.loads(processo.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRETORIO, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def imprimir_resumo(resultado):
+    if 'erro' in resultado:
+        print(f"❌ {resultado['tamanho']:>11,} {resultado['fonte']:<8} {resultado['erro']}")
+        return
+
+    if 'usuarios' in resultado:
+        latencia = resultado['latencia_ms']
+        print(f"👥 {resultado['tamanho']:>11,} {resultado['fonte']:<8} {resultado['usuarios']} usuários: "
+              f"{resultado['consultas_por_segundo']:.1f} painéis/s, p50 {latencia.get('p50')} ms, "
+              f"p95 {latencia.get('p95')} ms, máx {latencia.get('max')} ms, {resultado['erros']} erros | "
+              f"ingestão {resultado['ingestao_por_segundo']:,.0f} chamadas/s "
+              f"(lote p95 {resultado['latencia_lote_ms'].get('p95')} ms)")
+        return
+
+    etapas = ', '.join(f"{nome}={segundos:.2f}s" for nome, segundos in resultado['etapas'].items())
+    print(f"📏 {resultado['tamanho']:>11,} {resultado['fonte']:<8} {etapas} | "
+          f"pico {resultado['pico_memoria_mb']:.0f} MB, banco {resultado['tamanho_banco_mb']:.0f} MB")
+    for nome, tempos in resultado['dashboard'].items():
+        print(f"    {nome:<24} frio {tempos['frio'] * 1000:9.1f} ms   em cache {tempos['em_cache'] * 1000:7.2f} ms")
+    if 'resumo' in resultado:
+        resumo = resultado['resumo']
+        print(f"    {'indicadores acumulados':<24} {resumo['divergencias']}/{resumo['janelas']} janelas divergentes, "
+              f"p50 {resumo['acumulado_ms'].get('p50')} ms (janela {resumo['janela_ms'].get('p50')} ms), "
+              f"{resumo['somas_acumuladas_mb']:.1f} MB")
+    if 'bitmaps' in resultado:
+        bitmaps = resultado['bitmaps']
+        print(f"    {'filtros por bitmap':<24} {bitmaps['divergencias']}/{bitmaps['janelas']} janelas divergentes, "
+              f"p50 {bitmaps['bitmap_ms'].get('p50')} ms (máscaras {bitmaps['mascara_ms'].get('p50')} ms), "
+              f"{bitmaps['indices_bitmap_mb']:.1f} MB")
+    if 'arquivo' in resultado:
+        arquivo = resultado['arquivo']
+        print(f"    {'arquivo parquet':<24} {arquivo['divergencias']}/{arquivo['janelas']} janelas divergentes, "
+              f"p50 {arquivo['arquivo_ms'].get('p50')} ms (banco {arquivo['banco_ms'].get('p50')} ms), "
+              f"{arquivo['grupos_lidos']:.1%} dos grupos lidos, {resultado['tamanho_arquivo_mb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga e consultas do dashboard')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    parser.add_argument('--fontes', nargs='+', choices=['sqlite', 'memoria', 'parquet'], default=['sqlite', 'memoria'])
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--cobs', type=int, default=9)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='Arquivo JSON para gravar os resultados')
+    parser.add_argument('--enriquecimento', type=int, metavar='LINHAS',
+                        help='Mede apenas o cálculo das colunas derivadas com LINHAS chamadas')
+    parser.add_argument('--deduplicacao', type=int, metavar='LINHAS',
+                        help='Compara a deduplicação pela UNIQUE das sete colunas com a pelo hash, com LINHAS chamadas')
+    parser.add_argument('--inicializacao', action='store_true',
+                        help='Mede o tempo até o servidor aceitar conexões (carga em segundo plano e na importação)')
+    parser.add_argument('--concorrencia', type=int, metavar='USUARIOS',
+                        help='Mede USUARIOS simultâneos no dashboard durante uma ingestão contínua')
+    parser.add_argument('--duracao', type=int, default=30, help='Segundos de cada medição com --concorrencia')
+    parser.add_argument('--caso', nargs=2, metavar=('TAMANHO', 'FONTE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        # Execução interna de um caso: a saída do app vai para stderr e o resultado para stdout
+        saida = sys.stdout
+        sys.stdout = sys.stderr
+        if args.concorrencia:
+            resultado = executar_concorrencia(
+                int(args.caso[0]), args.caso[1], args.dias, args.cobs, args.semente, args.concorrencia, args.duracao
+            )
+        else:
+            resultado = executar_caso(int(args.caso[0]), args.caso[1], args.dias, args.cobs, args.semente)
+        print(json.dumps(resultado), file=saida)
+        return
+
+    if args.enriquecimento:
+        sys.path.insert(0, DIRETORIO)
+        resultado = medir_enriquecimento(args.enriquecimento, args.semente)
+        print(f"🧮 {resultado['linhas']:,} linhas: anterior {resultado['anterior']:.2f}s, "
+              f"vetorizado {resultado['vetorizado']:.3f}s ({resultado['aceleracao']:.0f}x)")
+        return
+
+    if args.deduplicacao:
+        sys.path.insert(0, DIRETORIO)
+        resultado = medir_deduplicacao(args.deduplicacao, args.semente)
+        for nome in ('anterior', 'hash'):
+            medidas = resultado[nome]
+            print(f"🔑 {resultado['linhas']:,} linhas, {nome:<8}: ingestão {medidas['ingestao_linhas_s']:,.0f}/s, "
+                  f"reingestão {medidas['reingestao_linhas_s']:,.0f}/s, banco {medidas['tamanho_mb']:.1f} MB")
+        print(f"🔧 Migração do esquema anterior: {resultado['migracao']:.1f}s")
+        return
+
+    if args.inicializacao:
+        sys.path.insert(0, DIRETORIO)
+
+    resultados = []
+    for tamanho in args.tamanhos:
+        for fonte in args.fontes:
+            if args.inicializacao:
+                for em_segundo_plano in (True, False):
+                    resultado = medir_inicializacao(tamanho, fonte, em_segundo_plano, args)
+                    modo = 'em segundo plano' if em_segundo_plano else 'na importação'
+                    print(f"🚦 {tamanho:>11,} {fonte:<8} carga {modo:<16} "
+                          f"escutando em {resultado['escutar']}s, carga concluída em {resultado['carga_inicial']}s")
+                    resultados.append(resultado)
+                continue
+
+            print(f"⏱️ Executando {tamanho:,} registros com fonte {fonte}...")
+            resultado = rodar_em_subprocesso(tamanho, fonte, args)
+            imprimir_resumo(resultado)
+            resultados.append(resultado)
+
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump({
+                'versao': versao_codigo(),
+                'executado_em': datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'dias': args.dias,
+                'cobs': args.cobs,
+                'resultados': resultados,
+            }, f, indent=2)
+        print(f"💾 Resultados gravados em {args.saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheResultados:
+    """Cache LRU com expiração (TTL) para resultados de callbacks, seguro entre threads"""
+
+    def __init__(self, tamanho_maximo=64, ttl=300):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self._geracao = 0
+        self._em_calculo = {}
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave):
+        """Retorna (valor, geracao); valor é None quando ausente ou expirado"""
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                valor, expira_em = item
+                if expira_em > agora:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return valor, self._geracao
+                del self._itens[chave]
+            self.falhas += 1
+            return None, self._geracao
+
+    def guardar(self, chave, valor, geracao):
+        """Guarda o valor, descartando-o se o cache foi invalidado durante o cálculo"""
+        with self._lock:
+            if geracao != self._geracao:
+                return
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def obter_ou_calcular(self, chave, calcular):
+        """Retorna o valor em cache ou calcula uma única vez, mesmo com pedidos simultâneos"""
+        valor, geracao = self.obter(chave)
+        if valor is not None:
+            return valor
+
+        with self._lock:
+            evento = self._em_calculo.get(chave)
+            responsavel = evento is None
+            if responsavel:
+                evento = self._em_calculo[chave] = threading.Event()
+
+        if not responsavel:
+            # Outra thread já está calculando: aguardar e reaproveitar
+            evento.wait()
+            valor, _ = self.obter(chave)
+            return valor if valor is not None else calcular()
+
+        try:
+            valor = calcular()
+            self.guardar(chave, valor, geracao)
+            return valor
+        finally:
+            with self._lock:
+                self._em_calculo.pop(chave, None)
+            evento.set()
+
+    def invalidar(self):
+        """Descarta todos os resultados (ex.: novos registros no banco)"""
+        with self._lock:
+            self._itens.clear()
+            self._geracao += 1
+
+    def estatisticas(self):
+        """Retorna contadores de acertos/falhas e ocupação do cache"""
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': self.acertos / total if total else 0.0,
+                'itens': len(self._itens),
+                'geracao': self._geracao,
+            }
@@ -0,0 +1,80 @@
+import pandas as pd
+
+
+def _combinar(funcao, *valores):
+    """Aplica min/max ignorando valores ausentes"""
+    valores = [valor for valor in valores if valor is not None]
+    return funcao(valores) if valores else None
+
+
+def periodo_chamadas(conn):
+    """Menor e maior ts das chamadas (None, None sem dados)
+
+    Um MIN e um MAX na mesma consulta percorrem a tabela inteira; em subconsultas
+    separadas, cada um lê uma única entrada do índice de ts.
+    """
+    return conn.execute(
+        "SELECT (SELECT MIN(ts) FROM chamadas), (SELECT MAX(ts) FROM chamadas)"
+    ).fetchone()
+
+
+class CatalogoDimensoes:
+    """Valores distintos das dimensões (COB, fila, teleatendente) e período das chamadas
+
+    Mantido em memória e imutável: cada carga gera um novo catálogo com os
+    valores das chamadas novas, publicado por troca de referência.
+    """
+
+    def __init__(self, cobs=(), filas=(), teleatendentes=(), ts_min=None, ts_max=None):
+        self.cobs = tuple(sorted(cobs))
+        self.filas = tuple(sorted(filas))
+        self.teleatendentes = tuple(sorted(teleatendentes))
+        self.ts_min = ts_min
+        self.ts_max = ts_max
+
+    @classmethod
+    def do_banco(cls, conn):
+        """Monta o catálogo completo a partir dos agregados por hora (bem menores que as chamadas)"""
+        def distintos(coluna):
+            return [valor for (valor,) in conn.execute(f"SELECT DISTINCT {coluna} FROM chamadas_hora")]
+
+        ts_min, ts_max = periodo_chamadas(conn)
+        return cls(distintos('cob'), distintos('fila'), distintos('teleatendente'), ts_min, ts_max)
+
+    @classmethod
+    def do_armazem(cls, armazem):
+        """Monta o catálogo a partir das tabelas de categorias do armazém (sem acessar o banco)"""
+        if len(armazem) == 0:
+            return cls()
+        return cls(armazem.cobs.tolist(), armazem.filas.tolist(), armazem.teleatendentes.tolist(),
+                   int(armazem.ts[0]), int(armazem.ts[-1]))
+
+    def com_chamadas_novas(self, conn, id_inicial):
+        """Retorna um novo catálogo incluindo as chamadas com id maior que id_inicial"""
+        novas = pd.read_sql_query('''
+            SELECT DISTINCT COALESCE(cob, 0) AS cob, COALESCE(fila, '') AS fila,
+                   COALESCE(teleatendente, '') AS teleatendente
+            FROM chamadas
+            WHERE id > ? AND ts IS NOT NULL
+        ''', conn, params=(id_inicial,))
+        ts_min, ts_max = conn.execute(
+            "SELECT MIN(ts), MAX(ts) FROM chamadas WHERE id > ?", (id_inicial,)
+        ).fetchone()
+
+        return CatalogoDimensoes(
+            set(self.cobs).union(novas['cob'].tolist()),
+            set(self.filas).union(novas['fila'].tolist()),
+            set(self.teleatendentes).union(novas['teleatendente'].tolist()),
+            _combinar(min, self.ts_min, ts_min),
+            _combinar(max, self.ts_max, ts_max),
+        )
+
+    @property
+    def inicio(self):
+        """Primeiro datetime das chamadas (None sem dados)"""
+        return None if self.ts_min is None else pd.to_datetime(self.ts_min, unit='s')
+
+    @property
+    def fim(self):
+        """Último datetime das chamadas (None sem dados)"""
+        return None if self.ts_max is None else pd.to_datetime(self.ts_max, unit='s')
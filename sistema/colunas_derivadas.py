@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+SEGUNDOS_DIA = 86400
+
+# Resoluções do eixo de datas, da mais fina para a mais grossa
+RESOLUCOES_DATA = ('dia', 'semana', 'mes')
+
+# Rótulos de estado (índice = estado + 1; -1 representa estado ausente)
+ROTULOS_STATUS = np.array([np.nan, 'Não Atendido', 'Atendido'], dtype=object)
+
+
+def codigos_estado(estado):
+    """Normaliza o estado para int8: 0, 1 ou -1 (ausente ou desconhecido)"""
+    estado = pd.Series(estado).fillna(-1).to_numpy(dtype='int64')
+    return np.where(np.isin(estado, (0, 1)), estado, -1).astype('int8')
+
+
+def colunas_de_tempo(ts, rotulos_faixa):
+    """Calcula datetime, data, hora_int e faixa_horaria a partir do ts (epoch em segundos)
+
+    Apenas aritmética inteira e consulta à tabela de rótulos da faixa horária
+    (24 posições, uma por hora): nenhuma formatação ou conversão de texto.
+    """
+    ts = np.asarray(ts, dtype='int64')
+    segundos_dia = ts % SEGUNDOS_DIA
+    hora = (segundos_dia // 3600).astype('int8')
+
+    return {
+        'datetime': ts.astype('datetime64[s]').astype('datetime64[ns]'),
+        'data': (ts - segundos_dia).astype('datetime64[s]').astype('datetime64[ns]'),
+        'hora_int': hora,
+        'faixa_horaria': np.asarray(rotulos_faixa, dtype=object)[hora],
+    }
+
+
+def rotulos_status(estado):
+    """Rótulo do status para cada código de estado (ver codigos_estado)"""
+    return ROTULOS_STATUS[np.asarray(estado, dtype='int8') + 1]
+
+
+def inicio_do_periodo(datas, resolucao):
+    """Início do período ('dia', 'semana' a partir de segunda-feira ou 'mes') de cada data, em datetime64[D]"""
+    dias = np.asarray(datas).astype('datetime64[D]')
+    if resolucao == 'semana':
+        # 1970-01-01 foi uma quinta-feira: +3 faz a segunda-feira ter resto 0
+        return dias - (dias.astype('int64') + 3) % 7
+    if resolucao == 'mes':
+        return dias.astype('datetime64[M]').astype('datetime64[D]')
+    return dias
+
+
+def escolher_resolucao(inicio, fim, series, pontos_maximos):
+    """Resolução mais fina em que períodos x séries entre inicio e fim cabem em pontos_maximos
+
+    Sem nenhuma que caiba, retorna a mais grossa ('mes').
+    """
+    for resolucao in RESOLUCOES_DATA:
+        primeiro, ultimo = inicio_do_periodo([inicio, fim], resolucao)
+        if resolucao == 'mes':
+            periodos = int(ultimo.astype('datetime64[M]').astype('int64') - primeiro.astype('datetime64[M]').astype('int64')) + 1
+        else:
+            periodos = int((ultimo - primeiro).astype('int64')) // (7 if resolucao == 'semana' else 1) + 1
+        if periodos * max(series, 1) <= pontos_maximos:
+            return resolucao
+    return RESOLUCOES_DATA[-1]
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class PoolConexoes:
+    """Conexões SQLite abertas uma vez e reaproveitadas entre requisições e threads
+
+    Cada uso retira uma conexão ociosa do banco pedido (ou abre uma nova) e a
+    devolve ao final, sem transação aberta: uma conexão nunca é usada por duas
+    threads ao mesmo tempo. Reaproveitar a conexão evita abrir o arquivo e
+    aplicar os PRAGMAs a cada consulta e mantém o cache de páginas e o de
+    statements preparados do sqlite3 entre requisições. Além de maximo_ociosas
+    conexões ociosas por banco, as devolvidas são fechadas. Um processo filho
+    (fork) não reaproveita as conexões herdadas.
+    """
+
+    def __init__(self, timeout=30, pragmas=(), maximo_ociosas=16, statements=256):
+        self.timeout = timeout
+        self.pragmas = list(pragmas)
+        self.maximo_ociosas = maximo_ociosas
+        self.statements = statements
+        self._ociosas = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._contadores = {'abertas': 0, 'reaproveitadas': 0}
+
+    def _abrir(self, caminho):
+        conn = sqlite3.connect(
+            caminho, timeout=self.timeout, check_same_thread=False, cached_statements=self.statements
+        )
+        for pragma in self.pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        return conn
+
+    def _retirar(self, caminho):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._ociosas = {}
+                self._pid = os.getpid()
+
+            ociosas = self._ociosas.get(caminho)
+            if ociosas:
+                self._contadores['reaproveitadas'] += 1
+                # A mais recente primeiro: é a que tem o cache mais quente
+                return ociosas.pop()
+            self._contadores['abertas'] += 1
+
+        return self._abrir(caminho)
+
+    def _devolver(self, caminho, conn):
+        try:
+            # Transação deixada aberta (erro no meio de uma escrita) não passa ao próximo uso
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+
+        with self._lock:
+            ociosas = self._ociosas.setdefault(caminho, [])
+            if self._pid == os.getpid() and len(ociosas) < self.maximo_ociosas:
+                ociosas.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def conexao(self, caminho):
+        """Context manager com uma conexão exclusiva para o banco em caminho"""
+        conn = self._retirar(caminho)
+        try:
+            yield conn
+        finally:
+            self._devolver(caminho, conn)
+
+    def estatisticas(self):
+        """Conexões abertas, reaproveitadas e ociosas no momento"""
+        with self._lock:
+            ociosas = sum(len(conexoes) for conexoes in self._ociosas.values())
+            return {**self._contadores, 'ociosas': ociosas}
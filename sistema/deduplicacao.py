@@ -0,0 +1,235 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+# Colunas que identificam uma chamada repetida: o hash de 64 bits do conteúdo
+# (coluna hash_conteudo, com índice único) substitui a antiga UNIQUE das sete
+COLUNAS_CONTEUDO = ['data', 'hora', 'duracao', 'fila', 'teleatendente', 'estado', 'cob']
+
+# Tabela chamadas ({tabela}: o nome muda apenas durante a migração)
+SQL_TABELA_CHAMADAS = '''
+    CREATE TABLE IF NOT EXISTS {tabela} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL,
+        hora TEXT NOT NULL,
+        duracao REAL,
+        fila TEXT,
+        teleatendente TEXT,
+        estado INTEGER,
+        cob INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ts INTEGER,
+        hash_conteudo INTEGER NOT NULL UNIQUE
+    )
+'''
+
+# Hashes alternativos (sal 1, 2, ...) tentados para uma chamada cujo hash já é de outra
+MAXIMO_SONDAGENS = 16
+
+# Comparação do conteúdo de duas chamadas (c e l), com nulos iguais entre si
+SQL_MESMO_CONTEUDO = ' AND '.join(f'c.{coluna} IS l.{coluna}' for coluna in COLUNAS_CONTEUDO)
+
+# Bits altos do hash com o dia da chamada (dias desde 1970): chamadas do mesmo
+# período ficam vizinhas no índice único e a ingestão em ordem de data escreve
+# em poucas páginas dele, em vez de espalhar as escritas por todo o índice
+BITS_DIA = 15
+BITS_CONTEUDO = 48
+
+_SEMENTE = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _misturar(h):
+    """Finalizador do splitmix64 sobre arrays uint64 (aritmética módulo 2**64)"""
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def _hash_distintos(textos):
+    """Hash de cada texto pelo comprimento e pelos pontos de código (UTF-32), dois por vez
+
+    Os textos são completados com zeros até o maior do lote, mas cada um só
+    mistura as palavras dentro do seu comprimento: o hash de um texto não
+    depende dos demais textos do lote.
+    """
+    pontos = textos.astype('U')
+    largura = max(2, pontos.dtype.itemsize // 4)
+    pontos = pontos.astype(f'U{largura + largura % 2}')
+    palavras = pontos.view('uint64').reshape(len(pontos), -1)
+    comprimentos = np.strings.str_len(pontos)
+
+    h = _misturar(comprimentos.astype('uint64') + _SEMENTE)
+    for coluna in range(palavras.shape[1]):
+        dentro = comprimentos > 2 * coluna
+        if not dentro.any():
+            break
+        h = np.where(dentro, _misturar(h ^ palavras[:, coluna]), h)
+    return h
+
+
+def _hash_textos(valores):
+    """Hash de cada texto (nulo conta como vazio), calculado uma vez por valor distinto"""
+    codigos, distintos = pd.factorize(np.asarray(valores, dtype=object), use_na_sentinel=False)
+    distintos = np.asarray(distintos, dtype=object)
+    distintos[pd.isna(distintos)] = ''
+    return _hash_distintos(distintos)[codigos]
+
+
+def _numeros(valores, dtype):
+    """Valores numéricos da coluna no tipo indicado (nulo ou inválido conta como zero)"""
+    try:
+        numeros = np.asarray(valores, dtype='float64')
+    except (TypeError, ValueError):
+        numeros = pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').to_numpy('float64')
+    # + 0 normaliza -0.0, que é igual a 0.0 no banco
+    return np.nan_to_num(numeros, nan=0.0).astype(dtype) + 0
+
+
+def _dias(datas):
+    """Dia de cada data (texto AAAA-MM-DD) desde 1970, limitado a BITS_DIA bits (inválida conta como zero)"""
+    codigos, distintos = pd.factorize(np.asarray(datas, dtype=object), use_na_sentinel=False)
+    dias = pd.to_datetime(pd.Series(distintos, dtype=object), format='%Y-%m-%d', errors='coerce')
+    dias = (dias - pd.Timestamp(0)).dt.days.fillna(0).to_numpy('int64')
+    return np.clip(dias, 0, (1 << BITS_DIA) - 1).astype('uint64')[codigos]
+
+
+def hashes_conteudo(colunas, sal=0):
+    """Hash de 64 bits (int64) do conteúdo de cada chamada
+
+    colunas traz os valores de COLUNAS_CONTEUDO, uma sequência por coluna.
+    Textos entram pelos pontos de código e números pelos bits (duração em
+    float64, estado e COB em int64), combinados na ordem das colunas pelo
+    splitmix64: o resultado não depende da versão do Python, do numpy ou do
+    pandas e pode ser gravado. Os BITS_CONTEUDO bits baixos vêm do conteúdo e
+    os de cima, do dia da chamada. Nulos contam como texto vazio ou zero (o
+    conteúdo é conferido à parte). sal gera os hashes alternativos das colisões.
+    """
+    data, hora, duracao, fila, teleatendente, estado, cob = colunas
+
+    with np.errstate(over='ignore'):
+        h = _misturar(np.full(len(data), _SEMENTE + np.uint64(sal), dtype='uint64'))
+        for valores in (_hash_textos(data), _hash_textos(hora), _numeros(duracao, 'float64').view('uint64'),
+                        _hash_textos(fila), _hash_textos(teleatendente),
+                        _numeros(estado, 'int64').view('uint64'), _numeros(cob, 'int64').view('uint64')):
+            h = _misturar(h ^ valores)
+    h = (_dias(data) << np.uint64(BITS_CONTEUDO)) | (h & np.uint64((1 << BITS_CONTEUDO) - 1))
+    return h.view('int64')
+
+
+def hash_registro(registro, sal=0):
+    """Hash de uma chamada (tupla na ordem de COLUNAS_CONTEUDO)"""
+    return int(hashes_conteudo([[valor] for valor in registro[:len(COLUNAS_CONTEUDO)]], sal)[0])
+
+
+def _sondar(conn, tabela, registro, aceitar_igual):
+    """Primeiro hash alternativo de registro livre em tabela (None se já está lá com o mesmo conteúdo)"""
+    for sal in range(1, MAXIMO_SONDAGENS + 1):
+        hash_alternativo = hash_registro(registro, sal)
+        existente = conn.execute(
+            f"SELECT {', '.join(COLUNAS_CONTEUDO)} FROM {tabela} WHERE hash_conteudo = ?", (hash_alternativo,)
+        ).fetchone()
+        if existente is None:
+            return hash_alternativo
+        if not aceitar_igual and existente == tuple(registro[:len(COLUNAS_CONTEUDO)]):
+            return None
+    raise RuntimeError(f"Nenhum hash livre após {MAXIMO_SONDAGENS} tentativas para {registro}")
+
+
+def inserir_colisoes(conn, lote, sql_inserir):
+    """Insere as chamadas do lote recusadas porque o hash delas já é de outra chamada
+
+    lote são as tuplas (COLUNAS_CONTEUDO + hash) já passadas a sql_inserir, um
+    INSERT OR IGNORE: as recusadas por serem repetidas continuam de fora. A
+    conferência compara o conteúdo das chamadas com o mesmo hash, no banco,
+    e só roda quando alguma linha do lote foi recusada. Cada colisão é gravada
+    no primeiro hash alternativo livre, a não ser que a mesma chamada já
+    esteja em um deles. Retorna o número de chamadas inseridas.
+    """
+    conn.execute(f'''
+        CREATE TEMP TABLE IF NOT EXISTS lote_conferencia ({', '.join(COLUNAS_CONTEUDO)}, hash_conteudo)
+    ''')
+    conn.execute("DELETE FROM lote_conferencia")
+    conn.executemany(
+        f"INSERT INTO lote_conferencia VALUES ({', '.join('?' * (len(COLUNAS_CONTEUDO) + 1))})", lote
+    )
+    colisoes = conn.execute(f'''
+        SELECT DISTINCT {', '.join('l.' + coluna for coluna in COLUNAS_CONTEUDO)}
+        FROM lote_conferencia l JOIN chamadas c ON c.hash_conteudo = l.hash_conteudo
+        WHERE NOT ({SQL_MESMO_CONTEUDO})
+    ''').fetchall()
+    conn.execute("DELETE FROM lote_conferencia")
+
+    inseridas = 0
+    for registro in colisoes:
+        hash_alternativo = _sondar(conn, 'chamadas', registro, aceitar_igual=False)
+        if hash_alternativo is not None:
+            print(f"⚠️ Colisão de hash do conteúdo; chamada gravada com hash alternativo: {registro}")
+            conn.execute(sql_inserir, (*registro, hash_alternativo))
+            inseridas += 1
+    return inseridas
+
+
+def migrar_para_hash(conn, tamanho_bloco=200000):
+    """Reconstrói a tabela chamadas de bancos anteriores, com hash_conteudo no lugar da UNIQUE das sete colunas
+
+    As chamadas são copiadas em ordem de id, com os mesmos ids (agregados,
+    marcas do modo ao vivo e snapshot continuam valendo), e todas são mantidas:
+    a UNIQUE antiga aceitava repetições com nulos, que recebem um hash
+    alternativo. Os índices da tabela antiga somem com ela e são recriados por
+    quem chama; ao final, o VACUUM devolve ao disco o espaço da tabela antiga.
+    Retorna o número de chamadas copiadas.
+    """
+    colunas = ['id'] + COLUNAS_CONTEUDO + ['created_at', 'ts']
+    sql_copiar = f'''
+        INSERT OR IGNORE INTO chamadas_hash ({', '.join(colunas)}, hash_conteudo)
+        VALUES ({', '.join('?' * (len(colunas) + 1))})
+    '''
+
+    # Confere de novo com a escrita travada: outro processo pode ter migrado antes
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    if 'hash_conteudo' in [linha[1] for linha in conn.execute("PRAGMA table_info(chamadas)")]:
+        conn.rollback()
+        return 0
+
+    print("🔧 Migrando a tabela chamadas para a deduplicação por hash do conteúdo...")
+    conn.execute(SQL_TABELA_CHAMADAS.format(tabela='chamadas_hash'))
+
+    ultimo_id, copiadas = 0, 0
+    while True:
+        linhas = conn.execute(f'''
+            SELECT {', '.join(colunas)} FROM chamadas WHERE id > ? ORDER BY id LIMIT ?
+        ''', (ultimo_id, tamanho_bloco)).fetchall()
+        if not linhas:
+            break
+
+        conteudo = list(zip(*(linha[1:1 + len(COLUNAS_CONTEUDO)] for linha in linhas)))
+        hashes = hashes_conteudo(conteudo).tolist()
+        alteracoes_antes = conn.total_changes
+        conn.executemany(sql_copiar, [(*linha, hash_) for linha, hash_ in zip(linhas, hashes)])
+
+        if conn.total_changes - alteracoes_antes < len(linhas):
+            # Hash já usado no bloco ou antes dele: repetição com nulos (ou colisão)
+            copiados = {id_ for (id_,) in conn.execute(
+                "SELECT id FROM chamadas_hash WHERE id BETWEEN ? AND ?", (linhas[0][0], linhas[-1][0])
+            )}
+            for linha in linhas:
+                if linha[0] not in copiados:
+                    hash_alternativo = _sondar(conn, 'chamadas_hash', linha[1:], aceitar_igual=True)
+                    conn.execute(sql_copiar, (*linha, hash_alternativo))
+
+        ultimo_id = linhas[-1][0]
+        copiadas += len(linhas)
+        print(f"🔧 {copiadas:,} chamadas migradas")
+
+    conn.execute("DROP TABLE chamadas")
+    conn.execute("ALTER TABLE chamadas_hash RENAME TO chamadas")
+    conn.commit()
+    try:
+        conn.execute("VACUUM")
+    except sqlite3.Error as e:
+        # A migração já está gravada; só o espaço da tabela antiga fica para depois
+        print(f"⚠️ VACUUM após a migração não concluído: {e}")
+    return copiadas
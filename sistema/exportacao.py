@@ -0,0 +1,80 @@
+import csv
+import io
+import tempfile
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    # Sem o openpyxl apenas a exportação em CSV fica disponível
+    Workbook = None
+
+XLSX_DISPONIVEL = Workbook is not None
+
+# Linhas de dados por planilha: o limite do Excel menos o cabeçalho
+LINHAS_POR_PLANILHA = 1048575
+
+
+def ler_em_blocos(abrir_conexao, sql, params, tamanho_bloco):
+    """Percorre o resultado da consulta com um cursor, tamanho_bloco linhas por vez
+
+    A conexão fica retirada até o fim da leitura (ou até o gerador ser
+    fechado, quando o cliente desiste do download).
+    """
+    with abrir_conexao() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            linhas = cursor.fetchmany(tamanho_bloco)
+            if not linhas:
+                return
+            yield linhas
+
+
+def gerar_csv(blocos, colunas):
+    """Pedaços de bytes do CSV (UTF-8): o cabeçalho e depois um pedaço por bloco de linhas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+
+    def esvaziar():
+        conteudo = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return conteudo
+
+    escritor.writerow(colunas)
+    yield esvaziar()
+    for linhas in blocos:
+        escritor.writerows(linhas)
+        yield esvaziar()
+
+
+def gerar_xlsx(blocos, colunas, tamanho_pedaco=2**20):
+    """Pedaços de bytes do XLSX, montado em um arquivo temporário
+
+    O openpyxl em modo write_only grava as linhas em disco conforme chegam, e
+    cada LINHAS_POR_PLANILHA linhas abrem uma nova planilha. O XLSX é um zip
+    que só fica válido ao final, então o envio começa depois da última linha.
+    """
+    with tempfile.TemporaryFile() as arquivo:
+        pasta = Workbook(write_only=True)
+        planilha, linhas_planilha = None, LINHAS_POR_PLANILHA
+
+        for linhas in blocos:
+            for linha in linhas:
+                if linhas_planilha == LINHAS_POR_PLANILHA:
+                    numero = len(pasta.worksheets) + 1
+                    planilha = pasta.create_sheet('Chamadas' if numero == 1 else f'Chamadas {numero}')
+                    planilha.append(colunas)
+                    linhas_planilha = 0
+                planilha.append(linha)
+                linhas_planilha += 1
+
+        if planilha is None:
+            pasta.create_sheet('Chamadas').append(colunas)
+
+        pasta.save(arquivo)
+        arquivo.seek(0)
+        while True:
+            pedaco = arquivo.read(tamanho_pedaco)
+            if not pedaco:
+                return
+            yield pedaco
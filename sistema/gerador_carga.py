@@ -0,0 +1,164 @@
+"""Gerador de carga para a API de ingestão (POST /api/chamadas)
+
+Gera chamadas sintéticas com gerar_csv e as envia em lotes, por várias
+conexões em paralelo, reenviando os lotes recusados com 429 após o Retry-After.
+Ao final, aguarda o servidor gravar o que ficou no buffer e informa as
+chamadas por segundo aceitas pela API e efetivamente gravadas. Com vários
+workers, cada um tem o seu buffer: o status é somado entre os workers vistos.
+
+    python gerador_carga.py --chamadas 200000 --lote 1000 --conexoes 4
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import gerar_csv
+
+FORMATOS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def gerar_lotes(chamadas, tamanho_lote, formato, inicio, semente):
+    """Gera as chamadas dia a dia e as serializa em lotes de tamanho_lote"""
+    por_dia = max(1, min(chamadas, 50000))
+    dias = -(-chamadas // por_dia)
+    blocos = gerar_csv.gerar_chamadas(
+        inicio=inicio, dias=dias, chamadas_dia=(por_dia, por_dia),
+        chamadas_fim_semana=(por_dia, por_dia), semente=semente
+    )
+
+    restantes = chamadas
+    for bloco in blocos:
+        bloco = bloco.iloc[:restantes]
+        restantes -= len(bloco)
+        for inicio_lote in range(0, len(bloco), tamanho_lote):
+            lote = bloco.iloc[inicio_lote:inicio_lote + tamanho_lote]
+            if formato == 'csv':
+                corpo = lote.to_csv(index=False)
+            else:
+                corpo = lote.to_json(orient='records', lines=True, force_ascii=False)
+            yield len(lote), corpo.encode('utf-8')
+
+
+class Cliente:
+    """Uma conexão HTTP persistente por thread"""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.porta = partes.port or 80
+        self.caminho = partes.path
+        self._local = threading.local()
+
+    def _conexao(self):
+        if getattr(self._local, 'conexao', None) is None:
+            self._local.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=60)
+        return self._local.conexao
+
+    def requisitar(self, metodo, caminho, corpo=None, cabecalhos=None):
+        """Retorna (status, cabeçalhos, corpo); reabre a conexão se o servidor a fechou"""
+        for tentativa in range(2):
+            conexao = self._conexao()
+            try:
+                conexao.request(metodo, caminho, body=corpo, headers=cabecalhos or {})
+                resposta = conexao.getresponse()
+                return resposta.status, resposta.headers, resposta.read()
+            except (ConnectionError, http.client.HTTPException):
+                conexao.close()
+                self._local.conexao = None
+                if tentativa:
+                    raise
+
+    def enviar(self, corpo, tipo):
+        """Envia um lote até ser aceito; retorna quantas vezes foi recusado (429 ou 503)"""
+        recusas = 0
+        while True:
+            status, cabecalhos, conteudo = self.requisitar(
+                'POST', self.caminho, corpo, {'Content-Type': tipo}
+            )
+            if status == 202:
+                return recusas
+            if status in (429, 503):
+                recusas += 1
+                time.sleep(float(cabecalhos.get('Retry-After', 1)))
+                continue
+            raise RuntimeError(f'HTTP {status}: {conteudo[:200]!r}')
+
+    def status(self):
+        """Status do buffer de um worker, por uma conexão nova (que pode cair em outro worker)"""
+        conexao = http.client.HTTPConnection(self.host, self.porta, timeout=60)
+        try:
+            conexao.request('GET', f'{self.caminho}/status')
+            return json.loads(conexao.getresponse().read())
+        finally:
+            conexao.close()
+
+
+def coletar_status(cliente, por_worker, consultas):
+    """Atualiza por_worker (pid -> último status) com novas consultas ao status"""
+    for _ in range(consultas):
+        status = cliente.status()
+        por_worker[status['processo']] = status
+    return por_worker
+
+
+def somar(por_worker, contador):
+    return sum(status[contador] for status in por_worker.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gerador de carga para a API de ingestão')
+    parser.add_argument('--url', default='http://127.0.0.1:8050/api/chamadas')
+    parser.add_argument('--chamadas', type=int, default=100000)
+    parser.add_argument('--lote', type=int, default=1000, help='Chamadas por requisição')
+    parser.add_argument('--conexoes', type=int, default=4)
+    parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+    parser.add_argument('--inicio', default=datetime.now().strftime('%Y-%m-%d'), help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    cliente = Cliente(args.url)
+    tipo = FORMATOS[args.formato]
+    # Várias consultas para conhecer os workers; os não vistos começam em zero
+    inicial = coletar_status(cliente, {}, 4 * args.conexoes)
+
+    # Lotes serializados antes do envio: o tempo medido é só o do servidor
+    lotes = list(gerar_lotes(
+        args.chamadas, args.lote, args.formato, datetime.strptime(args.inicio, '%Y-%m-%d'), args.semente
+    ))
+    total = sum(quantidade for quantidade, _ in lotes)
+    print(f"📦 {total} chamadas em {len(lotes)} lotes de até {args.lote} ({args.formato})")
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.conexoes) as executor:
+        recusas = sum(executor.map(lambda lote: cliente.enviar(lote[1], tipo), lotes))
+    envio = time.perf_counter() - inicio
+
+    # Aguarda o servidor gravar tudo o que aceitou
+    final = dict(inicial)
+    while True:
+        coletar_status(cliente, final, 1)
+        concluidas = [somar(final, contador) - somar(inicial, contador) for contador in ('gravadas', 'falhas', 'perdidas')]
+        if sum(concluidas) >= total:
+            break
+        time.sleep(0.05)
+    gravacao = time.perf_counter() - inicio
+
+    def diferenca(contador):
+        return somar(final, contador) - somar(inicial, contador)
+
+    print(f"🚀 Aceitas {total / envio:,.0f} chamadas/s ({envio:.2f}s, {recusas} recusas 429/503)")
+    print(f"💾 Gravadas {total / gravacao:,.0f} chamadas/s ({gravacao:.2f}s, {len(final)} workers, "
+          f"{diferenca('inseridas')} novas no banco, {diferenca('lotes')} micro-lotes, {diferenca('falhas')} falhas salvas em CSV, "
+          f"{diferenca('perdidas')} perdidas)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
+import argparse
 import csv
-import random
 from datetime import datetime, timedelta
 
-random.seed(42)
+import numpy as np
+import pandas as pd
 
 cobs = [11, 21, 22, 31, 32, 4, 51, 52, 61]
 filas = ['Emergência 193', 'Atendimento Geral', 'Resgate', 'Incêndio', 'Defesa Civil', 'Salvamento', 'Informações']
@@ -19,57 +20,126 @@ atendentes_por_cob = {
     61: ['André Campos', 'Bianca Duarte', 'Cláudio Ramos', 'Diana Fonseca']
 }
 
-rows = []
-start_date = datetime(2026, 1, 1)
-end_date = datetime(2026, 2, 28)
-current = start_date
-
-while current <= end_date:
-    is_weekday = current.weekday() < 5
-    base_calls = random.randint(80, 150) if is_weekday else random.randint(40, 90)
-
-    for _ in range(base_calls):
-        cob = random.choice(cobs)
-        hour_weights = [1, 1, 1, 1, 1, 1, 3, 5, 8, 10, 10, 9, 8, 7, 8, 9, 8, 6, 4, 3, 2, 2, 1, 1]
-        hour = random.choices(range(24), weights=hour_weights, k=1)[0]
-        minute = random.randint(0, 59)
-        second = random.randint(0, 59)
-        hora = f'{hour:02d}:{minute:02d}:{second:02d}'
-
-        estado = 1 if random.random() < 0.70 else 0
-
-        if estado == 1:
-            duracao = random.choice([
-                random.randint(10, 60),
-                random.randint(60, 300),
-                random.randint(300, 900),
-                random.randint(900, 1800)
-            ])
-        else:
-            duracao = random.randint(0, 15)
-
-        fila = random.choice(filas)
-        teleatendente = random.choice(atendentes_por_cob[cob]) if estado == 1 else ''
-
-        rows.append({
-            'data': current.strftime('%Y-%m-%d'),
-            'hora': hora,
+# Curvas de carga: peso relativo de cada hora do dia
+curvas_horarias = {
+    'padrao': [1, 1, 1, 1, 1, 1, 3, 5, 8, 10, 10, 9, 8, 7, 8, 9, 8, 6, 4, 3, 2, 2, 1, 1],
+    'plana': [1] * 24,
+    'noturna': [6, 6, 5, 4, 3, 2, 2, 2, 3, 3, 3, 3, 3, 3, 3, 3, 3, 4, 5, 6, 7, 8, 8, 7],
+}
+
+# Perfis de atendimento: probabilidade de a ligação ser atendida em cada hora
+perfis_atendimento = {
+    'padrao': [0.70] * 24,
+    'alto': [0.90] * 24,
+    # Fila congestionada nos horários de pico
+    'sobrecarga': [0.80] * 7 + [0.60, 0.50, 0.40, 0.40, 0.45, 0.50, 0.55, 0.50, 0.45, 0.50, 0.60] + [0.75] * 6,
+}
+
+# Faixas de duração (s) das ligações atendidas, sorteadas com igual chance
+faixas_duracao = [(10, 60), (60, 300), (300, 900), (900, 1800)]
+
+colunas = ['data', 'hora', 'duracao', 'fila', 'teleatendente', 'estado', 'cob']
+
+# 'HH:MM:SS' de cada segundo do dia
+_horas_texto = np.array(
+    [f'{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}' for s in range(86400)], dtype=object
+)
+
+
+def lista_cobs(quantidade):
+    """Os COBs reais e, além deles, códigos sintéticos (100, 101, ...)"""
+    return (cobs + list(range(100, 100 + max(0, quantidade - len(cobs)))))[:quantidade]
+
+
+def atendentes(cob):
+    return atendentes_por_cob.get(cob, [f'Atendente {cob}-{i}' for i in range(1, 5)])
+
+
+def gerar_chamadas(inicio=datetime(2026, 1, 1), dias=59, quantidade_cobs=len(cobs),
+                   chamadas_dia=(80, 150), chamadas_fim_semana=(40, 90),
+                   curva='padrao', perfil='padrao', semente=42):
+    """Gera as chamadas dia a dia, um DataFrame por dia, com memória limitada ao dia"""
+    rng = np.random.default_rng(semente)
+    cobs_gerados = np.array(lista_cobs(quantidade_cobs))
+    pesos = np.array(curvas_horarias[curva], dtype=float)
+    pesos /= pesos.sum()
+    taxa_por_hora = np.array(perfis_atendimento[perfil])
+
+    # Atendentes de todos os COBs em um único array, com deslocamento por COB
+    nomes = [atendentes(int(cob)) for cob in cobs_gerados]
+    todos_atendentes = np.array([nome for lista in nomes for nome in lista] + [''], dtype=object)
+    deslocamento = np.cumsum([0] + [len(lista) for lista in nomes[:-1]])
+    quantidade_atendentes = np.array([len(lista) for lista in nomes])
+    filas_array = np.array(filas, dtype=object)
+    faixas = np.array(faixas_duracao)
+
+    for dia in range(dias):
+        atual = inicio + timedelta(days=dia)
+        minimo, maximo = chamadas_dia if atual.weekday() < 5 else chamadas_fim_semana
+        n = int(rng.integers(minimo, maximo + 1))
+
+        indice_cob = rng.integers(0, len(cobs_gerados), n)
+        hora = rng.choice(24, size=n, p=pesos)
+        segundos = hora * 3600 + rng.integers(0, 3600, n)
+        atendida = rng.random(n) < taxa_por_hora[hora]
+
+        faixa = faixas[rng.integers(0, len(faixas), n)]
+        duracao = np.where(
+            atendida,
+            rng.integers(faixa[:, 0], faixa[:, 1] + 1),
+            rng.integers(0, 16, n)
+        )
+
+        atendente = deslocamento[indice_cob] + (rng.random(n) * quantidade_atendentes[indice_cob]).astype(int)
+        atendente = np.where(atendida, atendente, len(todos_atendentes) - 1)
+
+        yield pd.DataFrame({
+            'data': atual.strftime('%Y-%m-%d'),
+            'hora': _horas_texto[segundos],
             'duracao': duracao,
-            'fila': fila,
-            'teleatendente': teleatendente,
-            'estado': estado,
-            'cob': cob
-        })
+            'fila': filas_array[rng.integers(0, len(filas_array), n)],
+            'teleatendente': todos_atendentes[atendente],
+            'estado': atendida.astype(int),
+            'cob': cobs_gerados[indice_cob],
+        }, columns=colunas)
+
+
+def escrever_csv(caminho, blocos):
+    """Escreve os blocos de chamadas no CSV; retorna o total de registros"""
+    total = 0
+    with open(caminho, 'w', newline='') as f:
+        csv.writer(f).writerow(colunas)
+        for bloco in blocos:
+            bloco.to_csv(f, header=False, index=False)
+            total += len(bloco)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera um CSV sintético de chamadas')
+    parser.add_argument('--saida', default='data/geral_df.csv')
+    parser.add_argument('--inicio', default='2026-01-01', help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('--dias', type=int, default=59)
+    parser.add_argument('--cobs', type=int, default=len(cobs), help='Quantidade de COBs')
+    parser.add_argument('--chamadas-dia', type=int, nargs=2, default=(80, 150), metavar=('MIN', 'MAX'))
+    parser.add_argument('--chamadas-fim-semana', type=int, nargs=2, default=(40, 90), metavar=('MIN', 'MAX'))
+    parser.add_argument('--curva', choices=sorted(curvas_horarias), default='padrao')
+    parser.add_argument('--perfil', choices=sorted(perfis_atendimento), default='padrao')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
 
-    current += timedelta(days=1)
+    inicio = datetime.strptime(args.inicio, '%Y-%m-%d')
+    total = escrever_csv(args.saida, gerar_chamadas(
+        inicio=inicio, dias=args.dias, quantidade_cobs=args.cobs,
+        chamadas_dia=tuple(args.chamadas_dia), chamadas_fim_semana=tuple(args.chamadas_fim_semana),
+        curva=args.curva, perfil=args.perfil, semente=args.semente
+    ))
 
-random.shuffle(rows)
+    fim = inicio + timedelta(days=args.dias - 1)
+    print(f'CSV gerado com {total} registros')
+    print(f'Período: {inicio.strftime("%Y-%m-%d")} a {fim.strftime("%Y-%m-%d")}')
+    print(f'COBs: {sorted(lista_cobs(args.cobs))}')
 
-with open('data/geral_df.csv', 'w', newline='') as f:
-    writer = csv.DictWriter(f, fieldnames=['data', 'hora', 'duracao', 'fila', 'teleatendente', 'estado', 'cob'])
-    writer.writeheader()
-    writer.writerows(rows)
 
-print(f'CSV gerado com {len(rows)} registros')
-print(f'Período: {start_date.strftime("%Y-%m-%d")} a {end_date.strftime("%Y-%m-%d")}')
-print(f'COBs: {sorted(set(r["cob"] for r in rows))}')
+if __name__ == '__main__':
+    main()
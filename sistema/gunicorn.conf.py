@@ -0,0 +1,32 @@
+# Configuração do gunicorn para produção: gunicorn -c gunicorn.conf.py app:server
+import os
+
+# Os workers mapeiam o mesmo snapshot em disco (memória compartilhada pelo cache
+# de páginas do sistema). Com qualquer fonte, apenas um deles (eleito pela trava
+# de ingestão) prepara o banco, carrega o CSV, monitora os CSVs e grava o snapshot
+os.environ.setdefault('FONTE_CONSULTA', 'snapshot')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8050)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Cada worker importa o app depois do fork: o monitor de CSV e a trava de
+# ingestão não podem ser herdados do processo mestre
+preload_app = False
+
+# A carga inicial roda em segundo plano (CARGA_EM_SEGUNDO_PLANO) e a importação do
+# worker é rápida; com CARGA_EM_SEGUNDO_PLANO=0, aumente o timeout para cobrir a carga
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Cobre a gravação do buffer da API ao encerrar o worker (INGEST_API_PARADA_S, ver worker_exit)
+graceful_timeout = max(30, int(os.environ.get('INGEST_API_PARADA_S', 20)) + 10)
+
+accesslog = '-'
+
+
+def worker_exit(server, worker):
+    """Grava as chamadas que a API já aceitou e ainda estão no buffer antes de o worker sair"""
+    import sys
+
+    app = sys.modules.get('app')
+    if app is not None:
+        app.buffer_ingestao.parar(timeout=app.INGEST_API_PARADA_S)
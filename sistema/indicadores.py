@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+
+def _metricas(total, atendidas, nao_atendidas, tempo_falado):
+    """Monta o dicionário de indicadores a partir das somas de um grupo"""
+    total = int(total)
+    atendidas = int(atendidas)
+    return {
+        'total': total,
+        'atendidas': atendidas,
+        'nao_atendidas': int(nao_atendidas),
+        'taxa_atendimento': atendidas / total * 100 if total else 0.0,
+        'duracao_media': float(tempo_falado) / atendidas if atendidas else 0.0,
+        'tempo_falado': float(tempo_falado) if atendidas else 0.0,
+    }
+
+
+def resumir_chamadas(dff):
+    """Indicadores gerais e por COB da janela, em uma única passada agregada
+
+    dff traz uma linha por chamada ou por agregado, com as colunas cob,
+    cob_nome, estado, quantidade e duracao_total. Cada linha cai na célula
+    (COB, estado) de uma matriz, somada com bincount sobre a chave combinada;
+    os indicadores gerais são a soma das linhas da matriz. O retorno contém
+    apenas tipos nativos (pronto para JSON):
+
+        {'geral': {...}, 'por_cob': [{'cob': 11, 'cob_nome': '...', ...}, ...]}
+
+    com total, atendidas, nao_atendidas, taxa_atendimento (%),
+    duracao_media e tempo_falado (s, apenas das atendidas) em cada item.
+    """
+    if dff.empty:
+        return {'geral': _metricas(0, 0, 0, 0), 'por_cob': []}
+
+    codigos, cobs = pd.factorize(dff['cob'], use_na_sentinel=False)
+    estado = dff['estado'].fillna(-1).to_numpy(dtype='int64')
+    # Coluna da matriz: 0 = outros estados, 1 = não atendida, 2 = atendida
+    coluna_estado = np.where(np.isin(estado, (0, 1)), estado + 1, 0)
+
+    chave = codigos * 3 + coluna_estado
+    tamanho = len(cobs) * 3
+    quantidade = np.bincount(chave, weights=dff['quantidade'].to_numpy(dtype='float64'), minlength=tamanho)
+    duracao = np.bincount(chave, weights=dff['duracao_total'].to_numpy(dtype='float64'), minlength=tamanho)
+    quantidade = quantidade.reshape(-1, 3)
+    duracao = duracao.reshape(-1, 3)
+
+    # Uma linha qualquer de cada COB basta: o nome é função do código
+    linhas_cob = np.empty(len(cobs), dtype='int64')
+    linhas_cob[codigos] = np.arange(len(codigos))
+    nomes = dff['cob_nome'].to_numpy()[linhas_cob]
+
+    return _montar_resumo(cobs, nomes, quantidade.sum(axis=1), quantidade[:, 2], quantidade[:, 1], duracao[:, 2])
+
+
+def _montar_resumo(cobs, nomes, total, atendidas, nao_atendidas, tempo_falado):
+    """Resumo (geral e por COB, em ordem de nome) a partir das somas de cada COB"""
+    geral = _metricas(total.sum(), atendidas.sum(), nao_atendidas.sum(), tempo_falado.sum())
+
+    por_cob = []
+    for codigo, cob in enumerate(cobs):
+        nome = nomes[codigo]
+        # COBs sem nome entram apenas nos indicadores gerais
+        if pd.isna(nome):
+            continue
+        por_cob.append({
+            'cob': int(cob),
+            'cob_nome': nome,
+            **_metricas(total[codigo], atendidas[codigo], nao_atendidas[codigo], tempo_falado[codigo]),
+        })
+
+    por_cob.sort(key=lambda item: item['cob_nome'])
+    return {'geral': geral, 'por_cob': por_cob}
+
+
+def resumir_armazem(armazem, ts_ini, ts_fim, cobs=None):
+    """Mesmo resultado de resumir_chamadas para a janela do armazém, pelas somas acumuladas por minuto
+
+    Não decodifica as chamadas: o custo depende do número de COBs e das
+    chamadas nas bordas da janela que não completam um minuto.
+    """
+    codigos, somas = armazem.somas_janela(ts_ini, ts_fim, cobs)
+    # Como em resumir_chamadas, apenas os COBs com chamadas na janela
+    com_chamadas = somas[0] > 0
+    codigos, (total, atendidas, nao_atendidas, tempo_falado) = codigos[com_chamadas], somas[:, com_chamadas]
+    return _montar_resumo(armazem.cobs[codigos], armazem.cob_nomes[codigos], total, atendidas, nao_atendidas, tempo_falado)
+
+
+def combinar_resumos(resumo, outro):
+    """Soma dois resumos de resumir_chamadas (por exemplo, a janela e as chamadas novas)"""
+    def somar(a, b):
+        return _metricas(
+            a['total'] + b['total'], a['atendidas'] + b['atendidas'],
+            a['nao_atendidas'] + b['nao_atendidas'], a['tempo_falado'] + b['tempo_falado']
+        )
+
+    por_cob = {item['cob']: item for item in resumo['por_cob']}
+    for item in outro['por_cob']:
+        anterior = por_cob.get(item['cob'])
+        por_cob[item['cob']] = item if anterior is None else {
+            'cob': item['cob'], 'cob_nome': item['cob_nome'], **somar(anterior, item)
+        }
+
+    return {
+        'geral': somar(resumo['geral'], outro['geral']),
+        'por_cob': sorted(por_cob.values(), key=lambda item: item['cob_nome']),
+    }
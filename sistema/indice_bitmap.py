@@ -0,0 +1,174 @@
+import numpy as np
+
+
+# Cada contêiner cobre um bloco de 2**16 posições: até LIMITE_LISTA posições
+# ficam em uma lista ordenada dos 16 bits baixos (uint16); acima disso, em um
+# bitmap de 2**16 bits (1024 palavras uint64, 8 KB)
+BITS_BLOCO = 16
+TAMANHO_BLOCO = 1 << BITS_BLOCO
+PALAVRAS_BLOCO = TAMANHO_BLOCO // 64
+LIMITE_LISTA = 4096
+
+
+def _container(baixos):
+    """Contêiner das posições de um bloco (16 bits baixos, em ordem): lista ou bitmap, o que for menor"""
+    if len(baixos) <= LIMITE_LISTA:
+        container = baixos.astype('uint16')
+    else:
+        bits = np.zeros(TAMANHO_BLOCO, dtype=bool)
+        bits[baixos] = True
+        container = np.packbits(bits, bitorder='little').view('uint64')
+    container.setflags(write=False)
+    return container
+
+
+def _indexar(codigos, inicio, quantidade):
+    """Blocos e contêineres das posições inicio + i (i em codigos), por código"""
+    indices = [(np.empty(0, dtype='int64'), []) for _ in range(quantidade)]
+    if len(codigos) == 0:
+        return indices
+
+    # Estável: dentro de cada código as posições (e os blocos) continuam crescentes
+    ordem = np.argsort(codigos, kind='stable')
+    posicoes = ordem.astype('int64') + inicio
+    codigos = codigos[ordem]
+    blocos = posicoes >> BITS_BLOCO
+    baixos = posicoes & (TAMANHO_BLOCO - 1)
+
+    quebras = np.flatnonzero((codigos[1:] != codigos[:-1]) | (blocos[1:] != blocos[:-1])) + 1
+    inicios = np.r_[0, quebras]
+    fins = np.r_[quebras, len(posicoes)]
+
+    grupos = {}
+    for ini, fim in zip(inicios.tolist(), fins.tolist()):
+        grupo = grupos.setdefault(int(codigos[ini]), ([], []))
+        grupo[0].append(int(blocos[ini]))
+        grupo[1].append(_container(baixos[ini:fim]))
+    for codigo, (numeros, containers) in grupos.items():
+        indices[codigo] = (np.array(numeros, dtype='int64'), containers)
+    return indices
+
+
+class IndiceBitmap:
+    """Índice bitmap comprimido (no estilo roaring) das posições de cada código de uma coluna
+
+    As posições são divididas em blocos de 2**16 e, para cada código, há um
+    contêiner por bloco com ocorrências: lista ordenada quando são poucas,
+    bitmap quando passam de LIMITE_LISTA (no máximo 2 bytes por linha). Um
+    filtro com vários valores é o OR dos contêineres dos seus códigos, apenas
+    nos blocos da faixa pedida; filtros de colunas diferentes se combinam com
+    AND sobre o resultado. indices[codigo] é (números dos blocos, em ordem,
+    contêineres) e linhas, o número de posições indexadas.
+    """
+
+    def __init__(self, indices, linhas):
+        self.indices = indices
+        self.linhas = linhas
+
+    @classmethod
+    def de_codigos(cls, codigos, quantidade, base=None):
+        """Indexa os códigos (0 a quantidade - 1) pela posição
+
+        Com base (índice das primeiras base.linhas posições, com os mesmos
+        códigos), os blocos completos dela são reaproveitados e só os
+        seguintes são indexados.
+        """
+        inicio = 0 if base is None else base.linhas >> BITS_BLOCO << BITS_BLOCO
+        indices = _indexar(np.asarray(codigos[inicio:]), inicio, quantidade)
+
+        if base is not None:
+            bloco_inicio = inicio >> BITS_BLOCO
+            for codigo, (numeros, containers) in enumerate(base.indices):
+                completos = int(np.searchsorted(numeros, bloco_inicio))
+                novos_numeros, novos_containers = indices[codigo]
+                indices[codigo] = (
+                    np.r_[numeros[:completos], novos_numeros], containers[:completos] + novos_containers
+                )
+        return cls(indices, len(codigos))
+
+    @classmethod
+    def de_arrays(cls, arrays, linhas):
+        """Índice das primeiras linhas posições a partir dos arrays de achatar (contêineres são views, sem cópia)"""
+        inicio = arrays['inicio'].tolist()
+        inicio_listas = arrays['inicio_listas'].tolist()
+        densos = arrays['densos'].reshape(-1, PALAVRAS_BLOCO)
+        ordinais = (np.cumsum(arrays['denso']) - 1).tolist()
+
+        containers = [
+            densos[ordinais[i]] if denso else arrays['listas'][inicio_listas[i]:inicio_listas[i + 1]]
+            for i, denso in enumerate(arrays['denso'].tolist())
+        ]
+        indices = [
+            (arrays['numeros'][inicio[codigo]:inicio[codigo + 1]], containers[inicio[codigo]:inicio[codigo + 1]])
+            for codigo in range(len(inicio) - 1)
+        ]
+        return cls(indices, linhas)
+
+    def achatar(self):
+        """Contêineres de todos os códigos em arrays planos, por nome
+
+        Na ordem dos códigos: 'numeros' (bloco de cada contêiner), 'inicio'
+        (primeiro contêiner de cada código), 'denso' (bitmap ou lista) e os
+        contêineres em 'densos' (PALAVRAS_BLOCO palavras cada) e 'listas', com
+        o início de cada lista em 'inicio_listas' (os bitmaps não ocupam espaço
+        nas listas).
+        """
+        containers = [container for _, lista in self.indices for container in lista]
+        denso = np.array([container.dtype == np.uint64 for container in containers], dtype=bool)
+        inicio = np.zeros(len(self.indices) + 1, dtype='int64')
+        np.cumsum([len(numeros) for numeros, _ in self.indices], out=inicio[1:])
+        inicio_listas = np.zeros(len(containers) + 1, dtype='int64')
+        np.cumsum([0 if e_denso else len(container) for container, e_denso in zip(containers, denso)],
+                  out=inicio_listas[1:])
+
+        return {
+            'numeros': np.concatenate([numeros for numeros, _ in self.indices] + [np.empty(0, 'int64')]),
+            'inicio': inicio,
+            'denso': denso,
+            'inicio_listas': inicio_listas,
+            'densos': np.concatenate(
+                [container for container in containers if container.dtype == np.uint64] + [np.empty(0, 'uint64')]
+            ),
+            'listas': np.concatenate(
+                [container for container in containers if container.dtype != np.uint64] + [np.empty(0, 'uint16')]
+            ),
+        }
+
+    @property
+    def nbytes(self):
+        return sum(
+            numeros.nbytes + sum(container.nbytes for container in containers)
+            for numeros, containers in self.indices
+        )
+
+    def bitmap(self, codigos, bloco_ini, bloco_fim):
+        """Bitmap denso (palavras uint64) dos blocos [bloco_ini, bloco_fim) com o OR dos códigos"""
+        palavras = np.zeros((bloco_fim - bloco_ini) * PALAVRAS_BLOCO, dtype='uint64')
+        for codigo in codigos:
+            numeros, containers = self.indices[codigo]
+            primeiro, ultimo = np.searchsorted(numeros, (bloco_ini, bloco_fim))
+            for numero, container in zip(numeros[primeiro:ultimo].tolist(), containers[primeiro:ultimo]):
+                deslocamento = (numero - bloco_ini) * PALAVRAS_BLOCO
+                if container.dtype == np.uint64:
+                    palavras[deslocamento:deslocamento + PALAVRAS_BLOCO] |= container
+                else:
+                    np.bitwise_or.at(
+                        palavras,
+                        deslocamento + (container >> 6).astype('int64'),
+                        np.left_shift(np.uint64(1), (container & 63).astype('uint64')),
+                    )
+        return palavras
+
+
+def posicoes_do_bitmap(palavras, bloco_ini, inicio, fim):
+    """Posições em [inicio, fim), em ordem, com o bit ligado no bitmap denso que começa em bloco_ini"""
+    deslocamento = bloco_ini << BITS_BLOCO
+    bits = np.unpackbits(palavras.view('uint8'), bitorder='little')[inicio - deslocamento:fim - deslocamento]
+    return np.flatnonzero(bits) + inicio
+
+
+def blocos_da_faixa(inicio, fim):
+    """Blocos [bloco_ini, bloco_fim) que contêm as posições [inicio, fim)"""
+    if inicio >= fim:
+        return 0, 0
+    return inicio >> BITS_BLOCO, ((fim - 1) >> BITS_BLOCO) + 1
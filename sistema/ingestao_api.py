@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import pandas as pd
+
+
+class BufferIngestao:
+    """Acumula as chamadas recebidas pela API e as grava em micro-lotes
+
+    Os lotes recebidos ficam em memória até somarem tamanho_lote chamadas ou até
+    o mais antigo esperar intervalo_ms; então uma thread de fundo os entrega de
+    uma vez a processar(df, origem). Com capacidade chamadas já pendentes, novos
+    lotes são recusados (adicionar retorna False) até a gravação liberar espaço,
+    o que a API devolve ao cliente como 429.
+
+    Os lotes já foram confirmados ao cliente: um lote cuja gravação falha é
+    tentado de novo até tentativas vezes, com espera dobrando a partir de
+    espera_inicial segundos, e depois salvo como CSV em diretorio_falhas, de
+    onde pode ser recarregado (por exemplo, movido para o diretório monitorado).
+    """
+
+    def __init__(self, processar, origem, tamanho_lote=5000, intervalo_ms=200, capacidade=100000,
+                 tentativas=5, espera_inicial=0.5, diretorio_falhas='data/api_falhas'):
+        self.processar = processar
+        self.origem = origem
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo_ms / 1000
+        self.capacidade = capacidade
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self.diretorio_falhas = diretorio_falhas
+        self._blocos = []
+        self._pendentes = 0
+        self._mais_antigo = None
+        self._condicao = threading.Condition()
+        self._parar = False
+        self._thread = None
+        self._contadores = {
+            'recebidas': 0, 'recusadas': 0, 'gravadas': 0, 'inseridas': 0, 'lotes': 0,
+            'novas_tentativas': 0, 'falhas': 0, 'perdidas': 0,
+        }
+
+    def adicionar(self, df):
+        """Enfileira um DataFrame de chamadas; False se não há espaço no buffer"""
+        with self._condicao:
+            # Encerrando: o que entrar agora não seria mais gravado
+            if self._parar or self._pendentes + len(df) > self.capacidade:
+                self._contadores['recusadas'] += len(df)
+                return False
+
+            self._blocos.append(df)
+            self._pendentes += len(df)
+            self._contadores['recebidas'] += len(df)
+            # Acorda a thread no primeiro lote (para contar o intervalo_ms) e no lote completo
+            if self._mais_antigo is None:
+                self._mais_antigo = time.monotonic()
+                self._condicao.notify()
+            elif self._pendentes >= self.tamanho_lote:
+                self._condicao.notify()
+            return True
+
+    def _espera(self):
+        """Segundos até o lote atual vencer pelo tempo (None com o buffer vazio)"""
+        if self._mais_antigo is None:
+            return None
+        return max(0.0, self._mais_antigo + self.intervalo - time.monotonic())
+
+    def _retirar_lote(self):
+        """Aguarda um lote completo (por tamanho ou tempo) e o retira do buffer; None ao parar"""
+        with self._condicao:
+            while not self._parar and self._pendentes < self.tamanho_lote and self._espera() != 0.0:
+                self._condicao.wait(self._espera())
+
+            if not self._blocos:
+                return None
+            blocos, self._blocos = self._blocos, []
+            self._pendentes = 0
+            self._mais_antigo = None
+            return blocos
+
+    def _gravar(self, blocos):
+        df = pd.concat(blocos, ignore_index=True)
+        espera = self.espera_inicial
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                inseridas = self.processar(df, self.origem)
+                break
+            except Exception as e:
+                print(f"❌ Erro ao gravar micro-lote de {len(df)} chamadas da API "
+                      f"(tentativa {tentativa} de {self.tentativas}): {e}")
+                if tentativa == self.tentativas:
+                    traceback.print_exc()
+                    self._salvar_falha(df)
+                    return
+                self._contadores['novas_tentativas'] += 1
+                time.sleep(espera)
+                espera *= 2
+
+        self._contadores['gravadas'] += len(df)
+        self._contadores['inseridas'] += inseridas
+        self._contadores['lotes'] += 1
+
+    def _salvar_falha(self, df):
+        """Salva em CSV o lote que não pôde ser gravado, para não perder chamadas já confirmadas"""
+        caminho = os.path.join(self.diretorio_falhas, f"api_{datetime.now():%Y%m%d_%H%M%S_%f}.csv")
+        try:
+            os.makedirs(self.diretorio_falhas, exist_ok=True)
+            df.to_csv(caminho, index=False)
+        except Exception as e:
+            self._contadores['perdidas'] += len(df)
+            print(f"❌ Micro-lote de {len(df)} chamadas da API perdido: erro ao salvar {caminho}: {e}")
+            return
+
+        self._contadores['falhas'] += len(df)
+        print(f"💾 Micro-lote de {len(df)} chamadas da API salvo em {caminho} para recarga")
+
+    def _executar_continuamente(self):
+        while True:
+            blocos = self._retirar_lote()
+            if blocos is None:
+                return
+            self._gravar(blocos)
+
+    def estatisticas(self):
+        """Chamadas pendentes no buffer e contadores acumulados desde o início"""
+        with self._condicao:
+            return {'pendentes': self._pendentes, 'capacidade': self.capacidade, **self._contadores}
+
+    def iniciar(self):
+        """Inicia a gravação dos micro-lotes em uma thread de fundo"""
+        self._thread = threading.Thread(target=self._executar_continuamente, name='ingestao-api', daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout=None):
+        """Grava o que está pendente e encerra a thread
+
+        Novos lotes passam a ser recusados. O que não for gravado em timeout
+        segundos é salvo em CSV em diretorio_falhas, como um lote com falha.
+        """
+        with self._condicao:
+            self._parar = True
+            self._condicao.notify()
+        if self._thread is None:
+            return
+        self._thread.join(timeout)
+
+        if self._thread.is_alive():
+            with self._condicao:
+                blocos, self._blocos = self._blocos, []
+                self._pendentes = 0
+                self._mais_antigo = None
+            if blocos:
+                print(f"⚠️ Gravação do buffer da API não concluída em {timeout}s ao encerrar")
+                self._salvar_falha(pd.concat(blocos, ignore_index=True))
@@ -0,0 +1,159 @@
+import bisect
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# Limites dos buckets dos histogramas
+LIMITES_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_BYTES = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+LIMITES_LINHAS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Contexto reaproveitado quando a coleta está desativada (nenhuma alocação por chamada)
+_NULO = nullcontext()
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+class Metricas:
+    """Contadores e histogramas em memória, exportados no formato texto do Prometheus
+
+    Desativada, cada ponto de medição custa apenas a verificação de um
+    atributo: etapa() devolve um contexto nulo compartilhado e medido() devolve
+    a própria função, sem embrulho. Com log, cada etapa medida também é
+    impressa como uma linha JSON.
+    """
+
+    def __init__(self, prefixo='dashboard', ativo=False, log=False):
+        self.prefixo = prefixo
+        self.ativo = ativo or log
+        self.log = log
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+        self._limites = {}
+        self._descricoes = {}
+        self._coletores = []
+
+    def descrever(self, nome, descricao, limites=None):
+        """Registra a descrição (HELP) e, para histogramas, os limites dos buckets"""
+        self._descricoes[nome] = descricao
+        if limites is not None:
+            self._limites[nome] = tuple(limites)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        if not self.ativo:
+            return
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        if not self.ativo:
+            return
+        limites = self._limites.get(nome, LIMITES_SEGUNDOS)
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = [[0] * len(limites), 0.0, 0]
+            posicao = bisect.bisect_left(limites, valor)
+            if posicao < len(limites):
+                histograma[0][posicao] += 1
+            histograma[1] += valor
+            histograma[2] += 1
+
+    def etapa(self, nome, **rotulos):
+        """Context manager que mede a duração de uma etapa (nulo quando desativado)"""
+        if not self.ativo:
+            return _NULO
+        return self._medir(nome, rotulos)
+
+    @contextmanager
+    def _medir(self, nome, rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            self.observar('etapa_segundos', segundos, etapa=nome, **rotulos)
+            if self.log:
+                self.registrar_log('etapa', etapa=nome, segundos=round(segundos, 6), **rotulos)
+
+    def medido(self, nome):
+        """Decorador que mede cada chamada da função como uma etapa"""
+        def decorador(funcao):
+            if not self.ativo:
+                return funcao
+
+            @functools.wraps(funcao)
+            def embrulho(*args, **kwargs):
+                with self._medir(nome, {}):
+                    return funcao(*args, **kwargs)
+            return embrulho
+        return decorador
+
+    def registrar_log(self, evento, **campos):
+        """Imprime um evento como uma linha JSON (apenas com log ativado)"""
+        if self.log:
+            print(json.dumps({'evento': evento, 'momento': round(time.time(), 3), **campos},
+                             ensure_ascii=False, default=str), flush=True)
+
+    def registrar_coletor(self, coletor):
+        """Registra uma função chamada na exportação que retorna [(nome, rotulos, valor)] (gauges)"""
+        self._coletores.append(coletor)
+
+    def exportar(self):
+        """Retorna todas as métricas no formato texto do Prometheus"""
+        linhas = []
+        vistos = set()
+
+        def cabecalho(nome, tipo):
+            if nome not in vistos:
+                vistos.add(nome)
+                descricao = self._descricoes.get(nome)
+                if descricao:
+                    linhas.append(f'# HELP {self.prefixo}_{nome} {descricao}')
+                linhas.append(f'# TYPE {self.prefixo}_{nome} {tipo}')
+
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted((chave, (list(h[0]), h[1], h[2])) for chave, h in self._histogramas.items())
+
+        for (nome, rotulos), valor in contadores:
+            cabecalho(nome, 'counter')
+            linhas.append(f'{self.prefixo}_{nome}{_formatar_rotulos(rotulos)} {valor}')
+
+        for (nome, rotulos), (contagens, soma, total) in histogramas:
+            cabecalho(nome, 'histogram')
+            acumulado = 0
+            for limite, contagem in zip(self._limites.get(nome, LIMITES_SEGUNDOS), contagens):
+                acumulado += contagem
+                linhas.append(f'{self.prefixo}_{nome}_bucket{_formatar_rotulos(rotulos, [("le", limite)])} {acumulado}')
+            linhas.append(f'{self.prefixo}_{nome}_bucket{_formatar_rotulos(rotulos, [("le", "+Inf")])} {total}')
+            linhas.append(f'{self.prefixo}_{nome}_sum{_formatar_rotulos(rotulos)} {soma}')
+            linhas.append(f'{self.prefixo}_{nome}_count{_formatar_rotulos(rotulos)} {total}')
+
+        # Amostras de uma mesma métrica precisam ficar juntas na exportação
+        gauges = {}
+        for coletor in self._coletores:
+            for nome, rotulos, valor in coletor():
+                gauges.setdefault(nome, []).append((rotulos, valor))
+
+        for nome, amostras in gauges.items():
+            cabecalho(nome, 'gauge')
+            for rotulos, valor in amostras:
+                linhas.append(f'{self.prefixo}_{nome}{_formatar_rotulos(sorted(rotulos.items()))} {valor}')
+
+        return '\n'.join(linhas) + '\n'
@@ -0,0 +1,156 @@
+import glob
+import io
+import os
+import threading
+import traceback
+
+import pandas as pd
+
+
+# Bytes que antecedem a posição lida, guardados para reconhecer um arquivo
+# substituído por outro de tamanho igual ou maior
+TAMANHO_TRECHO = 256
+
+
+class MonitorCSV:
+    """Monitora um diretório e entrega apenas as linhas novas de cada CSV
+
+    A posição (em bytes) já lida de cada arquivo fica na tabela arquivos_csv,
+    de modo que arquivos novos e arquivos que recebem linhas ao final são
+    processados de forma incremental, inclusive entre reinícios do serviço.
+    As linhas novas são lidas em blocos de cerca de bytes_por_bloco bytes,
+    com a posição gravada após cada bloco.
+    """
+
+    def __init__(self, diretorio, conectar, processar, intervalo=30, padrao='*.csv',
+                 bytes_por_bloco=64 * 2**20):
+        self.diretorio = diretorio
+        self.conectar = conectar
+        self.processar = processar
+        self.intervalo = intervalo
+        self.padrao = padrao
+        self.bytes_por_bloco = bytes_por_bloco
+        self._parar = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def criar_tabela(conn):
+        """Cria a tabela com a posição lida de cada arquivo"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS arquivos_csv (
+                caminho TEXT PRIMARY KEY,
+                posicao INTEGER NOT NULL DEFAULT 0,
+                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                inode INTEGER,
+                trecho BLOB
+            )
+        ''')
+        # Migração: posições gravadas antes da identificação do arquivo ficam sem ela
+        colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(arquivos_csv)")]
+        if 'inode' not in colunas:
+            conn.execute("ALTER TABLE arquivos_csv ADD COLUMN inode INTEGER")
+            conn.execute("ALTER TABLE arquivos_csv ADD COLUMN trecho BLOB")
+
+    @staticmethod
+    def identificar(caminho, posicao):
+        """Identificação do arquivo lido até a posição: (inode, bytes que antecedem a posição)"""
+        with open(caminho, 'rb') as arquivo:
+            arquivo.seek(max(0, posicao - TAMANHO_TRECHO))
+            trecho = arquivo.read(min(posicao, TAMANHO_TRECHO))
+            return os.fstat(arquivo.fileno()).st_ino, trecho
+
+    def obter_posicao(self, caminho):
+        """Posição já lida e identificação do arquivo: (posição, inode, trecho)"""
+        with self.conectar() as conn:
+            linha = conn.execute(
+                "SELECT posicao, inode, trecho FROM arquivos_csv WHERE caminho = ?", (caminho,)
+            ).fetchone()
+        return tuple(linha) if linha else (0, None, None)
+
+    def salvar_posicao(self, caminho, posicao):
+        inode, trecho = self.identificar(caminho, posicao)
+        with self.conectar() as conn:
+            conn.execute('''
+                INSERT INTO arquivos_csv (caminho, posicao, inode, trecho) VALUES (?, ?, ?, ?)
+                ON CONFLICT (caminho) DO UPDATE SET
+                    posicao = excluded.posicao,
+                    inode = excluded.inode,
+                    trecho = excluded.trecho,
+                    atualizado_em = CURRENT_TIMESTAMP
+            ''', (caminho, posicao, inode, trecho))
+            conn.commit()
+
+    @staticmethod
+    def ler_novas_linhas(caminho, posicao, bytes_por_bloco=64 * 2**20):
+        """Lê as linhas completas após a posição, em blocos; gera (DataFrame, posição após o bloco)"""
+        with open(caminho, 'rb') as arquivo:
+            cabecalho = arquivo.readline()
+            arquivo.seek(max(posicao, len(cabecalho)))
+
+            resto = b''
+            while True:
+                conteudo = arquivo.read(bytes_por_bloco)
+                if not conteudo:
+                    break
+                conteudo = resto + conteudo
+
+                # Uma linha incompleta passa ao bloco seguinte; no fim do arquivo,
+                # ainda sendo escrita, fica para a próxima leitura
+                fim = conteudo.rfind(b'\n') + 1
+                resto = conteudo[fim:]
+                if fim == 0:
+                    continue
+
+                df = pd.read_csv(
+                    io.BytesIO(cabecalho + conteudo[:fim]),
+                    dtype={'hora': str, 'fila': str, 'teleatendente': str}
+                )
+                yield df, arquivo.tell() - len(resto)
+
+    def executar(self):
+        """Processa uma vez todos os arquivos do diretório; retorna o total de registros novos"""
+        total = 0
+
+        for caminho in sorted(glob.glob(os.path.join(self.diretorio, self.padrao))):
+            posicao, inode, trecho = self.obter_posicao(caminho)
+            tamanho = os.path.getsize(caminho)
+
+            # Arquivo truncado ou substituído: reler do início (a deduplicação do banco evita repetições)
+            if tamanho < posicao:
+                print(f"⚠️ Arquivo {caminho} diminuiu de tamanho, relendo do início")
+                posicao = 0
+            elif inode is not None and (inode, trecho) != self.identificar(caminho, posicao):
+                print(f"⚠️ Arquivo {caminho} foi substituído, relendo do início")
+                posicao = 0
+
+            if tamanho == posicao:
+                continue
+
+            try:
+                for df, posicao in self.ler_novas_linhas(caminho, posicao, self.bytes_por_bloco):
+                    if not df.empty:
+                        total += self.processar(df, caminho)
+                    self.salvar_posicao(caminho, posicao)
+            except Exception as e:
+                # A posição fica no último bloco gravado: o restante será tentado de novo na próxima execução
+                print(f"❌ Erro ao processar {caminho}: {e}")
+                continue
+
+        return total
+
+    def _executar_continuamente(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.executar()
+            except Exception as e:
+                print(f"❌ Erro no monitor de CSV: {e}")
+                traceback.print_exc()
+
+    def iniciar(self):
+        """Inicia o monitoramento em uma thread de fundo"""
+        self._thread = threading.Thread(target=self._executar_continuamente, name='monitor-csv', daemon=True)
+        self._thread.start()
+        print(f"👀 Monitorando {self.diretorio} a cada {self.intervalo}s")
+
+    def parar(self):
+        self._parar.set()
@@ -0,0 +1,129 @@
+import pandas as pd
+
+
+# Agregados das chamadas por hora x COB x fila x teleatendente x estado
+# (tabela chamadas_hora), atualizados na mesma transação da carga
+HORA = 3600
+
+# Chave de agregação a partir das colunas de chamadas (nulos viram valores padrão)
+SQL_CHAVE_CHAMADA = '''
+    ts - ts % 3600, COALESCE(cob, 0), COALESCE(fila, ''),
+    COALESCE(teleatendente, ''), COALESCE(estado, 0)
+'''
+
+
+def criar_tabela_rollup(conn):
+    """Cria a tabela de agregados por hora e reconstrói se estiver vazia"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chamadas_hora (
+            hora_ts INTEGER NOT NULL,
+            cob INTEGER NOT NULL,
+            fila TEXT NOT NULL,
+            teleatendente TEXT NOT NULL,
+            estado INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            duracao_total REAL NOT NULL,
+            atendidas INTEGER NOT NULL,
+            PRIMARY KEY (hora_ts, cob, fila, teleatendente, estado)
+        ) WITHOUT ROWID
+    ''')
+
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chamadas_hora_cob ON chamadas_hora(cob, hora_ts)
+    ''')
+
+    # Bancos existentes: montar os agregados a partir de todo o histórico
+    vazia = conn.execute("SELECT 1 FROM chamadas_hora LIMIT 1").fetchone() is None
+    possui_chamadas = conn.execute("SELECT 1 FROM chamadas LIMIT 1").fetchone() is not None
+    if vazia and possui_chamadas:
+        print("🔧 Construindo agregados por hora a partir do histórico...")
+        atualizar_rollups(conn, 0)
+
+
+def atualizar_rollups(conn, id_inicial):
+    """Soma aos agregados as chamadas com id maior que id_inicial (mesma transação da carga)"""
+    conn.execute(f'''
+        INSERT INTO chamadas_hora
+        (hora_ts, cob, fila, teleatendente, estado, quantidade, duracao_total, atendidas)
+        SELECT {SQL_CHAVE_CHAMADA},
+               COUNT(*), COALESCE(SUM(duracao), 0), SUM(estado = 1)
+        FROM chamadas
+        WHERE id > ? AND ts IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (hora_ts, cob, fila, teleatendente, estado) DO UPDATE SET
+            quantidade = quantidade + excluded.quantidade,
+            duracao_total = duracao_total + excluded.duracao_total,
+            atendidas = atendidas + excluded.atendidas
+    ''', (id_inicial,))
+
+
+def limites_horas_inteiras(ts_ini, ts_fim):
+    """Retorna [hora_ini, hora_fim) das horas inteiramente contidas em [ts_ini, ts_fim]"""
+    hora_ini = -(-ts_ini // HORA) * HORA
+    hora_fim = (ts_fim + 1) // HORA * HORA
+    return hora_ini, hora_fim
+
+
+def filtro_dimensoes(dimensoes):
+    """Condições SQL (fila, teleatendente) dos pares (coluna, valores aceitos): (sql, params)
+
+    Os valores selecionados nunca são vazios, então as chamadas com a coluna
+    nula (vazia nos agregados) ficam de fora nas duas tabelas.
+    """
+    sql = ''
+    params = []
+    for coluna, valores in dimensoes:
+        if coluna not in ('fila', 'teleatendente'):
+            raise ValueError(f"Coluna sem filtro no banco: {coluna}")
+        sql += f" AND {coluna} IN ({', '.join('?' * len(valores))})"
+        params += [str(valor) for valor in valores]
+    return sql, params
+
+
+def consultar_agregado(conn, ts_ini, ts_fim, cobs=None, dimensoes=()):
+    """Agrega a janela [ts_ini, ts_fim] por hora, COB, teleatendente e estado
+
+    As horas inteiras vêm de chamadas_hora; apenas as horas parciais das
+    bordas são lidas das chamadas brutas. dimensoes são pares (fila ou
+    teleatendente, valores aceitos), como em filtro_dimensoes.
+    """
+    hora_ini, hora_fim = limites_horas_inteiras(ts_ini, ts_fim)
+
+    filtro, params_filtro = filtro_dimensoes(dimensoes)
+    if cobs:
+        filtro += f" AND cob IN ({', '.join('?' * len(cobs))})"
+        params_filtro += [int(cob) for cob in cobs]
+
+    consultas = []
+    params = []
+
+    if hora_ini < hora_fim:
+        consultas.append(f'''
+            SELECT hora_ts, cob, teleatendente, estado,
+                   SUM(quantidade) AS quantidade, SUM(duracao_total) AS duracao_total
+            FROM chamadas_hora
+            WHERE hora_ts >= ? AND hora_ts < ?{filtro}
+            GROUP BY hora_ts, cob, teleatendente, estado
+        ''')
+        params += [hora_ini, hora_fim] + params_filtro
+        bordas = [(ts_ini, hora_ini - 1), (hora_fim, ts_fim)]
+    else:
+        bordas = [(ts_ini, ts_fim)]
+
+    for borda_ini, borda_fim in bordas:
+        if borda_ini > borda_fim:
+            continue
+        consultas.append(f'''
+            SELECT ts - ts % 3600 AS hora_ts, COALESCE(cob, 0) AS cob,
+                   COALESCE(teleatendente, '') AS teleatendente, COALESCE(estado, 0) AS estado,
+                   COUNT(*) AS quantidade, COALESCE(SUM(duracao), 0) AS duracao_total
+            FROM chamadas
+            WHERE ts BETWEEN ? AND ?{filtro}
+            GROUP BY 1, 2, 3, 4
+        ''')
+        params += [borda_ini, borda_fim] + params_filtro
+
+    if not consultas:
+        return pd.DataFrame(columns=['hora_ts', 'cob', 'teleatendente', 'estado', 'quantidade', 'duracao_total'])
+
+    return pd.read_sql_query(' UNION ALL '.join(consultas), conn, params=params)
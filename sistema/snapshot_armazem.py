@@ -0,0 +1,260 @@
+import fcntl
+import glob
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+
+from armazem_chamadas import (
+    ArmazemChamadas, COLUNAS_ARMAZEM, DerivadosMapeados, categorias_de, codificar_bloco, ordenado, tipo_codigo
+)
+
+
+ARQUIVO_ATUAL = 'atual.json'
+ARQUIVO_TRAVA = 'escrita.lock'
+
+# Gerações mantidas em disco: a atual e a anterior (ainda em uso por leitores que não trocaram)
+GERACOES_MANTIDAS = 2
+
+
+def _gravar(caminho, conteudo):
+    """Grava bytes ou um array (sem cópia intermediária) e sincroniza com o disco"""
+    with open(caminho, 'wb') as arquivo:
+        if isinstance(conteudo, np.ndarray):
+            np.ascontiguousarray(conteudo).tofile(arquivo)
+        else:
+            arquivo.write(conteudo)
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+
+
+class SnapshotArmazem:
+    """Cópia do armazém em arquivos binários por coluna, mapeados somente leitura
+
+    Cada geração é um diretório com um arquivo por coluna. O atual.json indica
+    a geração publicada, o número de linhas, os tipos, as tabelas de categorias
+    e o último id do banco incluído, e é trocado de forma atômica (os.replace).
+    Chamadas novas são gravadas ao final dos arquivos da geração atual antes
+    da troca do atual.json; como os leitores mapeiam apenas as linhas que ele
+    indica, nunca veem uma escrita parcial. As linhas ficam em ordem de ts,
+    como no armazém: chamadas mais antigas que a última gravada não podem ir
+    ao final e levam a uma reescrita completa, em uma nova geração. Quem escreve (escrever, acrescentar) deve manter a
+    trava_escrita, que serializa os processos que gravam o snapshot.
+
+    O índice por COB, as somas acumuladas e os índices bitmap das chamadas
+    também são gravados (em um subdiretório da geração, pelo número de linhas
+    que cobrem) e mapeados pelos leitores, que só calculam os das chamadas
+    seguintes. São regravados quando as chamadas acrescentadas depois deles
+    chegam a linhas_derivados.
+    """
+
+    def __init__(self, diretorio, linhas_derivados=1_000_000):
+        self.diretorio = diretorio
+        self.caminho_atual = os.path.join(diretorio, ARQUIVO_ATUAL)
+        self.linhas_derivados = linhas_derivados
+        # Geração e armazém do último mapeamento: as linhas acrescentadas depois
+        # dele são as únicas a somar e indexar no próximo
+        self._anterior = None
+
+    def ler_metadados(self):
+        """Retorna o conteúdo do atual.json (None se ainda não há snapshot)"""
+        try:
+            with open(self.caminho_atual, encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def trava_escrita(self):
+        """Trava exclusiva entre processos para ler o estado publicado e gravar uma nova versão"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        with open(os.path.join(self.diretorio, ARQUIVO_TRAVA), 'w') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def versao(self):
+        """Identifica a versão publicada (muda a cada troca do atual.json); None sem snapshot"""
+        try:
+            estado = os.stat(self.caminho_atual)
+        except FileNotFoundError:
+            return None
+        return estado.st_ino, estado.st_mtime_ns
+
+    def _caminho_coluna(self, geracao, nome):
+        return os.path.join(self.diretorio, f'g{geracao:06d}', f'{nome}.bin')
+
+    def _caminho_derivado(self, geracao, linhas, nome):
+        return os.path.join(self.diretorio, f'g{geracao:06d}', f'd{linhas:012d}', f'{nome}.bin')
+
+    def _gravar_derivados(self, geracao, armazem):
+        """Grava índices e somas de todas as chamadas do armazém; retorna a entrada 'derivados' do atual.json"""
+        arrays = armazem.derivados()
+        os.makedirs(os.path.dirname(self._caminho_derivado(geracao, len(armazem), '')), exist_ok=True)
+        for nome, array in arrays.items():
+            _gravar(self._caminho_derivado(geracao, len(armazem), nome), array)
+        return {
+            'linhas': len(armazem),
+            'arrays': {nome: [array.dtype.str, len(array)] for nome, array in arrays.items()},
+        }
+
+    def _publicar(self, metadados):
+        temporario = f'{self.caminho_atual}.{os.getpid()}.tmp'
+        _gravar(temporario, json.dumps(metadados, ensure_ascii=False).encode('utf-8'))
+        os.replace(temporario, self.caminho_atual)
+
+    def escrever(self, armazem, ultimo_id):
+        """Grava o armazém completo em uma nova geração e a publica"""
+        anterior = self.ler_metadados()
+        geracao = anterior['geracao'] + 1 if anterior else 1
+        os.makedirs(os.path.dirname(self._caminho_coluna(geracao, '')), exist_ok=True)
+
+        for nome, coluna in armazem.colunas().items():
+            _gravar(self._caminho_coluna(geracao, nome), coluna)
+
+        self._publicar({
+            'geracao': geracao,
+            'linhas': len(armazem),
+            'tipos': {nome: coluna.dtype.str for nome, coluna in armazem.colunas().items()},
+            'cobs': [int(cob) for cob in armazem.cobs],
+            'filas': armazem.filas.tolist(),
+            'teleatendentes': armazem.teleatendentes.tolist(),
+            'ultimo_id': int(ultimo_id),
+            # Snapshots anteriores ao armazém ordenado por ts não têm esta marca e são regravados
+            'ordenado': True,
+            'derivados': self._gravar_derivados(geracao, armazem),
+        })
+        self._remover_geracoes_antigas(geracao)
+
+    def acrescentar(self, delta, ultimo_id, rotulos_cob, rotulos_faixa):
+        """Acrescenta as chamadas do DataFrame delta (COLUNAS_ARMAZEM) à geração publicada"""
+        metadados = self.ler_metadados()
+        categorias = {
+            nome: categorias_de(metadados[tabela])
+            for nome, tabela in (('cob', 'cobs'), ('fila', 'filas'), ('teleatendente', 'teleatendentes'))
+        }
+        colunas = codificar_bloco(delta, categorias)
+
+        if colunas is not None:
+            linhas = metadados['linhas']
+            # Códigos que não cabem mais no tipo gravado (inclusive o int8 do COB de
+            # snapshots anteriores) ou chamadas fora de ordem de ts: reescrever tudo em uma nova geração
+            reescrever = any(
+                not np.can_cast(tipo_codigo(categorias[nome][0]), metadados['tipos'][nome])
+                for nome in ('cob', 'fila', 'teleatendente')
+            ) or not ordenado(colunas['ts']) or (linhas and colunas['ts'][0] < self._ultimo_ts(metadados))
+            if reescrever:
+                self.escrever(self.ler(rotulos_cob, rotulos_faixa).anexar(delta), ultimo_id)
+                return
+
+            for nome, valores in colunas.items():
+                tipo = np.dtype(metadados['tipos'][nome])
+                with open(self._caminho_coluna(metadados['geracao'], nome), 'r+b') as arquivo:
+                    # Descarta sobras de uma gravação interrompida antes de acrescentar
+                    arquivo.seek(linhas * tipo.itemsize)
+                    arquivo.truncate()
+                    valores.astype(tipo).tofile(arquivo)
+                    arquivo.flush()
+                    os.fsync(arquivo.fileno())
+
+            metadados['linhas'] = linhas + len(colunas['ts'])
+            metadados['cobs'] = [int(cob) for cob in categorias['cob'][0]]
+            metadados['filas'] = categorias['fila'][0]
+            metadados['teleatendentes'] = categorias['teleatendente'][0]
+
+        metadados['ultimo_id'] = int(ultimo_id)
+        self._publicar(metadados)
+
+        # Snapshots sem a entrada (gravados antes dela) contam como sem derivados
+        anteriores = metadados.get('derivados', {'linhas': 0})
+        if metadados['linhas'] - anteriores['linhas'] >= self.linhas_derivados:
+            metadados['derivados'] = self._gravar_derivados(metadados['geracao'], self.ler(rotulos_cob, rotulos_faixa))
+            self._publicar(metadados)
+            self._remover_derivados_antigos(metadados['geracao'], (anteriores['linhas'], metadados['linhas']))
+
+    def _ultimo_ts(self, metadados):
+        """ts da última chamada gravada na geração publicada"""
+        tipo = np.dtype(metadados['tipos']['ts'])
+        caminho = self._caminho_coluna(metadados['geracao'], 'ts')
+        return int(np.fromfile(caminho, dtype=tipo, count=1, offset=(metadados['linhas'] - 1) * tipo.itemsize)[0])
+
+    def ler(self, rotulos_cob, rotulos_faixa):
+        """Mapeia a geração publicada (somente leitura, sem cópia); None se não há snapshot"""
+        for _ in range(3):
+            metadados = self.ler_metadados()
+            if metadados is None:
+                return None
+            try:
+                return self._mapear(metadados, rotulos_cob, rotulos_faixa)
+            except FileNotFoundError:
+                # Geração removida entre a leitura do atual.json e o mapeamento: reler
+                continue
+        raise RuntimeError(f"Snapshot em {self.diretorio} mudou durante a leitura")
+
+    def _mapear(self, metadados, rotulos_cob, rotulos_faixa):
+        linhas = metadados['linhas']
+        colunas = {}
+        for nome in COLUNAS_ARMAZEM:
+            tipo = np.dtype(metadados['tipos'][nome])
+            caminho = self._caminho_coluna(metadados['geracao'], nome)
+            if linhas:
+                colunas[nome] = np.memmap(caminho, dtype=tipo, mode='r', shape=(linhas,))
+            else:
+                os.stat(caminho)
+                colunas[nome] = np.empty(0, dtype=tipo)
+
+        base = None
+        if self._anterior is not None:
+            geracao, anterior = self._anterior
+            if geracao == metadados['geracao'] and len(anterior) <= linhas:
+                base = anterior
+
+        # Derivados gravados depois dos usados pela base: mapeá-los e calcular só as chamadas seguintes
+        mapeados = None
+        derivados = metadados.get('derivados')
+        if derivados is not None and derivados['linhas'] <= linhas and (
+            base is None or base.mapeados is None or base.mapeados.linhas < derivados['linhas']
+        ):
+            mapeados = self._mapear_derivados(metadados['geracao'], derivados)
+            base = None
+
+        armazem = ArmazemChamadas(
+            **colunas,
+            cobs=np.array(metadados['cobs'], dtype='int64'),
+            filas=np.array(metadados['filas'], dtype=object),
+            teleatendentes=np.array(metadados['teleatendentes'], dtype=object),
+            rotulos_cob=rotulos_cob,
+            rotulos_faixa=rotulos_faixa,
+            ultimo_id=metadados['ultimo_id'],
+            base=base,
+            mapeados=mapeados,
+        )
+        self._anterior = (metadados['geracao'], armazem)
+        return armazem
+
+    def _mapear_derivados(self, geracao, derivados):
+        arrays = {}
+        for nome, (tipo, tamanho) in derivados['arrays'].items():
+            caminho = self._caminho_derivado(geracao, derivados['linhas'], nome)
+            if tamanho:
+                arrays[nome] = np.memmap(caminho, dtype=tipo, mode='r', shape=(tamanho,))
+            else:
+                os.stat(caminho)
+                arrays[nome] = np.empty(0, dtype=tipo)
+        return DerivadosMapeados(arrays, derivados['linhas'])
+
+    def _remover_derivados_antigos(self, geracao, mantidos):
+        # Como nas gerações: os derivados atuais e os anteriores (ainda em uso por leitores que não trocaram)
+        for caminho in glob.glob(os.path.join(self.diretorio, f'g{geracao:06d}', 'd[0-9]*')):
+            if int(os.path.basename(caminho)[1:]) not in mantidos:
+                shutil.rmtree(caminho, ignore_errors=True)
+
+    def _remover_geracoes_antigas(self, geracao):
+        # Arquivos removidos continuam válidos para quem já os mapeou
+        for caminho in glob.glob(os.path.join(self.diretorio, 'g[0-9]*')):
+            if int(os.path.basename(caminho)[1:]) <= geracao - GERACOES_MANTIDAS:
+                shutil.rmtree(caminho, ignore_errors=True)
@@ -0,0 +1,146 @@
+import numpy as np
+
+
+# Resolução das somas acumuladas (segundos)
+MINUTO = 60
+
+# Somas acumuladas de cada grupo, depois dos minutos (ordem das posições do grupo)
+SOMAS = ['total', 'atendidas', 'nao_atendidas', 'duracao']
+TIPOS_SOMAS = ['int32', 'int32', 'int32', 'float64']
+
+
+def _somas_por_minuto(ts, estado, duracao):
+    """Minutos com chamadas (ts em ordem) e, de cada um: total, atendidas, não atendidas e duração das atendidas"""
+    minutos = ts // MINUTO
+    inicios = np.flatnonzero(np.r_[True, minutos[1:] != minutos[:-1]])
+    atendida = estado == 1
+
+    total = np.diff(np.r_[inicios, len(ts)])
+    atendidas = np.add.reduceat(atendida.astype('int64'), inicios)
+    nao_atendidas = np.add.reduceat((estado == 0).astype('int64'), inicios)
+    duracao = np.add.reduceat(np.where(atendida, duracao.astype('float64'), 0.0), inicios)
+    return minutos[inicios].astype('int32'), (total, atendidas, nao_atendidas, duracao)
+
+
+def _estender(grupo, ts, estado, duracao):
+    """Grupo de um COB com as chamadas (posteriores às dele, em ordem de ts) acrescentadas"""
+    if grupo is None:
+        grupo = (np.empty(0, dtype='int32'),) + tuple(np.zeros(1, dtype=tipo) for tipo in TIPOS_SOMAS)
+    if len(ts) == 0:
+        return grupo
+
+    minutos, somas = _somas_por_minuto(ts, estado, duracao)
+    anteriores, *acumulados = grupo
+
+    if len(anteriores) and minutos[0] == anteriores[-1]:
+        # O primeiro minuto novo continua o último do grupo: suas somas entram na última posição
+        acumulados = [np.r_[acumulado[:-1], acumulado[-1] + soma[0]] for acumulado, soma in zip(acumulados, somas)]
+        minutos, somas = minutos[1:], [soma[1:] for soma in somas]
+
+    return (np.r_[anteriores, minutos],) + tuple(
+        np.r_[acumulado, acumulado[-1] + np.cumsum(soma)].astype(acumulado.dtype)
+        for acumulado, soma in zip(acumulados, somas)
+    )
+
+
+def _juntar(primeiro, segundo):
+    """Grupo com as somas de segundo (chamadas posteriores às de primeiro) acumuladas após as de primeiro"""
+    minutos, *acumulados = primeiro
+    minutos_seguintes, *seguintes = segundo
+    # O primeiro minuto de segundo pode continuar o último de primeiro: uma posição só
+    continua = int(len(minutos) > 0 and len(minutos_seguintes) > 0 and minutos_seguintes[0] == minutos[-1])
+    return (np.r_[minutos, minutos_seguintes[continua:]],) + tuple(
+        np.r_[acumulado[:len(acumulado) - continua], acumulado[-1] + seguinte[1:]].astype(acumulado.dtype)
+        for acumulado, seguinte in zip(acumulados, seguintes)
+    )
+
+
+class SomasAcumuladas:
+    """Contagens e duração acumuladas por COB e minuto, para os indicadores de qualquer janela
+
+    Para cada código de COB do armazém, os minutos com chamadas (em ordem) e
+    as somas acumuladas até o fim de cada um, a partir de zero: total,
+    atendidas, não atendidas e duração das atendidas. A soma de um intervalo
+    de minutos é a diferença de duas posições, achadas por busca binária nos
+    minutos; o espaço é proporcional aos minutos com chamadas, e não ao período.
+    linhas é o número de chamadas do armazém incluídas. fixas, quando há, são
+    as somas das primeiras fixas.linhas chamadas mapeadas do snapshot (sem
+    cópia, compartilhadas entre os processos), e grupos cobre só as seguintes.
+    """
+
+    def __init__(self, grupos, linhas, fixas=None):
+        self.grupos = grupos
+        self.linhas = linhas
+        self.fixas = fixas
+
+    @classmethod
+    def do_armazem(cls, armazem, base=None, fixas=None):
+        """Monta as somas do armazém
+
+        Com base (somas das primeiras base.linhas chamadas), apenas as seguintes
+        são somadas, e as fixas são as da base; sem base, com fixas, as somas
+        partem de fixas.linhas.
+        """
+        if base is not None:
+            fixas = base.fixas
+        inicio = base.linhas if base is not None else fixas.linhas if fixas is not None else 0
+
+        grupos = []
+        for codigo in range(len(armazem.cobs)):
+            posicoes = armazem.posicoes_cob(codigo, inicio)
+            grupo = base.grupos[codigo] if base is not None and codigo < len(base.grupos) else None
+            grupos.append(_estender(grupo, armazem.ts[posicoes], armazem.estado[posicoes], armazem.duracao[posicoes]))
+        return cls(grupos, len(armazem), fixas)
+
+    @classmethod
+    def de_arrays(cls, arrays, linhas):
+        """Somas das primeiras linhas chamadas a partir dos arrays de achatar (views, sem cópia)"""
+        inicio = arrays['inicio'].tolist()
+        grupos = []
+        for codigo in range(len(inicio) - 1):
+            primeiro, ultimo = inicio[codigo], inicio[codigo + 1]
+            # Cada grupo tem uma soma a mais que minutos (o zero inicial)
+            grupos.append((arrays['minutos'][primeiro:ultimo],) + tuple(
+                arrays[nome][primeiro + codigo:ultimo + codigo + 1] for nome in SOMAS
+            ))
+        return cls(grupos, linhas)
+
+    def achatar(self):
+        """Grupos de todas as chamadas (fixas incluídas) concatenados em arrays planos, por nome
+
+        'inicio' traz a posição do primeiro minuto de cada grupo em 'minutos'.
+        """
+        grupos = self.grupos
+        if self.fixas is not None:
+            fixos = self.fixas.grupos
+            grupos = [_juntar(fixos[codigo], grupo) if codigo < len(fixos) else grupo
+                      for codigo, grupo in enumerate(grupos)]
+
+        inicio = np.zeros(len(grupos) + 1, dtype='int64')
+        np.cumsum([len(grupo[0]) for grupo in grupos], out=inicio[1:])
+        arrays = {'inicio': inicio, 'minutos': np.concatenate([grupo[0] for grupo in grupos] + [np.empty(0, 'int32')])}
+        for posicao, (nome, tipo) in enumerate(zip(SOMAS, TIPOS_SOMAS), 1):
+            arrays[nome] = np.concatenate([grupo[posicao] for grupo in grupos] + [np.empty(0, tipo)])
+        return arrays
+
+    @property
+    def nbytes(self):
+        fixas = self.fixas.nbytes if self.fixas is not None else 0
+        return fixas + sum(array.nbytes for grupo in self.grupos for array in grupo)
+
+    def somar(self, codigos, minuto_ini, minuto_fim):
+        """Total, atendidas, não atendidas e duração dos minutos [minuto_ini, minuto_fim), por código
+
+        Retorna quatro arrays alinhados com codigos.
+        """
+        somas = np.zeros((4, len(codigos)))
+        for i, codigo in enumerate(codigos):
+            # COBs que surgiram depois das somas fixas não têm chamadas nelas
+            if codigo >= len(self.grupos):
+                continue
+            minutos, *acumulados = self.grupos[codigo]
+            inicio, fim = np.searchsorted(minutos, (minuto_ini, minuto_fim))
+            somas[:, i] = [acumulado[fim] - acumulado[inicio] for acumulado in acumulados]
+        if self.fixas is not None:
+            somas += self.fixas.somar(codigos, minuto_ini, minuto_fim)
+        return somas